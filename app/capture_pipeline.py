@@ -0,0 +1,165 @@
+# app/capture_pipeline.py
+
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from utils.logging_utils import log
+from app.config import CAPTURE_QUEUE_SIZE, TRANSMIT_QUEUE_SIZE, CAPTURE_JOB_HISTORY
+
+class CaptureJob:
+
+    def __init__(self, job_id, dest_id, options):
+
+        self.job_id = job_id
+        self.dest_id = dest_id
+        self.options = options
+        self.state = "queued"
+        self.image_path = None
+        self.transfer = None
+        self.stack = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.captured_at = None
+        self.transmit_started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def latency(self):
+
+        # Seconds spent in each stage so far; None for stages the job has not reached.
+        def between(start, end):
+
+            return None if start is None or end is None else end - start
+
+        now = time.time()
+        return {
+            "capture": between(self.submitted_at, self.captured_at),
+            "transmit_wait": between(self.captured_at, self.transmit_started_at),
+            "transmit": between(self.transmit_started_at, self.finished_at),
+            "total": between(self.submitted_at, self.finished_at or now),
+        }
+
+    def to_json(self):
+
+        return {
+            "job_id": self.job_id,
+            "dest_id": self.dest_id,
+            "state": self.state,
+            "image_path": self.image_path,
+            "transfer": self.transfer,
+            "stack": self.stack,
+            "error": self.error,
+            "latency": self.latency(),
+        }
+
+class CapturePipeline:
+
+    def __init__(self, node, capture_queue_size=CAPTURE_QUEUE_SIZE, transmit_queue_size=TRANSMIT_QUEUE_SIZE, history=CAPTURE_JOB_HISTORY):
+
+        self.node = node
+        # Capture requests wait in one bounded queue and captured images in another; when the downlink falls behind
+        # the transmit queue fills, the capture worker blocks, and new submissions are refused.
+        self.capture_queue = queue.Queue(maxsize=capture_queue_size)
+        self.transmit_queue = queue.Queue(maxsize=transmit_queue_size)
+        self.history = history
+        self.jobs = OrderedDict()
+        self.next_job_id = 1
+        self.rejected = 0
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+        threading.Thread(target=self._capture_worker, daemon=True).start()
+        threading.Thread(target=self._transmit_worker, daemon=True).start()
+
+    def submit(self, dest_id, options=None):
+
+        # Returns the queued job, or None when the capture queue is full.
+        self.start()
+        with self.lock:
+            job = CaptureJob(self.next_job_id, dest_id, options or {})
+            try:
+                self.capture_queue.put_nowait(job)
+
+            except queue.Full:
+                self.rejected += 1
+                return None
+            self.next_job_id += 1
+            self.jobs[job.job_id] = job
+            while len(self.jobs) > self.history:
+                self.jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id):
+
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def stats(self):
+
+        with self.lock:
+            jobs = list(self.jobs.values())
+            rejected = self.rejected
+        states = {}
+        for job in jobs:
+            states[job.state] = states.get(job.state, 0) + 1
+        finished = [job.latency()["total"] for job in jobs if job.finished_at is not None]
+        return {
+            "capture_queue_depth": self.capture_queue.qsize(),
+            "transmit_queue_depth": self.transmit_queue.qsize(),
+            "capture_queue_size": self.capture_queue.maxsize,
+            "transmit_queue_size": self.transmit_queue.maxsize,
+            "rejected": rejected,
+            "jobs": states,
+            "mean_latency": sum(finished) / len(finished) if finished else None,
+            "max_latency": max(finished) if finished else None,
+        }
+
+    def _capture_worker(self):
+
+        while True:
+            job = self.capture_queue.get()
+            job.state = "capturing"
+            try:
+                job.image_path = self.node.capture(job.options)
+                if job.options.get("stack_depth"):
+                    job.stack = self.node.last_stack_stats
+
+            except Exception as e:
+                log(self.node.general_logger, f"Capture job {job.job_id} failed to capture an image: {e}", level="error")
+                self._finish(job, "failed", str(e))
+                continue
+            job.captured_at = time.time()
+            job.state = "captured"
+            # Blocks while the transmit queue is full, which is what pushes back on submissions.
+            self.transmit_queue.put(job)
+
+    def _transmit_worker(self):
+
+        while True:
+            job = self.transmit_queue.get()
+            job.state = "transmitting"
+            job.transmit_started_at = time.time()
+            try:
+                success, job.transfer = self.node.transmit_captured(job.dest_id, job.image_path, job.options)
+
+            except Exception as e:
+                log(self.node.general_logger, f"Capture job {job.job_id} failed to transmit {job.image_path}: {e}", level="error")
+                self._finish(job, "failed", str(e))
+                continue
+            self._finish(job, "done" if success else "failed", None if success else "Failed to transmit image")
+
+    def _finish(self, job, state, error=None):
+
+        job.state = state
+        job.error = error
+        job.finished_at = time.time()
+        job.done.set()
+        log(self.node.general_logger, f"Capture job {job.job_id} {state} after {job.finished_at - job.submitted_at:.3f}s")
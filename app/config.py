@@ -7,5 +7,94 @@ MAX_ATTEMPTS = 3
 NUM_NODES = 5
 POSITIONS_FILE = "positions.json"
 DELAY = 1
+# Hops a packet may take; it must cover the longest route in the constellation or packets are dropped on the way.
+PACKET_TTL = 10
 NUM_GROUND_STATIONS = 2
 GROUND_STATION_POSITIONS_FILE = "ground_stations.json"
+BATCH_ENABLED = True
+BATCH_MAX_PACKETS = 64
+BATCH_MAX_BYTES = 256 * 1024
+BATCH_MAX_AGE = 0.05
+NODE_HOST = "10.35.70.23"
+TRANSPORT = "stream"
+STREAM_PORT_OFFSET = 20000
+STREAM_RETRY_INTERVAL = 30
+SEND_TIMEOUT = 5
+TRANSMIT_WINDOW = 8
+FANOUT_WORKERS = 32
+FANOUT_TIMEOUT = 2
+STREAM_READ_SIZE = 64 * 1024
+SPOOL_REASSEMBLY = True
+SPOOL_DIR = "reassembly_spool"
+REASSEMBLY_TTL = 300
+REASSEMBLY_MAX_BYTES = 256 * 1024 * 1024
+REASSEMBLY_MAX_SESSIONS = 512
+REASSEMBLY_EXPIRE_INTERVAL = 30
+OUTBOX_DIR = "outbox"
+TRANSFER_STATUS_TIMEOUT = 5
+RETRANSMIT_ROUNDS = 5
+FEC_GROUP_SIZE = 16
+FEC_PARITY = 0
+LINK_MTU = 16 * 1024
+MIN_CHUNK_SIZE = 256
+INITIAL_CHUNK_SIZE = 4096
+LINK_EWMA_ALPHA = 0.2
+LINK_RTT_TARGET = 0.25
+LINK_SUCCESS_LOW = 0.9
+LINK_SUCCESS_HIGH = 0.98
+CODEC_CANDIDATES = ["zlib-1", "zlib-6", "zlib-9", "bz2", "lzma", "zstd-3", "lz4"]
+CODEC_SAMPLE_SIZE = 64 * 1024
+CODEC_MIN_SAVINGS = 0.03
+CODEC_RATIO_TOLERANCE = 0.05
+DELTA_FRAMES = False
+KEY_FRAME_INTERVAL = 30
+REFERENCE_FRAMES = 4
+PROGRESSIVE_TILE_SIZE = 256
+PROGRESSIVE_OVERVIEW_SCALE = 8
+PROGRESSIVE_MAX_IMAGES = 16
+DEDUP_CHUNKS = False
+CHUNK_STORE_DIR = "chunk_store"
+CHUNK_STORE_MAX_BYTES = 512 * 1024 * 1024
+CHUNK_QUERY_BATCH = 512
+DEDUP_CHUNK_SIZE = 4096
+CAPTURE_QUEUE_SIZE = 8
+TRANSMIT_QUEUE_SIZE = 4
+CAPTURE_JOB_HISTORY = 256
+STACK_DEPTH = 8
+STACK_METHOD = "mean"
+STACK_MAX_BYTES = 64 * 1024 * 1024
+STACK_DIR = "stack_spool"
+CATALOG_FILE = "catalog.sqlite3"
+CATALOG_PAGE_SIZE = 100
+CATALOG_MAX_PAGE_SIZE = 1000
+IMAGE_WRITE_QUEUE_SIZE = 16
+IMAGE_WRITE_BATCH = 8
+IMAGE_FSYNC = True
+IMAGE_WRITE_WAIT = 30
+GROUND_STATION_BASE_ID = 1001
+STRIPED_DOWNLINK = False
+STRIPE_MIN_SIZE = 256 * 1024
+STRIPE_FETCH_TIMEOUT = 30
+STORE_AND_FORWARD = True
+BUNDLE_DIR = "bundles"
+BUNDLE_SEGMENT_BYTES = 4 * 1024 * 1024
+BUNDLE_MAX_BYTES = 256 * 1024 * 1024
+BUNDLE_LIFETIME = 6 * 3600
+SCHEDULER_ENABLED = True
+SCHEDULER_QUANTUM = 8192
+SCHEDULER_MAX_BULK_PACKETS = 256
+LINK_SHAPING = True
+# Bytes per second per neighbor ID, e.g. {1001: 2 * 1024 * 1024}; unlisted links use DEFAULT_LINK_CAPACITY (None: unpaced).
+LINK_CAPACITIES = {}
+DEFAULT_LINK_CAPACITY = None
+LINK_BURST_SECONDS = 0.05
+LINK_RATE_WINDOW = 1.0
+CWND_INITIAL = 64 * 1024
+CWND_MIN = 16 * 1024
+CWND_MAX = 8 * 1024 * 1024
+ROUTING_MODE = "distance_vector"
+LSA_MIN_INTERVAL = 0.5
+LSA_FLOOD_DELAY = 0.02
+DISCOVERY_FULL_EVERY = 10
+DISCOVERY_MARGIN = 2.0
+STREAM_MAX_FRAME = BATCH_MAX_BYTES
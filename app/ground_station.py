@@ -1,9 +1,9 @@
 # app/ground_station.py
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 import os
 import base64
-import time
+import threading
 from cryptography.hazmat.primitives.serialization import load_pem_public_key
 import requests
 
@@ -12,6 +12,18 @@ from utils.encryption_utils import EncryptionManager
 from network.network_manager import NetworkManager
 from network.route_manager import RouteManager
 from network.packet import Packet
+from network.chunk_store import ChunkStore
+from app.image_catalog import ImageCatalog, gather_stripes
+from app.image_writer import ImageWriter
+from app.config import (
+    CATALOG_FILE, CATALOG_PAGE_SIZE, GROUND_STATION_BASE_ID, NUM_GROUND_STATIONS, STREAM_READ_SIZE, STRIPE_FETCH_TIMEOUT,
+    PACKET_TTL
+)
+from network.batcher import decode_frame
+from network.transport import HOP_HEADER
+from utils.delta_utils import FrameReferences
+from utils.tile_utils import ProgressiveImages
+from utils.stripe_utils import merge_stripes as join_stripes, stripe_path
 
 session = requests.Session()
 session.trust_env = False
@@ -19,39 +31,138 @@ session.trust_env = False
 app = Flask(__name__)
 ground_station = None
 
+def station_images_dir(station_id):
+
+    return f"ground_station_received_images/received_images_{station_id}"
+
 class GroundStation:
 
-    def __init__(self, node_id, position, port=6001):
+    def __init__(self, node_id, position, port=6001, start_services=True):
 
         self.node_id = node_id  
         self.position = position
         self.sequence_number = 0
+        self.sequence_lock = threading.Lock()
         self.state = "ACTIVE"  
        
-        self.received_images_dir = f"ground_station_received_images/received_images_{self.node_id}"
+        self.received_images_dir = station_images_dir(self.node_id)
         if not os.path.exists(self.received_images_dir):
             os.makedirs(self.received_images_dir)
+        self.catalog = ImageCatalog(os.path.join(self.received_images_dir, CATALOG_FILE), self.received_images_dir)
         
+        self.frame_references = FrameReferences()
+        self.progressive_images = ProgressiveImages()
+        self.chunk_store = ChunkStore(node_id)
         self.encryption_manager = EncryptionManager()
         self.network = NetworkManager(self)
         self.router = RouteManager(self)
         
         self.general_logger = setup_logger(self.node_id, "general")
         self.routing_logger = setup_logger(self.node_id, "routing")
+        self.image_writer = ImageWriter(self.general_logger, self.received_images_dir)
 
         self.neighbor_public_keys = {}  
         self.shared_symmetric_keys = {}
         
-        self.network.start()
+        if start_services:
+            self.network.start()
+            self.router.start()
         self.port = port
 
     def save_received_image(self, image_data, source_id):
 
-        image_path = os.path.join(self.received_images_dir, f"image_from_satellite_{source_id}_{int(time.time())}.png")
-        with open(image_path, "wb") as img_file:
-            img_file.write(image_data)
+        # Queued on the image writer; the image appears at the returned path once written.
+        return self.image_writer.submit(source_id, [image_data])
+
+    def merge_striped_image(self, source_id, image_id, station_ids=()):
+
+        # Stripes held by stations on this host are read straight from their catalogs; any still missing are fetched
+        # from the other stations over HTTP.
+        catalogs = [self.catalog]
+        for station_id in station_ids:
+            catalog_path = os.path.join(station_images_dir(station_id), CATALOG_FILE)
+            if station_id != self.node_id and os.path.exists(catalog_path):
+                catalogs.append(ImageCatalog(catalog_path))
+        fetched = []
+        try:
+            stripes = gather_stripes(catalogs, source_id, image_id)
+            for station_id in station_ids:
+                if station_id != self.node_id and (not stripes or len(stripes) < next(iter(stripes.values()))["stripe_count"]):
+                    fetched += self.fetch_stripes(station_id, source_id, image_id, stripes)
+            image_path = self.image_writer.unique_path(source_id)
+            join_stripes(list(stripes.values()), image_path)
+
+        finally:
+            for catalog in catalogs[1:]:
+                catalog.close()
+            for path in fetched:
+                if os.path.exists(path):
+                    os.remove(path)
+        self.catalog.add(image_path, source_id)
+        log(self.general_logger, f"Merged striped image {image_id} from Node {source_id} into {image_path}")
         return image_path
 
+    def fetch_stripes(self, station_id, source_id, image_id, stripes):
+
+        # Downloads the stripes station_id holds that stripes lacks and adds them to it; returns the downloaded files so
+        # the caller can remove them once merged.
+        address = self.network.get_neighbor_address(station_id)
+        params = {"source_id": source_id, "image_id": image_id}
+        fetched = []
+        try:
+            response = session.get(f"{address}/get_stripes", params=params, timeout=STRIPE_FETCH_TIMEOUT)
+            response.raise_for_status()
+            for stripe in response.json()["stripes"]:
+                index = stripe["stripe_index"]
+                if index in stripes:
+                    continue
+                path = f"{stripe_path(self.received_images_dir, source_id, image_id, index, stripe['stripe_count'])}.fetched"
+                fetched.append(path)
+                with session.get(f"{address}/get_stripe", params=dict(params, index=index), stream=True, timeout=STRIPE_FETCH_TIMEOUT) as data:
+                    data.raise_for_status()
+                    with open(path, "wb") as stripe_file:
+                        for block in data.iter_content(STREAM_READ_SIZE):
+                            stripe_file.write(block)
+                stripes[index] = dict(stripe, path=path)
+                log(self.general_logger, f"Fetched stripe {index + 1}/{stripe['stripe_count']} of image {image_id} from Node {station_id}")
+
+        except (requests.RequestException, OSError, ValueError, KeyError) as e:
+            log(self.general_logger, f"Failed to fetch stripes of image {image_id} from Node {station_id}: {e}", level="warning")
+        return fetched
+
+    def create_packet(self, dest_id, payload, message_type=1):
+
+        # Text from /send arrives as str; packets carry bytes so they can be encrypted, batched or held on disk.
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        with self.sequence_lock:
+            packet = Packet(
+                version=1,
+                message_type=message_type,
+                source_id=self.node_id,
+                dest_id=dest_id,
+                sequence_number=self.sequence_number,
+                payload=payload,
+                ttl=PACKET_TTL
+            )
+            self.sequence_number += 1
+        return packet
+
+    def handle_transfer_status(self, sender_id, status):
+
+        log(self.general_logger, f"Ignoring status for transfer {status.transfer_id} from Node {sender_id}: ground stations do not send images")
+
+    def handle_chunk_have(self, sender_id, status):
+
+        log(self.general_logger, f"Ignoring chunk query reply for transfer {status.transfer_id} from Node {sender_id}: ground stations do not send images")
+
+    def accept_public_key(self, sender_id, public_key_base64):
+
+        public_key_pem = base64.b64decode(public_key_base64)
+        self.neighbor_public_keys[sender_id] = load_pem_public_key(public_key_pem)
+        self.shared_symmetric_keys[sender_id] = self.encryption_manager.generate_shared_secret(public_key_pem)
+        log(self.general_logger, f"Key exchange successful with Node {sender_id}")
+
     def is_active(self):       
         return self.state == "ACTIVE"
 
@@ -95,19 +206,10 @@ def receive_packet():
     data = request.get_data()
     try:        
         packet = Packet.from_bytes(data)
-        sender_id = packet.source_id
-        if sender_id not in ground_station.shared_symmetric_keys:
-            log(ground_station.general_logger, f"No symmetric key with Node {sender_id}. Cannot decrypt packet.", level="error")
-            return jsonify({"error": "No symmetric key for decryption"}), 400
-        
-        decrypted_payload = ground_station.encryption_manager.decrypt(packet.payload, ground_station.shared_symmetric_keys[sender_id])
-        log(ground_station.general_logger, f"Successfully decrypted packet from Node {sender_id}: {decrypted_payload}")
-        
-        if packet.dest_id == ground_station.node_id:
-            log(ground_station.general_logger, f"Packet delivered to ground station: {decrypted_payload}")
-            return jsonify({"status": "Packet delivered", "payload": decrypted_payload.decode()}), 200
-        ground_station.router.forward_packet(packet)
-        return jsonify({"status": "Packet forwarded"}), 200
+        # Text messages too are decrypted with the previous hop's key, since a relayed message was re-encrypted by that hop.
+        if not ground_station.router.receive_packet(packet, request.headers.get(HOP_HEADER, type=int)):
+            return jsonify({"status": "Packet rejected"}), 422
+        return jsonify({"status": "Packet received"}), 200
 
     except Exception as e:
         log(ground_station.general_logger, f"Error processing packet: {str(e)}", level="error")
@@ -119,10 +221,20 @@ def receive_routing_table():
     if not ground_station or not ground_station.is_active():
         return jsonify({"error": "Node is offline"}), 400
     received_table = request.get_json()
-    sender_id = int(request.remote_addr.split('.')[-1])  
+    sender_id = request.args.get("sender_id", type=int) or int(request.remote_addr.split('.')[-1])  
     ground_station.network.update_routing_table(received_table, sender_id)
     return jsonify({"status": "received"}), 200
 
+@app.route('/receive_lsa', methods=['POST'])
+def receive_lsa():
+
+    if not ground_station or not ground_station.is_active():
+        return jsonify({"error": "Node is offline"}), 400
+    data = request.get_json()
+    sender_id = request.args.get("sender_id", type=int)
+    accepted = ground_station.network.receive_lsas(data.get("lsas", []), sender_id)
+    return jsonify({"status": "received", "accepted": accepted}), 200
+
 @app.route('/add_satellite', methods=['POST'])
 def add_satellite():
 
@@ -148,15 +260,7 @@ def exchange_key():
         return jsonify({"error": "Invalid data provided"}), 400
 
     try:        
-        public_key_pem = base64.b64decode(public_key_base64)
-        public_key = load_pem_public_key(public_key_pem)
-
-        ground_station.neighbor_public_keys[sender_id] = public_key
-        shared_key = ground_station.encryption_manager.generate_shared_secret(public_key_pem)
-        ground_station.shared_symmetric_keys[sender_id] = shared_key
-        log(ground_station.general_logger, f"[[KEY] {ground_station.shared_symmetric_keys}")
-
-        log(ground_station.general_logger, f"Key exchange successful with Node {sender_id}")
+        ground_station.accept_public_key(sender_id, public_key_base64)
         return jsonify({"status": "key_exchange_successful"}), 200
 
     except Exception as e:
@@ -172,7 +276,7 @@ def update_position():
     if not node_id or not position:
         return jsonify({"error": "Node ID or Position missing"}), 400
 
-    ground_station.network.update_position_with_neighbor(node_id, position)
+    ground_station.network.update_position_with_neighbor(node_id, position, data.get("mtu"))
     return jsonify({"status": "Position updated"}), 200
 
 @app.route('/receive_image_from_satellite', methods=['POST'])
@@ -180,13 +284,31 @@ def receive_image_from_satellite():
 
     data = request.get_data()
     try:        
-        ground_station.router.receive_packet(data)
+        if not ground_station.router.receive_packet(data, request.headers.get(HOP_HEADER, type=int)):
+            return jsonify({"status": "Image chunk rejected"}), 422
         return jsonify({"status": "Image received and being processed"}), 200
 
     except Exception as e:
         log(ground_station.general_logger, f"Error in /receive_image_from_satellite: {str(e)}", level="error")
         return jsonify({"error": f"Failed to process the image: {str(e)}"}), 500
 
+@app.route('/receive_batch', methods=['POST'])
+def receive_batch():
+
+    if not ground_station or not ground_station.is_active():
+        return jsonify({"error": "Node is offline"}), 400
+
+    try:
+        packets = decode_frame(request.get_data())
+        hop_id = request.headers.get(HOP_HEADER, type=int)
+        handled = sum(1 for packet in packets if ground_station.router.receive_packet(packet, hop_id))
+        return jsonify({"status": "Batch received and being processed", "count": len(packets), "handled": handled,
+                        "failed": len(packets) - handled}), 200
+
+    except Exception as e:
+        log(ground_station.general_logger, f"Error in /receive_batch: {str(e)}", level="error")
+        return jsonify({"error": f"Failed to process the batch: {str(e)}"}), 500
+
 @app.route('/get_received_images', methods=['GET'])
 def get_received_images():
 
@@ -194,12 +316,16 @@ def get_received_images():
         return jsonify({"error": "Node is offline"}), 400
 
     try:        
-        images = [
-            os.path.join(ground_station.received_images_dir, img)
-            for img in os.listdir(ground_station.received_images_dir)
-            if img.endswith((".png", ".jpg", ".jpeg"))
-        ]
-        return jsonify({"status": "success", "images": images}), 200
+        entries, next_cursor = ground_station.catalog.list(
+            source_id=request.args.get("source_id", type=int),
+            since=request.args.get("since", type=float),
+            until=request.args.get("until", type=float),
+            cursor=request.args.get("cursor", type=int),
+            limit=request.args.get("limit", CATALOG_PAGE_SIZE, type=int),
+        )
+        images = [entry["path"] for entry in entries]
+        previews = ground_station.progressive_images.previews()
+        return jsonify({"status": "success", "images": images, "entries": entries, "next_cursor": next_cursor, "previews": previews}), 200
 
     except Exception as e:
         log(ground_station.general_logger, f"Error retrieving received images: {str(e)}", level="error")
@@ -215,10 +341,56 @@ def get_ground_station_info():
             "position": ground_station.position,
             "state": ground_station.state,
             "received_images_dir": ground_station.received_images_dir,
+            "cataloged_images": ground_station.catalog.count(),
+            "image_writer": ground_station.image_writer.stats(),
             "neighbor_count": len(ground_station.network.neighbors),
-            "shared_keys_count": len(ground_station.shared_symmetric_keys)
+            "shared_keys_count": len(ground_station.shared_symmetric_keys),
+            "reassembly": ground_station.router.reassembly.stats(),
+            "chunk_store": ground_station.chunk_store.stats(),
+            "bundles": ground_station.router.bundles.stats() if ground_station.router.bundles else None,
+            "scheduler": ground_station.router.scheduler.stats() if ground_station.router.scheduler else None,
+            "links": ground_station.router.link_stats()
         }
         return jsonify({"status": "success", "ground_station_info": info}), 200
 
     except Exception as e:
         return jsonify({"error": f"Failed to retrieve ground station info: {str(e)}"}), 500
+
+@app.route('/get_stripes', methods=['GET'])
+def get_stripes():
+
+    source_id = request.args.get("source_id", type=int)
+    image_id = request.args.get("image_id", type=int)
+    if source_id is None or image_id is None:
+        return jsonify({"error": "source_id and image_id are required"}), 400
+    return jsonify({"status": "success", "stripes": ground_station.catalog.stripes(source_id, image_id)}), 200
+
+@app.route('/get_stripe', methods=['GET'])
+def get_stripe():
+
+    source_id = request.args.get("source_id", type=int)
+    image_id = request.args.get("image_id", type=int)
+    index = request.args.get("index", type=int)
+    if source_id is None or image_id is None or index is None:
+        return jsonify({"error": "source_id, image_id and index are required"}), 400
+    for stripe in ground_station.catalog.stripes(source_id, image_id):
+        if stripe["stripe_index"] == index and os.path.exists(stripe["path"]):
+            return send_file(os.path.abspath(stripe["path"]), mimetype="application/octet-stream")
+    return jsonify({"error": f"Stripe {index + 1} of image {image_id} is not stored here"}), 404
+
+@app.route('/merge_stripes', methods=['POST'])
+def merge_stripes():
+
+    if not ground_station or not ground_station.is_active():
+        return jsonify({"error": "Node is offline"}), 400
+
+    data = request.get_json(silent=True) or {}
+    if data.get("source_id") is None or data.get("image_id") is None:
+        return jsonify({"error": "source_id and image_id are required"}), 400
+    station_ids = data.get("station_ids") or range(GROUND_STATION_BASE_ID, GROUND_STATION_BASE_ID + NUM_GROUND_STATIONS)
+    try:
+        image_path = ground_station.merge_striped_image(data["source_id"], data["image_id"], station_ids)
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"status": "success", "image_path": image_path}), 200
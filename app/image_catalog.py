@@ -0,0 +1,168 @@
+# app/image_catalog.py
+
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+import time
+
+from app.config import CATALOG_PAGE_SIZE, CATALOG_MAX_PAGE_SIZE
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+RECEIVED_NAME = re.compile(r"image_from_satellite_(\d+)_")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    source_id INTEGER NOT NULL,
+    received_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    checksum TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_by_source ON images (source_id, id);
+CREATE INDEX IF NOT EXISTS images_by_time ON images (received_at);
+CREATE TABLE IF NOT EXISTS stripes (
+    path TEXT PRIMARY KEY,
+    source_id INTEGER NOT NULL,
+    image_id INTEGER NOT NULL,
+    stripe_index INTEGER NOT NULL,
+    stripe_count INTEGER NOT NULL,
+    stripe_offset INTEGER NOT NULL,
+    image_size INTEGER NOT NULL,
+    received_at REAL NOT NULL,
+    UNIQUE (source_id, image_id, stripe_index)
+);
+"""
+
+def file_checksum(path, block_size=1024 * 1024):
+
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as image_file:
+        for block in iter(lambda: image_file.read(block_size), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+class ImageCatalog:
+
+    def __init__(self, db_path, image_dir=None):
+
+        self.db_path = db_path
+        # Images already in image_dir when the catalog is first created are indexed once, so nothing goes missing.
+        self.image_dir = image_dir
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+
+        # Opened on first use, so nodes that never receive an image never create a database.
+        if self.connection is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            created = not os.path.exists(self.db_path)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+            if created and self.image_dir:
+                self._backfill()
+        return self.connection
+
+    def add(self, image_path, source_id, received_at=None):
+
+        size = os.path.getsize(image_path)
+        checksum = file_checksum(image_path)
+        with self.lock:
+            connection = self._connect()
+            # A rewritten file keeps one row with its latest metadata.
+            connection.execute(
+                "INSERT OR REPLACE INTO images (path, source_id, received_at, size, checksum) VALUES (?, ?, ?, ?, ?)",
+                (image_path, source_id, received_at or time.time(), size, checksum),
+            )
+            connection.commit()
+
+    def list(self, source_id=None, since=None, until=None, cursor=None, limit=CATALOG_PAGE_SIZE):
+
+        # Keyset pagination on id: pass the returned next_cursor to get the following page.
+        clauses, params = [], []
+        for clause, value in (("source_id = ?", source_id), ("received_at >= ?", since), ("received_at < ?", until), ("id > ?", cursor)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        limit = max(1, min(limit, CATALOG_MAX_PAGE_SIZE))
+        with self.lock:
+            rows = self._connect().execute(
+                f"SELECT id, path, source_id, received_at, size, checksum FROM images {where} ORDER BY id LIMIT ?",
+                params + [limit + 1],
+            ).fetchall()
+        entries = [
+            {"id": row[0], "path": row[1], "source_id": row[2], "received_at": row[3], "size": row[4], "checksum": row[5]}
+            for row in rows[:limit]
+        ]
+        next_cursor = entries[-1]["id"] if len(rows) > limit else None
+        return entries, next_cursor
+
+    def add_stripe(self, stripe_path, source_id, image_id, index, count, offset, image_size, received_at=None):
+
+        # Stripes are pieces of one image split across ground stations; they are kept out of the image listing until merged.
+        with self.lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO stripes (path, source_id, image_id, stripe_index, stripe_count, stripe_offset, image_size, received_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (stripe_path, source_id, image_id, index, count, offset, image_size, received_at or time.time()),
+            )
+            connection.commit()
+
+    def stripes(self, source_id, image_id):
+
+        with self.lock:
+            rows = self._connect().execute(
+                "SELECT path, stripe_index, stripe_count, stripe_offset, image_size, received_at FROM stripes "
+                "WHERE source_id = ? AND image_id = ? ORDER BY stripe_index",
+                (source_id, image_id),
+            ).fetchall()
+        return [
+            {"path": row[0], "source_id": source_id, "image_id": image_id, "stripe_index": row[1], "stripe_count": row[2],
+             "offset": row[3], "image_size": row[4], "received_at": row[5]}
+            for row in rows
+        ]
+
+    def count(self):
+
+        with self.lock:
+            return self._connect().execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def close(self):
+
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def _backfill(self):
+
+        if not os.path.isdir(self.image_dir):
+            return
+        rows = []
+        for name in sorted(os.listdir(self.image_dir)):
+            match = RECEIVED_NAME.match(name)
+            path = os.path.join(self.image_dir, name)
+            if match and name.endswith(IMAGE_EXTENSIONS) and "_preview." not in name:
+                rows.append((path, int(match.group(1)), os.path.getmtime(path), os.path.getsize(path), file_checksum(path)))
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO images (path, source_id, received_at, size, checksum) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        self.connection.commit()
+
+def gather_stripes(catalogs, source_id, image_id):
+
+    # Returns the stripes of one image found in any of the catalogs whose files are on this host, keyed by stripe index.
+    stripes = {}
+    for catalog in catalogs:
+        for stripe in catalog.stripes(source_id, image_id):
+            if os.path.exists(stripe["path"]):
+                stripes.setdefault(stripe["stripe_index"], stripe)
+    return stripes
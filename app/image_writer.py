@@ -0,0 +1,233 @@
+# app/image_writer.py
+
+import os
+import queue
+import threading
+import time
+import uuid
+
+from utils.logging_utils import log
+from app.config import IMAGE_WRITE_QUEUE_SIZE, IMAGE_WRITE_BATCH, IMAGE_FSYNC, IMAGE_WRITE_WAIT
+
+class ImageWriteJob:
+
+    def __init__(self, key, source_id, pieces, final_path, on_written, on_failed, on_done):
+
+        self.key = key
+        self.source_id = source_id
+        self.pieces = pieces
+        self.final_path = final_path
+        self.temp_path = f"{final_path}.partial"
+        self.on_written = on_written
+        self.on_failed = on_failed
+        self.on_done = on_done
+        self.bytes = 0
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.done = threading.Event()
+        self.waiters = []
+
+class ImageWriter:
+
+    def __init__(self, logger, image_dir, queue_size=IMAGE_WRITE_QUEUE_SIZE, batch_size=IMAGE_WRITE_BATCH, fsync=IMAGE_FSYNC):
+
+        self.logger = logger
+        self.image_dir = image_dir
+        # Request threads only queue the image; one writer thread drains the queue in batches so that a burst of
+        # completed images shares one directory fsync, and the queue bound pushes back on receivers when disks fall behind.
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.running = False
+        self.written = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.batches = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.max_queue_depth = 0
+
+    def start(self):
+
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def unique_path(self, source_id):
+
+        # The second keeps names sortable by arrival; the suffix keeps images from one satellite within a second apart.
+        return os.path.join(self.image_dir, f"image_from_satellite_{source_id}_{int(time.time())}_{uuid.uuid4().hex[:8]}.png")
+
+    def submit(self, source_id, pieces, key=None, on_written=None, on_failed=None, on_done=None):
+
+        # pieces is an iterable of bytes consumed on the writer thread; returns the path the image will be renamed to.
+        # on_failed(error) runs instead of on_written when the image could not be written.
+        self.start()
+        job = ImageWriteJob(key, source_id, pieces, self.unique_path(source_id), on_written, on_failed, on_done)
+        if key is not None:
+            with self.lock:
+                self.pending[key] = job
+        self.queue.put(job)
+        with self.lock:
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return job.final_path
+
+    def wait(self, key, timeout=IMAGE_WRITE_WAIT):
+
+        # Blocks until the image queued under key has been handled; False if it is still queued or failed to write.
+        with self.lock:
+            job = self.pending.get(key)
+        return job is None or (job.done.wait(timeout) and job.error is None)
+
+    def when_done(self, key, callback):
+
+        # Runs callback(written) on the writer thread once the image queued under key has been handled, without blocking
+        # the caller. Returns False when nothing is queued under key, leaving the caller to act at once.
+        with self.lock:
+            job = self.pending.get(key)
+            if job is None:
+                return False
+            job.waiters.append(callback)
+        return True
+
+    def flush(self, timeout=IMAGE_WRITE_WAIT):
+
+        with self.lock:
+            jobs = list(self.pending.values())
+        deadline = time.monotonic() + timeout
+        return all(job.done.wait(max(0, deadline - time.monotonic())) for job in jobs) and self.queue.unfinished_tasks == 0
+
+    def stats(self):
+
+        with self.lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "queue_size": self.queue.maxsize,
+                "written": self.written,
+                "failed": self.failed,
+                "bytes_written": self.bytes_written,
+                "batches": self.batches,
+                "mean_batch_size": (self.written + self.failed) / self.batches if self.batches else None,
+                "mean_write_latency": self.latency_total / self.written if self.written else None,
+                "max_write_latency": self.latency_max if self.written else None,
+            }
+
+    def _run(self):
+
+        while True:
+            jobs = [self.queue.get()]
+            while len(jobs) < self.batch_size:
+                try:
+                    jobs.append(self.queue.get_nowait())
+
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(jobs)
+
+            except Exception as e:
+                # Whatever went wrong, every job in the batch is settled so waiters and spools are not left hanging.
+                log(self.logger, f"Image write batch failed: {e}", level="error")
+                for job in jobs:
+                    if not job.done.is_set():
+                        job.error = job.error or e
+                        self._finish(job)
+
+            finally:
+                for _ in jobs:
+                    self.queue.task_done()
+
+    def _write_batch(self, jobs):
+
+        try:
+            os.makedirs(self.image_dir, exist_ok=True)
+
+        except OSError as e:
+            for job in jobs:
+                job.error = e
+        for job in jobs:
+            if job.error is not None:
+                continue
+            try:
+                with open(job.temp_path, "wb") as out_file:
+                    for piece in job.pieces:
+                        out_file.write(piece)
+                        job.bytes += len(piece)
+                    if self.fsync:
+                        out_file.flush()
+                        os.fsync(out_file.fileno())
+
+            except Exception as e:
+                job.error = e
+                if os.path.exists(job.temp_path):
+                    os.remove(job.temp_path)
+
+        # Renamed only after their data is on disk, so a crash leaves either a whole image or a .partial file.
+        for job in jobs:
+            if job.error is None:
+                try:
+                    os.replace(job.temp_path, job.final_path)
+
+                except OSError as e:
+                    job.error = e
+                    if os.path.exists(job.temp_path):
+                        os.remove(job.temp_path)
+        if self.fsync and hasattr(os, "O_DIRECTORY") and any(job.error is None for job in jobs):
+            try:
+                directory = os.open(self.image_dir, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(directory)
+
+                finally:
+                    os.close(directory)
+
+            except OSError as e:
+                # The images are in place; only the durability of their names across a crash is in doubt.
+                log(self.logger, f"Failed to sync image directory {self.image_dir}: {e}", level="warning")
+
+        now = time.monotonic()
+        with self.lock:
+            self.batches += 1
+            for job in jobs:
+                if job.error is None:
+                    self.written += 1
+                    self.bytes_written += job.bytes
+                    self.latency_total += now - job.submitted_at
+                    self.latency_max = max(self.latency_max, now - job.submitted_at)
+                else:
+                    self.failed += 1
+        for job in jobs:
+            self._finish(job)
+
+    def _finish(self, job):
+
+        try:
+            if job.error is not None:
+                log(self.logger, f"Failed to write image from Node {job.source_id}: {job.error}", level="error")
+                if job.on_failed:
+                    job.on_failed(job.error)
+            elif job.on_written:
+                job.on_written(job.final_path)
+
+        except Exception as e:
+            log(self.logger, f"Failed to process written image {job.final_path}: {e}", level="error")
+
+        finally:
+            if job.on_done:
+                job.on_done()
+            with self.lock:
+                if self.pending.get(job.key) is job:
+                    del self.pending[job.key]
+                waiters, job.waiters = job.waiters, []
+            for callback in waiters:
+                try:
+                    callback(job.error is None)
+
+                except Exception as e:
+                    log(self.logger, f"Failed to notify a waiter for image {job.final_path}: {e}", level="error")
+            job.done.set()
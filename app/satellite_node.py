@@ -1,23 +1,45 @@
 # app/satellite_node.py
 
-import zlib
 import requests
 from flask import request, jsonify, Flask
 from cryptography.hazmat.primitives.serialization import load_pem_public_key
 import base64
+import io
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from PIL import Image
-import os
+import numpy as np
 import random
+import uuid
 
 from network.network_manager import NetworkManager
 from network.route_manager import RouteManager
 from network.sync_manager import SyncManager
-from network.packet import Packet
+from network.packet import Packet, ImageChunkHeader, TransferStatus, ChunkQuery, MESSAGE_STATUS_REQUEST, MESSAGE_CHUNK_QUERY
+from network.outbox import Outbox
+from network.chunk_store import ChunkStore, chunk_digest
+from network.fec import FecEncoder, pack_parity
+from network.batcher import decode_frame
+from network.transport import HOP_HEADER
+from network.scheduler import completed
+from app.capture_pipeline import CapturePipeline
+from app.image_catalog import ImageCatalog
+from app.image_writer import ImageWriter
 from utils.encryption_utils import EncryptionManager
 from utils.logging_utils import setup_logger, log
 from utils.encryption_utils import *
+from utils.compression_utils import iter_compressed_chunks, select_codec, sample_file, get_codec
+from utils.delta_utils import DeltaEncoder, FrameReferences, FRAME_TYPE_NAMES, load_frame, save_frame
+from utils.stack_utils import FrameStacker
+from utils.tile_utils import ProgressiveImages, iter_progressive_payloads
+from utils.stripe_utils import StripeReader, stripe_ranges
+from app.config import (
+    TRANSMIT_WINDOW, STREAM_READ_SIZE, TRANSFER_STATUS_TIMEOUT, RETRANSMIT_ROUNDS, FEC_PARITY, DELTA_FRAMES,
+    DEDUP_CHUNKS, CHUNK_QUERY_BATCH, STACK_DEPTH, STACK_METHOD, CATALOG_PAGE_SIZE, GROUND_STATION_BASE_ID, STRIPED_DOWNLINK,
+    STRIPE_MIN_SIZE, PACKET_TTL
+)
 
 session = requests.Session()
 session.trust_env = False
@@ -27,13 +49,27 @@ satellite = None
 
 class SatelliteNode:
 
-    def __init__(self, node_id, position):
+    def __init__(self, node_id, position, start_services=True):
 
         self.node_id = node_id
         self.position = position
         self.sequence_number = 0
+        self.sequence_lock = threading.Lock()
         self.state = "ACTIVE"  
         self.last_received_packet = None
+        self.transmit_window = TRANSMIT_WINDOW
+        # Random start so transfer IDs from before a restart are not reused.
+        self.next_transfer_id = random.getrandbits(32)
+        self.outbox = Outbox(node_id)
+        self.last_transfer_stats = None
+        self.last_stack_stats = None
+        self.delta_encoder = DeltaEncoder()
+        self.frame_references = FrameReferences()
+        self.progressive_images = ProgressiveImages()
+        self.chunk_store = ChunkStore(node_id)
+        self.capture_pipeline = CapturePipeline(self)
+        # Satellites share the received_images directory, so each keeps its own catalog file there.
+        self.catalog = ImageCatalog(os.path.join("received_images", f"catalog_{node_id}.sqlite3"))
         
         self.encryption_manager = EncryptionManager()      
         self.network = NetworkManager(self)
@@ -42,12 +78,15 @@ class SatelliteNode:
         
         self.general_logger = setup_logger(self.node_id, "general")
         self.routing_logger = setup_logger(self.node_id, "routing")
+        self.image_writer = ImageWriter(self.general_logger, "received_images")
 
         self.neighbor_public_keys = {}  
         self.shared_symmetric_keys = {}
         
-        self.sync_manager.start()
-        self.network.start()        
+        if start_services:
+            self.sync_manager.start()
+            self.network.start()
+            self.router.start()        
         
     def get_local_time(self):
        
@@ -74,6 +113,7 @@ class SatelliteNode:
        
         self.state = "ACTIVE"
         log(self.general_logger, f"Node {self.node_id} has RECOVERED and is back online.")
+        threading.Thread(target=self.resume_transfers, daemon=True).start()
 
     def create_packet(self, dest_id, payload, message_type=1):
        
@@ -81,65 +121,493 @@ class SatelliteNode:
             log(self.general_logger, "Node is offline and cannot create a packet.")
             return None
 
-        packet = Packet(
-            version=1,
-            message_type=message_type,
-            source_id=self.node_id,
-            dest_id=dest_id,
-            sequence_number=self.sequence_number,
-            payload=payload,
-            ttl=10
-        )
-        self.sequence_number += 1
+        # Text from /send arrives as str; packets carry bytes so they can be encrypted, batched or held on disk.
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        with self.sequence_lock:
+            packet = Packet(
+                version=1,
+                message_type=message_type,
+                source_id=self.node_id,
+                dest_id=dest_id,
+                sequence_number=self.sequence_number,
+                payload=payload,
+                ttl=PACKET_TTL
+            )
+            self.sequence_number += 1
         return packet
 
-    def capture_image(self, image_dir="satellite_captured_images"):
-        
+    def new_transfer_id(self):
+
+        with self.sequence_lock:
+            self.next_transfer_id = (self.next_transfer_id + 1) & 0xFFFFFFFF
+            return self.next_transfer_id
+
+    def expose(self):
+
+        return Image.new('RGB', (1024, 1024), color=(random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
+
+    def captured_image_path(self, prefix, image_dir="satellite_captured_images"):
+
         image_dir = os.path.join(image_dir, f"Node_{self.node_id}")
         if not os.path.exists(image_dir):
             os.makedirs(image_dir)
-        image_name = f"astro_image_{int(time.time())}.png"
-        image_path = os.path.join(image_dir, image_name)
+        # The capture worker can run ahead of the downlink, so captures within one second need distinct names.
+        return os.path.join(image_dir, f"{prefix}_{int(time.time())}_{uuid.uuid4().hex[:8]}.png")
 
-        img = Image.new('RGB', (1024, 1024), color=(random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
+    def capture_image(self, image_dir="satellite_captured_images"):
+        
+        image_path = self.captured_image_path("astro_image", image_dir)
+        img = self.expose()
         img.save(image_path)
         return image_path
 
-    def transmit_image(self, dest_id, image_path):
+    def capture_stack(self, depth=None, method=None):
+
+        # Combines depth exposures into one frame; only the stacked result is written and sent.
+        stacker = FrameStacker(depth or STACK_DEPTH, method or STACK_METHOD)
+        start = time.monotonic()
+        try:
+            for _ in range(stacker.depth):
+                img = self.expose()
+                stacker.add(np.asarray(img))
+            stacked = stacker.result()
+
+        finally:
+            stacker.discard()
+        image_path = self.captured_image_path("astro_stack")
+        save_frame(stacked, img.mode, image_path)
+        self.last_stack_stats = {
+            "depth": stacker.count,
+            "method": stacker.method,
+            "seconds": time.monotonic() - start,
+            "peak_bytes": stacker.peak_bytes,
+            "frames_not_sent": stacker.count - 1,
+        }
+        log(self.general_logger, f"Stacked {stacker.count} exposures ({stacker.method}) into {image_path}")
+        return image_path
+
+    def capture(self, options):
+
+        # options is the JSON body of /capture_image; "stack_depth" turns on on-board stacking.
+        if options.get("stack_depth"):
+            return self.capture_stack(options["stack_depth"], options.get("stack_method"))
+        return self.capture_image()
+
+    def save_received_image(self, image_data, source_id):
+
+        # Queued on the image writer; the image appears at the returned path once written.
+        return self.image_writer.submit(source_id, [image_data])
+
+    def transmit_captured(self, dest_id, image_path, options):
+
+        # options is the JSON body of /capture_image. Returns (complete, stats) so concurrent jobs each get their own stats.
+        if options.get("striped", STRIPED_DOWNLINK):
+            return self.send_striped(image_path, options.get("dest_ids"), fec_parity=options.get("fec_parity"), codec=options.get("codec"),
+                                     dedup=options.get("dedup"))
+        if options.get("progressive"):
+            return self.send_progressive(dest_id, image_path, fec_parity=options.get("fec_parity"), codec=options.get("codec"),
+                                         dedup=options.get("dedup"))
+        return self.send_image(dest_id, image_path, fec_parity=options.get("fec_parity"), codec=options.get("codec"),
+                               delta=options.get("delta"), dedup=options.get("dedup"))
+
+    def transmit_image(self, dest_id, image_path, fec_parity=None, codec=None, delta=None, dedup=None):
+
+        # The transmit_* methods return whether the image arrived and keep its stats in last_transfer_stats for a single
+        # caller; anything sending from several threads at once uses the send_* methods, which return the stats.
+        complete, self.last_transfer_stats = self.send_image(dest_id, image_path, fec_parity, codec, delta, dedup)
+        return complete
+
+    def transmit_progressive(self, dest_id, image_path, fec_parity=None, codec=None, dedup=None):
+
+        complete, self.last_transfer_stats = self.send_progressive(dest_id, image_path, fec_parity, codec, dedup)
+        return complete
+
+    def transmit_striped(self, image_path, dest_ids=None, fec_parity=None, codec=None, dedup=None, min_size=STRIPE_MIN_SIZE):
+
+        complete, self.last_transfer_stats = self.send_striped(image_path, dest_ids, fec_parity, codec, dedup, min_size)
+        return complete
+
+    def send_image(self, dest_id, image_path, fec_parity=None, codec=None, delta=None, dedup=None):
         
         if not self.is_active():
             log(self.general_logger, "Node is offline and cannot transmit an image.")
-            return False
+            return False, None
     
+        delta = DELTA_FRAMES if delta is None else delta
+        transfer_id = self.new_transfer_id()
+        frame_type = None
         try:
-            with open(image_path, "rb") as img_file:
-                image_data = img_file.read()
+            if delta:
+                # The transfer ID doubles as the frame ID the receiver caches it under.
+                frame_type, payload = self.delta_encoder.encode(dest_id, transfer_id, *load_frame(image_path))
+                log(self.general_logger, f"Encoded {FRAME_TYPE_NAMES[frame_type]} frame {transfer_id} for Node {dest_id}: {len(payload)} bytes")
+                img_file = io.BytesIO(payload)
+            else:
+                img_file = open(image_path, "rb")
 
         except FileNotFoundError:
             log(self.general_logger, f"Image file not found: {image_path}")
-            return False
-    
-        log(self.general_logger, f"Size before compression {len(image_data)}")
-        image_data = zlib.compress(image_data)
-        chunk_size = 512  
-        total_chunks = (len(image_data) + chunk_size - 1) // chunk_size  
-        log(self.general_logger, f"Image len {len(image_data)}; Chunk size {chunk_size}")
-    
-        for i in range(total_chunks):
-            chunk = image_data[i * chunk_size:(i + 1) * chunk_size]
-            metadata = f"{i + 1}/{total_chunks}".encode('utf-8')  
-            payload = metadata + b"|" + chunk  
-    
-            packet = self.create_packet(dest_id=dest_id, payload=payload, message_type=2)
-            if not packet:
-                return False
-    
-            if not self.router.forward_packet(packet):
-                log(self.general_logger, f"Failed to send chunk {i + 1} of {total_chunks}")
+            return False, None
+
+        with img_file:
+            transfer, codec, first_pass = self.send_payload(dest_id, transfer_id, img_file, image_path, fec_parity, codec, dedup)
+        complete = self.complete_transfer(transfer)
+        stats = dict(first_pass, chunk_size=transfer.chunk_size, codec=codec.name, retransmitted_chunks=transfer.retransmitted_chunks,
+                                        complete=complete, frame=FRAME_TYPE_NAMES.get(frame_type),
+                                        deduplicated_chunks=transfer.deduplicated_chunks, bytes_avoided=transfer.bytes_avoided)
+        if delta and complete:
+            if transfer.status.needs_key_frame():
+                log(self.general_logger, f"Node {dest_id} lacks the reference for frame {transfer_id}; resending as a key frame", level="warning")
+                self.delta_encoder.reset(dest_id)
+                return self.send_image(dest_id, image_path, fec_parity, codec, delta, dedup)
+            self.delta_encoder.acknowledge(dest_id, transfer_id)
+        return complete, stats
+
+    def send_progressive(self, dest_id, image_path, fec_parity=None, codec=None, dedup=None):
+
+        if not self.is_active():
+            log(self.general_logger, "Node is offline and cannot transmit an image.")
+            return False, None
+
+        try:
+            pixels, mode = load_frame(image_path)
+
+        except FileNotFoundError:
+            log(self.general_logger, f"Image file not found: {image_path}")
+            return False, None
+
+        # The overview's transfer ID names the whole image; every tile is its own transfer so it completes on its own.
+        image_id = self.new_transfer_id()
+        transfers = []
+        sent_bytes = 0
+        overview_seconds = None
+        start = time.monotonic()
+        for payload in iter_progressive_payloads(image_id, pixels, mode):
+            if not self.is_active():
+                log(self.general_logger, f"Node went offline after {len(transfers)} parts of progressive image {image_id}", level="error")
+                break
+            transfer_id = image_id if not transfers else self.new_transfer_id()
+            with io.BytesIO(payload) as payload_file:
+                # The codec chosen for the overview is reused for the tiles rather than sampled per tile.
+                transfer, codec, first_pass = self.send_payload(dest_id, transfer_id, payload_file, image_path, fec_parity, codec, dedup)
+            transfers.append(transfer)
+            sent_bytes += first_pass["bytes"]
+            if overview_seconds is None:
+                overview_seconds = time.monotonic() - start
+        else:
+            log(self.general_logger, f"Sent progressive image {image_id} as an overview and {len(transfers) - 1} tiles; confirming delivery")
+
+        results = [self.complete_transfer(transfer) for transfer in transfers]
+        complete = self.is_active() and len(transfers) > 1 and all(results)
+        stats = {
+            "dest_id": dest_id,
+            "image_id": image_id,
+            "transfers": len(transfers),
+            "bytes": sent_bytes,
+            "overview_seconds": overview_seconds,
+            "seconds": time.monotonic() - start,
+            "codec": codec.name if transfers else None,
+            "retransmitted_chunks": sum(transfer.retransmitted_chunks for transfer in transfers),
+            "deduplicated_chunks": sum(transfer.deduplicated_chunks for transfer in transfers),
+            "bytes_avoided": sum(transfer.bytes_avoided for transfer in transfers),
+            "complete": complete,
+        }
+        return complete, stats
+
+    def reachable_ground_stations(self):
+
+        return sorted(node_id for node_id in self.network.routing_table if node_id >= GROUND_STATION_BASE_ID)
+
+    def send_striped(self, image_path, dest_ids=None, fec_parity=None, codec=None, dedup=None, min_size=STRIPE_MIN_SIZE):
+
+        if not self.is_active():
+            log(self.general_logger, "Node is offline and cannot transmit an image.")
+            return False, None
+
+        dest_ids = list(dest_ids or self.reachable_ground_stations())
+        if not dest_ids:
+            log(self.general_logger, "No ground station is reachable for a striped downlink", level="error")
+            return False, None
+        try:
+            size = os.path.getsize(image_path)
+
+        except FileNotFoundError:
+            log(self.general_logger, f"Image file not found: {image_path}")
+            return False, None
+        # Below min_size the extra transfers cost more than the parallel links save.
+        if len(dest_ids) == 1 or size < min_size:
+            return self.send_image(dest_ids[0], image_path, fec_parity, codec, dedup=dedup)
+
+        # Each station gets one contiguous byte range of the file as its own transfer; the ground merges them by image ID.
+        image_id = self.new_transfer_id()
+        ranges = stripe_ranges(size, len(dest_ids))
+        with open(image_path, "rb") as img_file:
+            codec = get_codec(codec) if codec is not None else select_codec(sample_file(img_file))
+        start = time.monotonic()
+        transfers = {}
+
+        def send_stripe(index, dest_id):
+
+            stripe_start = time.monotonic()
+            offset, length = ranges[index]
+            with StripeReader(image_path, image_id, index, len(ranges), offset, length, size) as payload_file:
+                transfer, _, _ = self.send_payload(dest_id, self.new_transfer_id(), payload_file, image_path, fec_parity, codec, dedup)
+            transfers[index] = transfer
+            complete = self.complete_transfer(transfer)
+            return {
+                "dest_id": dest_id,
+                "stripe": index + 1,
+                "transfer_id": transfer.transfer_id,
+                "bytes": length,
+                "seconds": time.monotonic() - stripe_start,
+                "retransmitted_chunks": transfer.retransmitted_chunks,
+                "complete": complete,
+            }
+
+        with ThreadPoolExecutor(max_workers=len(dest_ids)) as executor:
+            stripes = list(executor.map(send_stripe, range(len(ranges)), dest_ids))
+        # A stripe whose station dropped out of view goes again through a station that took its own stripe.
+        delivered = [stripe["dest_id"] for stripe in stripes if stripe["complete"]]
+        for index, stripe in enumerate(stripes):
+            if not stripe["complete"] and delivered and self.is_active():
+                dest_id = delivered[index % len(delivered)]
+                log(self.general_logger, f"Stripe {index + 1} of image {image_id} failed to reach Node {stripe['dest_id']}; resending via Node {dest_id}", level="warning")
+                # The stripe now goes elsewhere, so the failed transfer must not be resumed later.
+                self.outbox.remove(transfers[index])
+                stripes[index] = send_stripe(index, dest_id)
+
+        complete = all(stripe["complete"] for stripe in stripes)
+        stats = {
+            "image_id": image_id,
+            "dest_ids": dest_ids,
+            "stripes": stripes,
+            "bytes": size,
+            "seconds": time.monotonic() - start,
+            "codec": codec.name,
+            "retransmitted_chunks": sum(stripe["retransmitted_chunks"] for stripe in stripes),
+            "complete": complete,
+        }
+        log(self.general_logger, f"Striped image {image_id} across {len(dest_ids)} ground stations: {'complete' if complete else 'incomplete'}")
+        return complete, stats
+
+    def send_payload(self, dest_id, transfer_id, img_file, image_path, fec_parity=None, codec=None, dedup=None):
+
+        # First pass only: compresses, spools and sends every chunk once; complete_transfer repairs the gaps. Returns the
+        # transfer, the codec used and the first pass's window stats.
+        dedup = DEDUP_CHUNKS if dedup is None else dedup
+        chunk_size = self.router.dedup_chunk_size(dest_id) if dedup else self.router.chunk_size_for(dest_id)
+        codec = get_codec(codec) if codec is not None else select_codec(sample_file(img_file))
+        size = img_file.seek(0, os.SEEK_END)
+        img_file.seek(0)
+        log(self.general_logger, f"Size before compression {size}; Chunk size {chunk_size}; Codec {codec.name}")
+        transfer = self.outbox.create(transfer_id, dest_id, chunk_size, image_path, codec.codec_id, dedup)
+        recorded = transfer.record(iter_compressed_chunks(img_file, chunk_size, STREAM_READ_SIZE, codec))
+        chunks = recorded
+        stored = set()
+        if dedup:
+            # Skipping stored chunks needs every digest up front, so the payload is spooled before the first pass.
+            for _ in recorded:
+                pass
+            stored = self.query_stored_chunks(transfer)
+            chunks = transfer.iter_chunks()
+        payloads = self.iter_chunk_payloads(transfer, chunks, FEC_PARITY if fec_parity is None else fec_parity, stored)
+        stats = self.send_chunks_windowed(dest_id, payloads, transfer_id=transfer.transfer_id)
+        # Finish spooling whatever a failed first pass did not send, so a later resume has every chunk.
+        for _ in recorded:
+            pass
+        return transfer, codec, stats
+
+    def iter_chunk_payloads(self, transfer, chunks, fec_parity=0, stored=()):
+
+        # Yields (chunk_number, payload); parity chunks use None since they are never acknowledged or resent.
+        encoder = FecEncoder(fec_parity) if fec_parity else None
+        for chunk_number, is_last, chunk in chunks:
+            # The total is only known once compression finishes, so only the final chunk carries it.
+            total_chunks = chunk_number if is_last else 0
+            if chunk_number in stored:
+                transfer.deduplicated_chunks += 1
+                transfer.bytes_avoided += len(chunk)
+            yield chunk_number, self.chunk_payload(transfer, chunk_number, total_chunks, chunk, chunk_number in stored)
+            if encoder:
+                for group_start, group_size, parity_index, last_length, parity in encoder.add(chunk_number, is_last, chunk):
+                    header = ImageChunkHeader(transfer.transfer_id, group_start, total_chunks, ImageChunkHeader.FLAG_PARITY, transfer.codec_id)
+                    yield None, header.pack(pack_parity(group_size, fec_parity, parity_index, last_length, parity))
+
+    def chunk_payload(self, transfer, chunk_number, total_chunks, chunk, reference=False):
+
+        flags = ImageChunkHeader.FLAG_LAST if chunk_number == total_chunks else 0
+        if transfer.dedup:
+            # A reference sends only the digest of a chunk the destination already stores.
+            digest = chunk_digest(chunk)
+            flags |= ImageChunkHeader.FLAG_HASHED | (ImageChunkHeader.FLAG_REFERENCE if reference else 0)
+            chunk = digest if reference else digest + bytes(chunk)
+        return ImageChunkHeader(transfer.transfer_id, chunk_number, total_chunks, flags, transfer.codec_id).pack(chunk)
+
+    def complete_transfer(self, transfer):
+
+        # Selective repeat: ask the destination which chunks it holds and resend only the gaps.
+        for _ in range(RETRANSMIT_ROUNDS):
+            if not self.is_active():
+                log(self.general_logger, f"Node is offline; transfer {transfer.transfer_id} stays queued for resume.")
                 return False
-    
-        log(self.general_logger, f"Successfully transmitted image in {total_chunks} chunks.")
-        return True
+
+            status = self.request_transfer_status(transfer)
+            if status is None:
+                log(self.general_logger, f"No status reply for transfer {transfer.transfer_id} from Node {transfer.dest_id}", level="warning")
+                continue
+            if status.is_complete():
+                log(self.general_logger, f"Transfer {transfer.transfer_id} to Node {transfer.dest_id} confirmed complete.")
+                self.router.record_delivery(transfer.dest_id, 1.0)
+                self.outbox.remove(transfer)
+                return True
+
+            missing = status.missing(transfer.total_chunks)
+            self.router.record_delivery(transfer.dest_id, 1 - len(missing) / transfer.total_chunks)
+            log(self.general_logger, f"Transfer {transfer.transfer_id}: retransmitting {len(missing)}/{transfer.total_chunks} chunks")
+            transfer.retransmitted_chunks += len(missing)
+            chunks = (
+                (chunk_number, self.chunk_payload(transfer, chunk_number, transfer.total_chunks, transfer.read_chunk(chunk_number)))
+                for chunk_number in missing
+            )
+            self.send_chunks_windowed(transfer.dest_id, chunks, transfer_id=transfer.transfer_id)
+
+        log(self.general_logger, f"Transfer {transfer.transfer_id} to Node {transfer.dest_id} incomplete after {RETRANSMIT_ROUNDS} rounds", level="error")
+        return False
+
+    def request_transfer_status(self, transfer):
+
+        transfer.status_event.clear()
+        request_payload = TransferStatus(transfer.transfer_id, transfer.total_chunks).pack()
+        packet = self.create_packet(dest_id=transfer.dest_id, payload=request_payload, message_type=MESSAGE_STATUS_REQUEST)
+        if packet is None:
+            return None
+        delivery = self.router.forward_packet(packet)
+        self.router.flush()
+        if not delivery.result():
+            return None
+        if not transfer.status_event.wait(TRANSFER_STATUS_TIMEOUT):
+            return None
+        return transfer.status
+
+    def query_stored_chunks(self, transfer):
+
+        # Returns the chunk numbers whose content the destination already holds in its chunk store.
+        hashes = [chunk_digest(chunk) for _, _, chunk in transfer.iter_chunks()]
+        stored = set()
+        for start in range(0, len(hashes), CHUNK_QUERY_BATCH):
+            query = ChunkQuery(transfer.transfer_id, start + 1, hashes[start:start + CHUNK_QUERY_BATCH])
+            transfer.stored_event.clear()
+            packet = self.create_packet(dest_id=transfer.dest_id, payload=query.pack(), message_type=MESSAGE_CHUNK_QUERY)
+            if packet is None:
+                break
+            delivery = self.router.forward_packet(packet)
+            self.router.flush()
+            if not delivery.result():
+                break
+            if not transfer.stored_event.wait(TRANSFER_STATUS_TIMEOUT):
+                log(self.general_logger, f"No chunk query reply for transfer {transfer.transfer_id}; sending the remaining chunks in full", level="warning")
+                break
+            stored.update(chunk_number for chunk_number in range(query.first_chunk, query.first_chunk + len(query.hashes))
+                          if transfer.stored.has_chunk(chunk_number))
+        log(self.general_logger, f"Node {transfer.dest_id} already stores {len(stored)}/{len(hashes)} chunks of transfer {transfer.transfer_id}")
+        return stored
+
+    def handle_chunk_have(self, sender_id, status):
+
+        transfer = self.outbox.get(status.transfer_id)
+        if transfer is None or transfer.dest_id != sender_id:
+            log(self.general_logger, f"Ignoring chunk query reply for unknown transfer {status.transfer_id} from Node {sender_id}")
+            return
+        transfer.stored = status
+        transfer.stored_event.set()
+
+    def handle_transfer_status(self, sender_id, status):
+
+        transfer = self.outbox.get(status.transfer_id)
+        if transfer is None or transfer.dest_id != sender_id:
+            log(self.general_logger, f"Ignoring status for unknown transfer {status.transfer_id} from Node {sender_id}")
+            return
+        transfer.status = status
+        transfer.status_event.set()
+
+    def resume_transfers(self):
+
+        for transfer in self.outbox.pending():
+            if not transfer.is_recorded():
+                log(self.general_logger, f"Dropping transfer {transfer.transfer_id}: it was interrupted before its chunks were spooled", level="warning")
+                self.outbox.remove(transfer)
+                continue
+            log(self.general_logger, f"Resuming transfer {transfer.transfer_id} to Node {transfer.dest_id}")
+            self.complete_transfer(transfer)
+
+    def send_chunks_windowed(self, dest_id, chunks, window=None, transfer_id=None):
+
+        # Returns the pass's stats; failed_chunks is empty when the next hop took every chunk.
+        window = window or self.transmit_window
+        in_flight = {}
+        acked = set()
+        failed = []
+        total_chunks = 0
+        parity_chunks = 0
+        sent_bytes = 0
+        start = time.monotonic()
+
+        def collect(done):
+
+            for delivery in done:
+                chunk_number = in_flight.pop(delivery)
+                if delivery.result():
+                    if chunk_number is not None:
+                        acked.add(chunk_number)
+                elif chunk_number is None:
+                    # Parity is redundant; losing it only costs protection, selective repeat still covers the data.
+                    log(self.general_logger, "Failed to send a parity chunk", level="warning")
+                else:
+                    log(self.general_logger, f"Failed to send chunk {chunk_number}", level="error")
+                    failed.append(chunk_number)
+
+        # A chunk leaves the window once the next hop has acknowledged the batch carrying it. A full window is flushed
+        # so it never waits on a batch that is still filling up.
+        for chunk_number, payload in chunks:
+            if len(in_flight) >= window:
+                done, _ = wait(in_flight, timeout=0, return_when=FIRST_COMPLETED)
+                if not done:
+                    self.router.flush()
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            if failed:
+                break
+            packet = self.create_packet(dest_id=dest_id, payload=payload, message_type=2)
+            in_flight[self.router.forward_packet(packet) if packet is not None else completed(False)] = chunk_number
+            if chunk_number is None:
+                parity_chunks += 1
+            else:
+                total_chunks += 1
+            sent_bytes += len(payload)
+        self.router.flush()
+        collect(wait(in_flight).done)
+
+        elapsed = time.monotonic() - start
+        stats = {
+            "dest_id": dest_id,
+            "transfer_id": transfer_id,
+            "total_chunks": total_chunks,
+            "parity_chunks": parity_chunks,
+            "acked_chunks": len(acked),
+            "failed_chunks": sorted(failed),
+            "bytes": sent_bytes,
+            "seconds": elapsed,
+            "throughput_bps": sent_bytes / elapsed if elapsed > 0 else 0.0,
+            "window": window,
+        }
+        if failed:
+            log(self.general_logger, f"Image transmission to {dest_id} failed: {len(acked)}/{total_chunks} chunks acknowledged", level="error")
+            return stats
+
+        log(self.general_logger, f"Successfully transmitted image in {total_chunks} chunks "
+            f"({sent_bytes} bytes in {elapsed:.3f}s, {stats['throughput_bps']:.0f} B/s, window {window}).")
+        return stats
     
     def exchange_keys_with_neighbor(self, neighbor_id):
        
@@ -169,6 +637,13 @@ class SatelliteNode:
             log(self.general_logger, f"Error during key exchange with Node {neighbor_id}: {e}", level="error")
             return False
 
+    def accept_public_key(self, sender_id, public_key_base64):
+
+        public_key_pem = base64.b64decode(public_key_base64)
+        self.neighbor_public_keys[sender_id] = load_pem_public_key(public_key_pem)
+        self.shared_symmetric_keys[sender_id] = self.encryption_manager.generate_shared_secret(public_key_pem)
+        log(self.general_logger, f"Key exchange successful with Node {sender_id}")
+
     def establish_symmetric_key(self, neighbor_id, public_key_bytes):       
        
         shared_key = self.encryption_manager.generate_shared_secret(public_key_bytes)
@@ -216,18 +691,59 @@ def capture_and_transmit_image():
     
     if not satellite or not satellite.is_active():
         return jsonify({"error": "Node is offline"}), 400
-    
-    try:
-        image_path = satellite.capture_image()
 
-    except Exception as e:
-        return jsonify({"error": f"Failed to capture image: {str(e)}"}), 500
-   
-    dest_id = 1001
-    success = satellite.transmit_image(dest_id=dest_id, image_path=image_path)
-    if success:
-        return jsonify({"status": "image_captured_and_transmitted", "image_path": image_path, "dest_id": dest_id}), 200    
-    return jsonify({"error": "Failed to transmit image"}), 500
+    options = request.get_json(silent=True) or {}
+    dest_id = options.get("dest_id", GROUND_STATION_BASE_ID)
+    job = satellite.capture_pipeline.submit(dest_id, options)
+    if job is None:
+        return jsonify({"error": "Capture queue is full", "pipeline": satellite.capture_pipeline.stats()}), 429
+
+    # Callers that still want the old blocking behaviour pass {"wait": true}.
+    if not options.get("wait"):
+        return jsonify({"status": "capture_queued", "job_id": job.job_id, "dest_id": dest_id, "pipeline": satellite.capture_pipeline.stats()}), 202
+    job.done.wait()
+    if job.state == "done":
+        return jsonify({"status": "image_captured_and_transmitted", "job_id": job.job_id, "image_path": job.image_path, "dest_id": dest_id, "transfer": job.transfer}), 200
+    return jsonify({"error": job.error or "Failed to transmit image", "job": job.to_json()}), 500
+
+@app.route('/capture_status', methods=['GET'])
+def capture_status():
+
+    if not satellite:
+        return jsonify({"error": "Satellite instance not initialized"}), 400
+
+    job_id = request.args.get("job_id", type=int)
+    if job_id is None:
+        return jsonify({"status": "success", "pipeline": satellite.capture_pipeline.stats()}), 200
+    job = satellite.capture_pipeline.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown capture job {job_id}"}), 404
+    return jsonify({"status": "success", "job": job.to_json(), "pipeline": satellite.capture_pipeline.stats()}), 200
+
+@app.route('/get_bundle_stats', methods=['GET'])
+def get_bundle_stats():
+
+    if not satellite:
+        return jsonify({"error": "Satellite instance not initialized"}), 400
+    if satellite.router.bundles is None:
+        return jsonify({"error": "Store-and-forward is disabled"}), 404
+    return jsonify({"status": "success", "bundles": satellite.router.bundles.stats()}), 200
+
+@app.route('/get_scheduler_stats', methods=['GET'])
+def get_scheduler_stats():
+
+    if not satellite:
+        return jsonify({"error": "Satellite instance not initialized"}), 400
+    if satellite.router.scheduler is None:
+        return jsonify({"error": "Outbound scheduling is disabled"}), 404
+    return jsonify({"status": "success", "scheduler": satellite.router.scheduler.stats()}), 200
+
+@app.route('/get_link_stats', methods=['GET'])
+def get_link_stats():
+
+    if not satellite:
+        return jsonify({"error": "Satellite instance not initialized"}), 400
+    return jsonify({"status": "success", "links": satellite.router.link_stats()}), 200
 
 @app.route('/get_received_images', methods=['GET'])
 def get_received_images():
@@ -235,11 +751,15 @@ def get_received_images():
     if not satellite or not satellite.is_active():
         return jsonify({"error": "Node is offline"}), 400
 
-    image_dir = "received_images"
-    if not os.path.exists(image_dir):
-        return jsonify({"images": []}), 200
-    images = [os.path.join(image_dir, img) for img in os.listdir(image_dir) if img.endswith(".png")]
-    return jsonify({"images": images}), 200
+    entries, next_cursor = satellite.catalog.list(
+        source_id=request.args.get("source_id", type=int),
+        since=request.args.get("since", type=float),
+        until=request.args.get("until", type=float),
+        cursor=request.args.get("cursor", type=int),
+        limit=request.args.get("limit", CATALOG_PAGE_SIZE, type=int),
+    )
+    previews = satellite.progressive_images.previews()
+    return jsonify({"images": [entry["path"] for entry in entries], "entries": entries, "next_cursor": next_cursor, "previews": previews}), 200
 
 
 @app.route('/send', methods=['POST'])
@@ -255,7 +775,7 @@ def send_message():
         return jsonify({"error": "Destination ID not provided"}), 400
 
     packet = satellite.create_packet(dest_id=dest_id, payload=payload, message_type=1)
-    success = satellite.router.forward_packet(packet)
+    success = packet is not None and satellite.router.forward_packet(packet).result()
 
     if success:
         return jsonify({"status": "packet_sent"}), 200
@@ -272,9 +792,30 @@ def receive():
     if not data:
         return jsonify({"status": "error", "message": "Empty data received"}), 400
 
-    response = satellite.router.receive_packet(data)
+    handled = satellite.router.receive_packet(data, request.headers.get(HOP_HEADER, type=int))
     log(satellite.routing_logger, f"last received packet: {satellite.last_received_packet}")
-    return jsonify(response), 200
+    # The status code is the sender's acknowledgement, so a rejected packet must not answer 200.
+    if not handled:
+        return jsonify({"status": "rejected"}), 422
+    return jsonify({"status": "received"}), 200
+
+
+@app.route('/receive_batch', methods=['POST'])
+def receive_batch():
+   
+    if not satellite or not satellite.is_active():
+        return jsonify({"error": "Node is offline"}), 400
+
+    try:
+        packets = decode_frame(request.get_data())
+
+    except ValueError as e:
+        log(satellite.general_logger, f"Error decoding packet batch: {e}", level="error")
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    hop_id = request.headers.get(HOP_HEADER, type=int)
+    handled = sum(1 for packet in packets if satellite.router.receive_packet(packet, hop_id))
+    return jsonify({"status": "batch_received", "count": len(packets), "handled": handled, "failed": len(packets) - handled}), 200
 
 
 @app.route('/get_position', methods=['GET'])
@@ -300,7 +841,7 @@ def update_position():
     data = request.get_json()
     neighbor_id = data['node_id']
     position = tuple(data['position'])
-    satellite.network.update_position_with_neighbor(neighbor_id, position)
+    satellite.network.update_position_with_neighbor(neighbor_id, position, data.get("mtu"))
     return jsonify({"status": "position updated"}), 200
 
 @app.route('/receive_routing_table', methods=['POST'])
@@ -310,10 +851,20 @@ def receive_routing_table():
         return jsonify({"error": "Node is offline"}), 400
 
     received_table = request.get_json()
-    sender_id = int(request.remote_addr.split('.')[-1])  
+    sender_id = request.args.get("sender_id", type=int) or int(request.remote_addr.split('.')[-1])  
     satellite.network.update_routing_table(received_table, sender_id)
     return jsonify({"status": "received"}), 200
 
+@app.route('/receive_lsa', methods=['POST'])
+def receive_lsa():
+
+    if not satellite or not satellite.is_active():
+        return jsonify({"error": "Node is offline"}), 400
+    data = request.get_json()
+    sender_id = request.args.get("sender_id", type=int)
+    accepted = satellite.network.receive_lsas(data.get("lsas", []), sender_id)
+    return jsonify({"status": "received", "accepted": accepted}), 200
+
 @app.route('/get_routing_table', methods=['GET'])
 def get_routing_table():
    
@@ -352,7 +903,7 @@ def handle_heartbeat():
     if not sender_id or not timestamp:
         return jsonify({"status": "error", "message": "Invalid heartbeat data"}), 400
 
-    satellite.network.receive_heartbeat(sender_id, timestamp)
+    satellite.network.receive_heartbeat(sender_id, timestamp, data.get("mtu"))
     return jsonify({"status": "success"}), 200
 
 @app.route('/get_neighbors', methods=['GET'])
@@ -410,14 +961,7 @@ def exchange_key():
 
     try:
         
-        public_key_pem = base64.b64decode(public_key_base64)
-        public_key = load_pem_public_key(public_key_pem)        
-        satellite.neighbor_public_keys[sender_id] = public_key
-        shared_key = satellite.encryption_manager.generate_shared_secret(public_key_pem)
-
-        satellite.shared_symmetric_keys[sender_id] = shared_key
-        log(satellite.general_logger, f"[[KEY] {satellite.shared_symmetric_keys}")
-        log(satellite.general_logger, f"Key exchange successful with Node {sender_id}")
+        satellite.accept_public_key(sender_id, public_key_base64)
         return jsonify({"status": "key_exchange_successful"}), 200
 
     except Exception as e:
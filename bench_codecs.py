@@ -0,0 +1,53 @@
+import argparse
+import io
+import numpy as np
+from PIL import Image
+
+from utils.compression_utils import available_codecs, get_codec, measure_codecs, select_codec, CODEC_SAMPLE_SIZE
+
+def star_field(size, rng):
+
+    # Dark sky with read noise and a few hundred Gaussian stars, as a 16-bit sensor would record it.
+    frame = rng.normal(400, 12, (size, size))
+    ys, xs = np.mgrid[0:size, 0:size]
+    for _ in range(size // 4):
+        y, x = rng.uniform(0, size, 2)
+        frame += rng.uniform(500, 20000) * np.exp(-((xs - x) ** 2 + (ys - y) ** 2) / (2 * rng.uniform(0.8, 2.5) ** 2))
+    return np.clip(frame, 0, 65535).astype(np.uint16)
+
+def representative_frames(size, seed):
+
+    rng = np.random.default_rng(seed)
+    field = star_field(size, rng)
+    png = io.BytesIO()
+    Image.fromarray((field >> 8).astype(np.uint8)).save(png, format="PNG")
+    solid = io.BytesIO()
+    # capture_image currently writes a single flat colour.
+    Image.new("RGB", (size, size), color=(30, 60, 90)).save(solid, format="PNG")
+    return {
+        "raw 16-bit star field": field.tobytes(),
+        "8-bit star field PNG": png.getvalue(),
+        "flat capture_image PNG": solid.getvalue(),
+        "sensor noise": rng.integers(0, 256, size * size, dtype=np.uint8).tobytes(),
+    }
+
+def main():
+
+    parser = argparse.ArgumentParser(description="CPU time versus bytes saved for each payload codec on representative frames.")
+    parser.add_argument("--size", type=int, default=512, help="Frame width and height in pixels")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    codecs = available_codecs() + [get_codec("none")]
+    for name, data in representative_frames(args.size, args.seed).items():
+        chosen = select_codec(data[:CODEC_SAMPLE_SIZE])
+        print(f"\n{name}: {len(data)} bytes; sample-based selection picks {chosen.name}")
+        print(f"  {'codec':<8} {'bytes':>10} {'saved':>7} {'cpu ms':>8} {'MB/s':>8}")
+        for codec, size, cpu in measure_codecs(data, codecs):
+            saved = 1 - size / len(data)
+            rate = len(data) / cpu / 1e6 if cpu > 0 else float("inf")
+            marker = " <" if codec is chosen else ""
+            print(f"  {codec.name:<8} {size:>10} {saved:>6.1%} {cpu * 1000:>8.1f} {rate:>8.1f}{marker}")
+
+if __name__ == "__main__":
+    main()
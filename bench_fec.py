@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import time
+from PIL import Image
+
+from utils.logging_utils import set_file_logging
+from network.sim_bus import SimulationBus
+from network.packet import MESSAGE_STATUS_REQUEST
+
+set_file_logging(False)
+
+from app.satellite_node import SatelliteNode
+from app.ground_station import GroundStation
+
+LOSS_RATES = (0.0, 0.01, 0.05, 0.1, 0.2)
+PARITY_COUNTS = (0, 1, 2, 4)
+
+class LossyLink:
+
+    def __init__(self, loss_rate, seed):
+
+        self.loss_rate = loss_rate
+        self.random = random.Random(seed)
+        self.status_requests = 0
+
+    def __call__(self, sender_id, neighbor_id, packet):
+
+        # Only image chunks are lost so a status round trip never stalls on the reply timeout.
+        if packet.message_type == MESSAGE_STATUS_REQUEST:
+            self.status_requests += 1
+        return packet.message_type == 2 and self.random.random() < self.loss_rate
+
+def build_link():
+
+    bus = SimulationBus()
+    satellite = SatelliteNode(1, (0, 0, 5), start_services=False)
+    station = GroundStation(1001, (1, 0, 0), start_services=False)
+    bus.register(satellite)
+    bus.register(station)
+    bus.connect_all()
+    for _ in range(2):
+        satellite.network.broadcast_position()
+        station.network.broadcast_position()
+        bus.run_until_idle()
+    return bus, satellite, station
+
+def run(loss_rate, parity_count, image_path, images, rtt, seed):
+
+    bus, satellite, station = build_link()
+    link = LossyLink(loss_rate, seed)
+    bus.loss_filter = link
+    image_bytes = os.path.getsize(image_path) * images
+    retransmitted = 0
+    start = time.perf_counter()
+    for _ in range(images):
+        satellite.transmit_image(1001, image_path, fec_parity=parity_count)
+        retransmitted += satellite.last_transfer_stats["retransmitted_chunks"]
+    elapsed = time.perf_counter() - start
+    # Every status query is a round trip over the (modelled) multi-hop path.
+    modelled = elapsed + link.status_requests * rtt
+    return {
+        "delivered": station.router.images_received,
+        "hop_bytes": bus.data_bytes,
+        "retransmitted": retransmitted,
+        "round_trips": link.status_requests,
+        "goodput_bps": image_bytes / modelled,
+    }
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Goodput of FEC parity versus selective repeat over a lossy in-process link.")
+    parser.add_argument("--images", type=int, default=3)
+    parser.add_argument("--image-size", type=int, default=256)
+    parser.add_argument("--rtt", type=float, default=0.25, help="Seconds charged per status round trip")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    image_path = os.path.join("satellite_captured_images", "bench_fec.png")
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    Image.frombytes("RGB", (args.image_size, args.image_size), rng.randbytes(args.image_size ** 2 * 3)).save(image_path)
+
+    print(f"{'loss':>6} {'parity':>6} {'delivered':>9} {'resent':>7} {'rounds':>6} {'hop MB':>7} {'goodput MB/s':>12}")
+    for loss_rate in LOSS_RATES:
+        for parity_count in PARITY_COUNTS:
+            result = run(loss_rate, parity_count, image_path, args.images, args.rtt, args.seed)
+            print(f"{loss_rate:>6.2f} {parity_count:>6} {result['delivered']:>6}/{args.images:<2} {result['retransmitted']:>7} "
+                  f"{result['round_trips']:>6} {result['hop_bytes'] / 1e6:>7.2f} {result['goodput_bps'] / 1e6:>12.2f}")
+
+if __name__ == "__main__":
+    main()
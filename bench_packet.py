@@ -0,0 +1,84 @@
+import os
+import struct
+import time
+
+from network.packet import Packet
+
+NUM_PACKETS = 20000
+PAYLOAD_SIZES = (512 + 4 + 16, 4096, 32768)
+ROUNDS = 5
+
+class LegacyPacket:
+    HEADER_FORMAT = "!BBHHII"
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+    def __init__(self, version, message_type, source_id, dest_id, sequence_number, payload, ttl=10):
+
+        self.version = version
+        self.message_type = message_type
+        self.source_id = source_id
+        self.dest_id = dest_id
+        self.sequence_number = sequence_number
+        self.ttl = ttl
+        self.payload = payload
+
+    def to_bytes(self):
+
+        header = struct.pack(
+            self.HEADER_FORMAT,
+            self.version,
+            self.message_type,
+            self.source_id,
+            self.dest_id,
+            self.sequence_number,
+            self.ttl
+        )
+        return header + self.payload
+
+    @staticmethod
+    def from_bytes(data):
+
+        header = data[:LegacyPacket.HEADER_SIZE]
+        payload = data[LegacyPacket.HEADER_SIZE:]
+        version, message_type, source_id, dest_id, sequence_number, ttl = struct.unpack(LegacyPacket.HEADER_FORMAT, header)
+        return LegacyPacket(version, message_type, source_id, dest_id, sequence_number, payload, ttl)
+
+def best_of(func):
+
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def report(name, seconds):
+
+    print(f"{name:<32} {seconds * 1000:9.2f} ms  {NUM_PACKETS / seconds:12.0f} pkt/s")
+
+def run(payload_size):
+
+    payloads = [os.urandom(payload_size) for _ in range(NUM_PACKETS)]
+    legacy_packets = [LegacyPacket(1, 2, 1, 1001, i, payload) for i, payload in enumerate(payloads)]
+    packets = [Packet(1, 2, 1, 1001, i, payload) for i, payload in enumerate(payloads)]
+    legacy_wire = [packet.to_bytes() for packet in legacy_packets]
+    wire = [packet.to_bytes() for packet in packets]
+    batch = Packet.encode_batch(packets)
+    shared_buffer = bytearray(Packet.batch_size(packets))
+
+    print(f"\n{NUM_PACKETS} packets, {payload_size}-byte payloads, best of {ROUNDS}")
+    report("legacy to_bytes", best_of(lambda: [packet.to_bytes() for packet in legacy_packets]))
+    report("slots to_bytes", best_of(lambda: [packet.to_bytes() for packet in packets]))
+    report("slots pack_batch_into (shared)", best_of(lambda: Packet.pack_batch_into(packets, shared_buffer)))
+    report("slots encode_batch", best_of(lambda: Packet.encode_batch(packets)))
+    report("legacy from_bytes", best_of(lambda: [LegacyPacket.from_bytes(data) for data in legacy_wire]))
+    report("slots from_bytes (memoryview)", best_of(lambda: [Packet.from_bytes(data) for data in wire]))
+    report("slots decode_batch", best_of(lambda: Packet.decode_batch(batch)))
+
+def main():
+
+    for payload_size in PAYLOAD_SIZES:
+        run(payload_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import random
+import time
+
+from utils.logging_utils import set_file_logging
+from network.sim_bus import SimulationBus
+from network.link_state import LinkStateDatabase, make_lsa
+import network.network_manager as network_manager
+
+set_file_logging(False)
+
+from simulate_constellation import build_constellation, measure_convergence
+
+MODES = ["distance_vector", "link_state"]
+
+def routing_messages(by_path):
+
+    return by_path.get("/receive_routing_table", 0) + by_path.get("/receive_lsa", 0)
+
+def uses_link(nodes_by_id, source_id, dest_id, link):
+
+    # Follows next hops from source_id toward dest_id and reports whether the path crosses link.
+    node_id = source_id
+    for _ in range(len(nodes_by_id)):
+        route = nodes_by_id[node_id].network.routing_table.get(dest_id)
+        if route is None:
+            return False
+        if {node_id, route[0]} == link:
+            return True
+        node_id = route[0]
+        if node_id == dest_id:
+            return False
+    return False
+
+def busiest_link(nodes):
+
+    nodes_by_id = {node.node_id: node for node in nodes}
+    counts = {}
+    for node in nodes:
+        for dest_id, route in node.network.routing_table.items():
+            link = frozenset((node.node_id, route[0]))
+            counts[link] = counts.get(link, 0) + 1
+    return max(counts, key=lambda link: (counts[link], sorted(link))), nodes_by_id
+
+def fail_link(bus, nodes):
+
+    # Takes down the link carrying the most routes and counts the routes that still cross it once the bus is idle.
+    link, nodes_by_id = busiest_link(nodes)
+    a, b = sorted(link)
+    bus.reset_counters()
+    start = time.monotonic()
+    nodes_by_id[a].network.remove_neighbor(b)
+    nodes_by_id[b].network.remove_neighbor(a)
+    bus.run_until_idle()
+    elapsed = time.monotonic() - start
+    stale = sum(
+        1 for node in nodes for dest_id in node.network.routing_table
+        if uses_link(nodes_by_id, node.node_id, dest_id, link)
+    )
+    return (a, b), elapsed, routing_messages(bus.control_messages), stale
+
+def run_mode(mode, num_satellites, num_stations, degree, seed):
+
+    network_manager.ROUTING_MODE = mode
+    bus = SimulationBus()
+    satellites, stations, _ = build_constellation(bus, num_satellites, num_stations, degree, seed)
+    nodes = satellites + stations
+    rounds, elapsed, messages, by_path = measure_convergence(bus, nodes, 20)
+    distances = {(node.node_id, dest_id): route[1] for node in nodes for dest_id, route in node.network.routing_table.items()}
+    link, fail_seconds, fail_messages, stale = fail_link(bus, nodes)
+    return {
+        "rounds": rounds,
+        "seconds": elapsed,
+        "messages": messages,
+        "routing_messages": routing_messages(by_path),
+        "distances": distances,
+        "link": link,
+        "fail_seconds": fail_seconds,
+        "fail_messages": fail_messages,
+        "stale_routes": stale,
+    }
+
+def bench_spf(num_nodes, degree, changes, seed):
+
+    # One database over a random graph: full Dijkstra runs against updates for one changed link, and for a node that
+    # moved so every one of its links changed (its advertisement plus one from each neighbor).
+    rng = random.Random(seed)
+    links = {node_id: {} for node_id in range(1, num_nodes + 1)}
+    for node_id in links:
+        for peer_id in rng.sample(range(1, num_nodes + 1), degree // 2):
+            if peer_id != node_id:
+                distance = rng.uniform(1.0, 10.0)
+                links[node_id][peer_id] = links[peer_id][node_id] = (distance, 16384)
+    database = LinkStateDatabase(1)
+    sequences = {node_id: 1 for node_id in links}
+    for node_id, node_links in links.items():
+        database.install(make_lsa(node_id, 1, node_links))
+
+    def advertise(node_id):
+
+        sequences[node_id] += 1
+        database.install(make_lsa(node_id, sequences[node_id], links[node_id]))
+
+    start = time.perf_counter()
+    for _ in range(changes):
+        database.recompute()
+    full = (time.perf_counter() - start) / changes
+
+    single = moved = 0.0
+    advertisements = [0, 0]
+    for _ in range(changes):
+        node_id = rng.randrange(1, num_nodes + 1)
+        if not links[node_id]:
+            continue
+        peer_id = rng.choice(list(links[node_id]))
+        links[node_id][peer_id] = links[peer_id][node_id] = (rng.uniform(1.0, 10.0), 16384)
+        start = time.perf_counter()
+        advertise(node_id)
+        advertise(peer_id)
+        single += time.perf_counter() - start
+        advertisements[0] += 2
+
+        for peer_id in links[node_id]:
+            links[node_id][peer_id] = links[peer_id][node_id] = (rng.uniform(1.0, 10.0), 16384)
+        start = time.perf_counter()
+        advertise(node_id)
+        for peer_id in links[node_id]:
+            advertise(peer_id)
+        moved += time.perf_counter() - start
+        advertisements[1] += 1 + len(links[node_id])
+    return full, single / advertisements[0], moved / advertisements[1], database.stats()
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Compare distance-vector and link-state routing on the in-memory bus.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 40, 80])
+    parser.add_argument("--stations", type=int, default=2)
+    parser.add_argument("--degree", type=float, default=8.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--spf-nodes", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>6} {'mode':<16} {'rounds':>6} {'seconds':>8} {'routing msgs':>12} {'all msgs':>9}   "
+          f"{'link down':<12} {'seconds':>8} {'msgs':>6} {'stale routes':>12}")
+    for size in args.sizes:
+        results = {mode: run_mode(mode, size, args.stations, args.degree, args.seed) for mode in MODES}
+        for mode, result in results.items():
+            print(f"{size + args.stations:>6} {mode:<16} {result['rounds']:>6} {result['seconds']:>8.3f} "
+                  f"{result['routing_messages']:>12} {result['messages']:>9}   {str(result['link']):<12} "
+                  f"{result['fail_seconds']:>8.3f} {result['fail_messages']:>6} {result['stale_routes']:>12}")
+        # Both modes should settle on the same shortest distances before the failure.
+        dv, ls = results["distance_vector"]["distances"], results["link_state"]["distances"]
+        agree = sum(1 for key, distance in ls.items() if key in dv and abs(dv[key] - distance) < 1e-6)
+        print(f"{'':>6} routes agreeing on distance: {agree}/{len(ls)} (distance-vector holds {len(dv)})")
+
+    full, single, moved, stats = bench_spf(args.spf_nodes, 8, 200, args.seed)
+    print(f"SPF over {stats['lsas']} nodes and {stats['links']} links: full run {full * 1000:.2f} ms; per advertisement "
+          f"{single * 1000:.3f} ms for one changed link ({full / single:.0f}x faster), {moved * 1000:.3f} ms when a node "
+          f"moved and all its links changed ({full / moved:.0f}x faster); {stats['full_runs']} full runs were the baseline")
+
+if __name__ == "__main__":
+    main()
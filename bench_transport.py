@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+import time
+from flask import Flask, request
+from werkzeug.serving import make_server
+
+from network.packet import Packet
+from network.transport import HttpTransport, StreamTransport, StreamServer, http_port, stream_port
+from utils.logging_utils import setup_logger
+
+NEIGHBOR_ID = 3900
+# Stream hellos carry the sender's ID as an integer.
+BENCH_NODE_ID = 3899
+NUM_PACKETS = 2000
+PAYLOAD_SIZE = 512 + 4 + 16
+HOST = "127.0.0.1"
+
+class BenchNode:
+
+    def __init__(self, node_id):
+
+        self.node_id = node_id
+        self.general_logger = setup_logger(node_id, "bench")
+
+class Receiver:
+
+    def __init__(self):
+
+        self.arrivals = {}
+        self.done = threading.Event()
+        self.expected = 0
+
+    def reset(self, expected):
+
+        self.arrivals = {}
+        self.expected = expected
+        self.done.clear()
+
+    def handle(self, data, hop_id=None):
+
+        packet = Packet.from_bytes(data)
+        self.arrivals[packet.sequence_number] = time.perf_counter()
+        if len(self.arrivals) >= self.expected:
+            self.done.set()
+
+def start_http_server(receiver):
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app = Flask(__name__)
+
+    @app.route('/receive', methods=['POST'])
+    def receive():
+        receiver.handle(request.get_data())
+        return "", 200
+
+    server = make_server(HOST, http_port(NEIGHBOR_ID), app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run(name, transport, receiver):
+
+    packets = [Packet(1, 1, 1, NEIGHBOR_ID, i, os.urandom(PAYLOAD_SIZE)).to_bytes() for i in range(NUM_PACKETS)]
+    receiver.reset(NUM_PACKETS)
+    sent_at = {}
+    start = time.perf_counter()
+    for sequence_number, data in enumerate(packets):
+        sent_at[sequence_number] = time.perf_counter()
+        transport.send(NEIGHBOR_ID, data, 1)
+    receiver.done.wait(60)
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(receiver.arrivals[i] - sent_at[i] for i in receiver.arrivals)
+    delivered = len(latencies)
+    p50 = latencies[delivered // 2] * 1000 if delivered else float("nan")
+    p99 = latencies[int(delivered * 0.99) - 1] * 1000 if delivered else float("nan")
+    print(f"{name:<8} {delivered}/{NUM_PACKETS} delivered  {delivered / elapsed:10.0f} pkt/s  "
+          f"{delivered * PAYLOAD_SIZE / elapsed / 1e6:7.2f} MB/s  p50 {p50:7.3f} ms  p99 {p99:7.3f} ms")
+
+def main():
+
+    node = BenchNode(BENCH_NODE_ID)
+    receiver = Receiver()
+    http_server = start_http_server(receiver)
+    stream_server = StreamServer(node, receiver.handle, stream_port(NEIGHBOR_ID), host=HOST)
+    stream_server.start()
+
+    print(f"{NUM_PACKETS} packets of {PAYLOAD_SIZE} bytes over loopback")
+    http_transport = HttpTransport(node, host=HOST)
+    run("http", http_transport, receiver)
+    stream_transport = StreamTransport(node, host=HOST, fallback=http_transport)
+    run("stream", stream_transport, receiver)
+
+    stream_transport.close()
+    stream_server.stop()
+    http_server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+from PIL import Image
+
+from utils.logging_utils import set_file_logging
+from network.sim_bus import SimulationBus
+
+set_file_logging(False)
+
+from app.satellite_node import SatelliteNode
+from app.ground_station import GroundStation
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+
+    # Nodes keep their outbox, bundles, spools, catalogs and images under the working directory, so each test that
+    # builds nodes runs in a fresh one and reruns never see a previous run's files.
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def bus(workspace):
+
+    return SimulationBus()
+
+@pytest.fixture
+def build_chain(bus):
+
+    # Returns the builder rather than the nodes, for tests that change settings before the chain converges.
+    def build():
+
+        # Each node only reaches its immediate neighbors, so images from Node 1 need three hops.
+        satellites = [SatelliteNode(node_id, (8.0 * (node_id - 1), 0, 5), start_services=False) for node_id in (1, 2, 3)]
+        station = GroundStation(1001, (24.0, 0, 0), start_services=False)
+        for node in satellites + [station]:
+            bus.register(node)
+        bus.connect_all()
+        for _ in range(3):
+            for node in satellites + [station]:
+                node.network.broadcast_position()
+            bus.run_until_idle()
+        return satellites, station
+    return build
+
+@pytest.fixture
+def chain(build_chain):
+
+    return build_chain()
+
+@pytest.fixture
+def write_image():
+
+    # Saves random pixels, which do not compress, under a fresh capture path of the satellite.
+    def write(satellite, size=64):
+
+        image_path = satellite.capture_image()
+        Image.frombytes("RGB", (size, size), os.urandom(size * size * 3)).save(image_path)
+        return image_path
+    return write
+
+class ClientResponse:
+
+    # Gives a Flask test client response the parts of a requests response the transports use.
+    def __init__(self, response):
+
+        self.response = response
+
+    def raise_for_status(self):
+
+        assert self.response.status_code == 200
+
+    def json(self):
+
+        return self.response.get_json()
+
+    def iter_content(self, block_size):
+
+        yield self.response.get_data()
+
+    @property
+    def status_code(self):
+
+        return self.response.status_code
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.response.close()
+
+@pytest.fixture
+def client_response():
+
+    return ClientResponse
@@ -77,7 +77,8 @@ def capture_and_transmit_images():
     for sat_id in range(1, NUM_SATELLITES + 1):
         capture_url = f"http://{BASE_IP}:{PORT_BASE + sat_id}/capture_image"
         try:
-            response = session.post(capture_url)
+            # Wait for the downlink so the images are at the ground stations before retrieve_images runs.
+            response = session.post(capture_url, json={"wait": True})
             if response.status_code == 200:
                 log(f"Satellite {sat_id}: Image captured and transmitted successfully.")
             else:
@@ -0,0 +1,111 @@
+# network/batcher.py
+
+import logging
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+from app.config import BATCH_MAX_PACKETS, BATCH_MAX_BYTES, BATCH_MAX_AGE
+from network.packet import Packet
+from utils.logging_utils import log
+
+FRAME_MAGIC = b"ALB1"
+FRAME_HEADER_STRUCT = struct.Struct("!4sI")
+
+def encode_frame(packets):
+
+    return b"".join((FRAME_HEADER_STRUCT.pack(FRAME_MAGIC, len(packets)), Packet.encode_batch(packets)))
+
+def decode_frame(data):
+
+    if len(data) < FRAME_HEADER_STRUCT.size:
+        raise ValueError(f"Insufficient data for frame header: expected {FRAME_HEADER_STRUCT.size} bytes, got {len(data)} bytes")
+
+    magic, count = FRAME_HEADER_STRUCT.unpack_from(data, 0)
+    if magic != FRAME_MAGIC:
+        raise ValueError(f"Bad frame magic {magic!r}")
+
+    packets = Packet.decode_batch(data, offset=FRAME_HEADER_STRUCT.size)
+    if len(packets) != count:
+        raise ValueError(f"Frame announced {count} packets but carried {len(packets)}")
+    return packets
+
+class PacketCoalescer:
+
+    def __init__(self, flush_func, logger=None, max_packets=BATCH_MAX_PACKETS, max_bytes=BATCH_MAX_BYTES, max_age=BATCH_MAX_AGE):
+
+        self.flush_func = flush_func
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_packets = max_packets
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.running = True
+        self.flush_thread = None
+
+    def add(self, neighbor_id, packet):
+
+        # Returns a future that resolves to flush_func's result for the batch this packet goes out in.
+        delivery = Future()
+        with self.lock:
+            if self.flush_thread is None:
+                self.flush_thread = threading.Thread(target=self._age_flush_thread, daemon=True)
+                self.flush_thread.start()
+            batch = self.pending.get(neighbor_id)
+            if batch is None:
+                batch = self.pending[neighbor_id] = [time.monotonic(), [], 0, []]
+            batch[1].append(packet)
+            batch[2] += Packet.LENGTH_PREFIX_SIZE + packet.size()
+            batch[3].append(delivery)
+            if len(batch[1]) < self.max_packets and batch[2] < self.max_bytes:
+                return delivery
+            del self.pending[neighbor_id]
+
+        self._send(neighbor_id, batch)
+        return delivery
+
+    def flush(self, neighbor_id=None):
+
+        with self.lock:
+            if neighbor_id is None:
+                batches = list(self.pending.items())
+                self.pending.clear()
+            elif neighbor_id in self.pending:
+                batches = [(neighbor_id, self.pending.pop(neighbor_id))]
+            else:
+                batches = []
+
+        for batch_neighbor_id, batch in batches:
+            self._send(batch_neighbor_id, batch)
+
+    def stop(self):
+
+        self.running = False
+        self.flush()
+
+    def _send(self, neighbor_id, batch):
+
+        sent = False
+        try:
+            sent = bool(self.flush_func(neighbor_id, batch[1]))
+
+        finally:
+            for delivery in batch[3]:
+                delivery.set_result(sent)
+
+    def _age_flush_thread(self):
+
+        while self.running:
+            time.sleep(self.max_age / 2)
+            now = time.monotonic()
+            with self.lock:
+                expired = [neighbor_id for neighbor_id, batch in self.pending.items() if now - batch[0] >= self.max_age]
+            for neighbor_id in expired:
+                # A failed send must not end the loop, or partial batches would wait until they fill up.
+                try:
+                    self.flush(neighbor_id)
+
+                except Exception as e:
+                    log(self.logger, f"Failed to flush aged batch for Node {neighbor_id}: {e}", level="error")
@@ -0,0 +1,250 @@
+# network/bundle_queue.py
+
+import os
+import mmap
+import struct
+import threading
+import time
+
+from network.packet import Packet
+from app.config import BUNDLE_DIR, BUNDLE_SEGMENT_BYTES, BUNDLE_MAX_BYTES, BUNDLE_LIFETIME
+
+# packet length, time the packet was queued
+RECORD_STRUCT = struct.Struct("!Id")
+# segment holding the next packet to send, and that packet's offset in it
+INDEX_STRUCT = struct.Struct("!IQ")
+SEGMENT_SUFFIX = ".seg"
+
+class DestinationLog:
+
+    def __init__(self, directory, segment_bytes=BUNDLE_SEGMENT_BYTES):
+
+        # Packets for one destination are appended to numbered segment files and never rewritten; the mmap'd index
+        # only moves the read position forward, and segments behind it are deleted whole.
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, "index")
+        if not os.path.exists(index_path) or os.path.getsize(index_path) != INDEX_STRUCT.size:
+            with open(index_path, "wb") as index_file:
+                index_file.write(INDEX_STRUCT.pack(0, 0))
+        self.index_file = open(index_path, "r+b")
+        self.index = mmap.mmap(self.index_file.fileno(), INDEX_STRUCT.size)
+        self.segments = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+        self.head_segment, self.head_offset = INDEX_STRUCT.unpack_from(self.index)
+        self.packets, self.bytes = self._recover()
+
+    def segment_path(self, segment):
+
+        return os.path.join(self.directory, f"{segment:010d}{SEGMENT_SUFFIX}")
+
+    def append(self, data, queued_at):
+
+        with self.lock:
+            if not self.segments or os.path.getsize(self.segment_path(self.segments[-1])) >= self.segment_bytes:
+                self.segments.append(self.segments[-1] + 1 if self.segments else self.head_segment)
+                if len(self.segments) == 1:
+                    self._move_head(self.segments[0], 0)
+            with open(self.segment_path(self.segments[-1]), "ab") as segment_file:
+                segment_file.write(RECORD_STRUCT.pack(len(data), queued_at) + data)
+            self.packets += 1
+            self.bytes += len(data)
+
+    def records(self):
+
+        # Yields (segment, end offset, queued_at, data) from the head up to what was queued when iteration started,
+        # so packets held again while draining wait for the next drain.
+        with self.lock:
+            segments = [segment for segment in self.segments if segment >= self.head_segment]
+            if not segments:
+                return
+            end = (segments[-1], os.path.getsize(self.segment_path(segments[-1])))
+            offset = self.head_offset
+        for segment in segments:
+            limit = end[1] if segment == end[0] else None
+            with open(self.segment_path(segment), "rb") as segment_file:
+                segment_file.seek(offset)
+                while limit is None or segment_file.tell() < limit:
+                    header = segment_file.read(RECORD_STRUCT.size)
+                    if len(header) < RECORD_STRUCT.size:
+                        break
+                    length, queued_at = RECORD_STRUCT.unpack(header)
+                    data = segment_file.read(length)
+                    yield segment, segment_file.tell(), queued_at, data
+            offset = 0
+
+    def consume(self, segment, offset, length):
+
+        # Marks every record up to (segment, offset) as sent, deleting segments that are now fully behind the head.
+        with self.lock:
+            self.packets -= 1
+            self.bytes -= length
+            while self.segments and self.segments[0] < segment:
+                self._remove_segment(self.segments.pop(0))
+            if self.packets == 0:
+                # Nothing left: drop the whole log so an idle destination keeps no files behind.
+                next_segment = self.segments[-1] + 1 if self.segments else segment + 1
+                while self.segments:
+                    self._remove_segment(self.segments.pop(0))
+                self._move_head(next_segment, 0)
+                return
+            self._move_head(segment, offset)
+
+    def close(self):
+
+        with self.lock:
+            self.index.close()
+            self.index_file.close()
+
+    def _move_head(self, segment, offset):
+
+        self.head_segment, self.head_offset = segment, offset
+        INDEX_STRUCT.pack_into(self.index, 0, segment, offset)
+
+    def _remove_segment(self, segment):
+
+        path = self.segment_path(segment)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _recover(self):
+
+        # Counts what is still queued and cuts off a record that a crash left half-written at the end of the log.
+        while self.segments and self.segments[0] < self.head_segment:
+            self._remove_segment(self.segments.pop(0))
+        if self.segments and self.segments[0] > self.head_segment:
+            self._move_head(self.segments[0], 0)
+        packets = total = 0
+        for segment in self.segments:
+            path = self.segment_path(segment)
+            with open(path, "rb") as segment_file:
+                segment_file.seek(self.head_offset if segment == self.head_segment else 0)
+                good = segment_file.tell()
+                while True:
+                    header = segment_file.read(RECORD_STRUCT.size)
+                    if len(header) < RECORD_STRUCT.size:
+                        break
+                    length, _ = RECORD_STRUCT.unpack(header)
+                    if len(segment_file.read(length)) < length:
+                        break
+                    good = segment_file.tell()
+                    packets += 1
+                    total += length
+            if good < os.path.getsize(path):
+                os.truncate(path, good)
+        return packets, total
+
+class BundleQueue:
+
+    def __init__(self, node_id, base_dir=BUNDLE_DIR, segment_bytes=BUNDLE_SEGMENT_BYTES, max_bytes=BUNDLE_MAX_BYTES, lifetime=BUNDLE_LIFETIME):
+
+        self.directory = os.path.join(base_dir, f"Node_{node_id}")
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.lifetime = lifetime
+        self.logs = {}
+        self.lock = threading.Lock()
+        self.drain_lock = threading.Lock()
+        self.held = 0
+        self.drained = 0
+        self.dropped = 0
+        self.expired = 0
+        self.drain_seconds = 0.0
+        self.last_drain_rate = None
+        # Packets queued before a restart are picked up again.
+        if os.path.isdir(self.directory):
+            with self.lock:
+                for name in os.listdir(self.directory):
+                    if name.startswith("dest_"):
+                        dest_id = int(name[len("dest_"):])
+                        self._release_if_empty(dest_id, self._log(dest_id))
+
+    def hold(self, packet):
+
+        # Stores a plaintext packet until a route to its destination exists; False if the queue is full.
+        data = packet.to_bytes()
+        with self.lock:
+            if sum(log.bytes for log in self.logs.values()) + len(data) > self.max_bytes:
+                self.dropped += 1
+                return False
+            # Appended under the same lock as the size check, so concurrent holds cannot overshoot max_bytes together,
+            # and a drain cannot close the log in between.
+            self._log(packet.dest_id).append(data, time.time())
+            self.held += 1
+        return True
+
+    def pending(self, dest_id=None):
+
+        with self.lock:
+            if dest_id is not None:
+                log = self.logs.get(dest_id)
+                return log.packets if log else 0
+            return {dest: log.packets for dest, log in self.logs.items() if log.packets}
+
+    def drain(self, dest_id, send):
+
+        # Sends queued packets oldest first through send(packet) -> bool and stops at the first failure to keep order.
+        sent = 0
+        with self.drain_lock:
+            with self.lock:
+                log = self.logs.get(dest_id)
+            if log is None or not log.packets:
+                return 0
+            start = time.monotonic()
+            now = time.time()
+            for segment, offset, queued_at, data in log.records():
+                if now - queued_at > self.lifetime:
+                    with self.lock:
+                        self.expired += 1
+                elif not send(Packet.from_bytes(data)):
+                    break
+                else:
+                    sent += 1
+                log.consume(segment, offset, len(data))
+            elapsed = time.monotonic() - start
+            with self.lock:
+                self._release_if_empty(dest_id, log)
+                self.drained += sent
+                self.drain_seconds += elapsed
+                if sent:
+                    self.last_drain_rate = sent / elapsed if elapsed > 0 else None
+        return sent
+
+    def stats(self):
+
+        with self.lock:
+            destinations = {dest: {"packets": log.packets, "bytes": log.bytes} for dest, log in self.logs.items() if log.packets}
+            return {
+                "queued_packets": sum(entry["packets"] for entry in destinations.values()),
+                "queued_bytes": sum(entry["bytes"] for entry in destinations.values()),
+                "destinations": destinations,
+                "held": self.held,
+                "drained": self.drained,
+                "dropped": self.dropped,
+                "expired": self.expired,
+                "mean_drain_rate": self.drained / self.drain_seconds if self.drain_seconds > 0 else None,
+                "last_drain_rate": self.last_drain_rate,
+            }
+
+    def close(self):
+
+        with self.lock:
+            for log in self.logs.values():
+                log.close()
+            self.logs.clear()
+
+    def _log(self, dest_id):
+
+        # Called with self.lock held; a destination's log is opened when a packet is first held for it.
+        log = self.logs.get(dest_id)
+        if log is None:
+            log = self.logs[dest_id] = DestinationLog(os.path.join(self.directory, f"dest_{dest_id}"), self.segment_bytes)
+        return log
+
+    def _release_if_empty(self, dest_id, log):
+
+        # Called with self.lock held; an emptied log gives back its index file and mmap until it is needed again.
+        if not log.packets and self.logs.get(dest_id) is log:
+            log.close()
+            del self.logs[dest_id]
@@ -0,0 +1,107 @@
+# network/chunk_store.py
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from network.packet import CHUNK_HASH_SIZE
+from app.config import CHUNK_STORE_DIR, CHUNK_STORE_MAX_BYTES
+
+def chunk_digest(chunk):
+
+    return hashlib.blake2b(chunk, digest_size=CHUNK_HASH_SIZE).digest()
+
+class ChunkStore:
+
+    def __init__(self, node_id, base_dir=CHUNK_STORE_DIR, max_bytes=CHUNK_STORE_MAX_BYTES):
+
+        self.directory = os.path.join(base_dir, f"Node_{node_id}")
+        self.max_bytes = max_bytes
+        # digest -> size, least recently used first; the chunks themselves live on disk named by digest.
+        self.index = OrderedDict()
+        self.stored_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_avoided = 0
+        self.duplicates = 0
+        self.lock = threading.Lock()
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if len(name) == CHUNK_HASH_SIZE * 2 and not name.endswith(".tmp"):
+                    size = os.path.getsize(os.path.join(self.directory, name))
+                    self.index[bytes.fromhex(name)] = size
+                    self.stored_bytes += size
+
+    def path(self, digest):
+
+        return os.path.join(self.directory, digest.hex())
+
+    def has(self, digest):
+
+        with self.lock:
+            return digest in self.index
+
+    def put(self, digest, chunk):
+
+        with self.lock:
+            if digest in self.index:
+                self.index.move_to_end(digest)
+                self.duplicates += 1
+                return
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{self.path(digest)}.tmp"
+        with open(temp_path, "wb") as chunk_file:
+            chunk_file.write(chunk)
+        os.replace(temp_path, self.path(digest))
+        with self.lock:
+            if digest not in self.index:
+                self.index[digest] = len(chunk)
+                self.stored_bytes += len(chunk)
+            while self.stored_bytes > self.max_bytes and len(self.index) > 1:
+                self._evict()
+
+    def get(self, digest):
+
+        # Returns the stored chunk, or None if it was never stored or has been evicted.
+        with self.lock:
+            if digest not in self.index:
+                self.misses += 1
+                return None
+            self.index.move_to_end(digest)
+        try:
+            with open(self.path(digest), "rb") as chunk_file:
+                chunk = chunk_file.read()
+
+        except FileNotFoundError:
+            with self.lock:
+                self.stored_bytes -= self.index.pop(digest, 0)
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+            self.bytes_avoided += len(chunk)
+        return chunk
+
+    def stats(self):
+
+        with self.lock:
+            return {
+                "chunks": len(self.index),
+                "stored_bytes": self.stored_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "duplicates": self.duplicates,
+                "bytes_avoided": self.bytes_avoided,
+            }
+
+    def _evict(self):
+
+        digest, size = self.index.popitem(last=False)
+        self.stored_bytes -= size
+        try:
+            os.remove(self.path(digest))
+
+        except FileNotFoundError:
+            pass
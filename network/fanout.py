@@ -0,0 +1,71 @@
+# network/fanout.py
+
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from app.config import FANOUT_WORKERS, FANOUT_TIMEOUT
+
+session = requests.Session()
+session.trust_env = False
+session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=FANOUT_WORKERS, pool_maxsize=FANOUT_WORKERS))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+
+    # Every node in the process shares one bounded pool for control-plane fan-out.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+    return _executor
+
+class FanOutTimeout(Exception):
+    pass
+
+class FanOut:
+
+    def __init__(self, address_func, timeout=FANOUT_TIMEOUT):
+
+        self.address_func = address_func
+        self.timeout = timeout
+
+    def post_all(self, peer_ids, path, payload, timeout=None):
+
+        # Returns {peer_id: response or exception}; peers that miss the deadline map to FanOutTimeout.
+        timeout = timeout or self.timeout
+        executor = get_executor()
+        futures = {}
+        for peer_id in peer_ids:
+            url = f"{self.address_func(peer_id)}{path}"
+            futures[executor.submit(session.post, url, json=payload, timeout=timeout)] = peer_id
+
+        results = {}
+        if not futures:
+            return results
+
+        done, not_done = wait(futures, timeout=timeout)
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+
+            except Exception as e:
+                results[futures[future]] = e
+        for future in not_done:
+            future.cancel()
+            results[futures[future]] = FanOutTimeout(f"No response within {timeout}s")
+        return results
+
+    def defer(self, callback, delay):
+
+        # Runs callback once after delay seconds, so bursts of changes can be sent as one message.
+        timer = threading.Timer(delay, callback)
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def succeeded(result):
+
+        return not isinstance(result, Exception) and result.status_code == 200
@@ -0,0 +1,189 @@
+# network/fec.py
+
+import struct
+import numpy as np
+
+from app.config import FEC_GROUP_SIZE
+
+PARITY_STRUCT = struct.Struct("!BBBI")
+
+def _build_tables():
+
+    # GF(256) with the 0x11d polynomial; MUL[a] is the 256-entry row for multiplication by a.
+    exp = np.zeros(512, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.int32)
+    value = 1
+    for power in range(255):
+        exp[power] = value
+        log[value] = power
+        value <<= 1
+        if value & 0x100:
+            value ^= 0x11d
+    exp[255:510] = exp[:255]
+    mul = np.zeros((256, 256), dtype=np.uint8)
+    nonzero = np.arange(1, 256)
+    for a in range(1, 256):
+        mul[a, 1:] = exp[log[a] + log[nonzero]]
+    return exp, log, mul
+
+GF_EXP, GF_LOG, GF_MUL = _build_tables()
+
+def gf_inverse(a):
+
+    return int(GF_EXP[255 - GF_LOG[a]])
+
+def coefficient(parity_count, parity_index, data_index):
+
+    # A single parity chunk is plain XOR; otherwise use a Cauchy matrix, every square submatrix of which is invertible.
+    if parity_count == 1:
+        return 1
+    return gf_inverse(parity_index ^ (parity_count + data_index))
+
+def encode_parity(data_chunks, parity_count):
+
+    length = max(len(chunk) for chunk in data_chunks)
+    data = [np.frombuffer(bytes(chunk).ljust(length, b"\0"), dtype=np.uint8) for chunk in data_chunks]
+    parity = []
+    for parity_index in range(parity_count):
+        row = np.zeros(length, dtype=np.uint8)
+        for data_index, chunk in enumerate(data):
+            row ^= GF_MUL[coefficient(parity_count, parity_index, data_index)][chunk]
+        parity.append(row.tobytes())
+    return parity
+
+def _invert(matrix):
+
+    size = len(matrix)
+    rows = [list(row) + [int(i == j) for j in range(size)] for i, row in enumerate(matrix)]
+    for col in range(size):
+        pivot = next(r for r in range(col, size) if rows[r][col])
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        scale = gf_inverse(rows[col][col])
+        rows[col] = [int(GF_MUL[scale][value]) for value in rows[col]]
+        for r in range(size):
+            if r != col and rows[r][col]:
+                factor = rows[r][col]
+                rows[r] = [value ^ int(GF_MUL[factor][pivot_value]) for value, pivot_value in zip(rows[r], rows[col])]
+    return [row[size:] for row in rows]
+
+def recover_chunks(group_size, parity_count, data, parity):
+
+    # data maps index -> chunk for the data chunks present, parity maps index -> parity chunk.
+    # Returns index -> rebuilt chunk, padded to the parity length, for every missing data index.
+    missing = [index for index in range(group_size) if index not in data]
+    if not missing:
+        return {}
+    if len(missing) > len(parity):
+        raise ValueError(f"Cannot rebuild {len(missing)} chunks from {len(parity)} parity chunks")
+
+    parity_indexes = sorted(parity)[:len(missing)]
+    length = len(parity[parity_indexes[0]])
+    syndromes = []
+    for parity_index in parity_indexes:
+        row = np.frombuffer(parity[parity_index], dtype=np.uint8).copy()
+        for data_index, chunk in data.items():
+            row ^= GF_MUL[coefficient(parity_count, parity_index, data_index)][np.frombuffer(bytes(chunk).ljust(length, b"\0"), dtype=np.uint8)]
+        syndromes.append(row)
+
+    inverse = _invert([[coefficient(parity_count, p, m) for m in missing] for p in parity_indexes])
+    rebuilt = {}
+    for position, data_index in enumerate(missing):
+        row = np.zeros(length, dtype=np.uint8)
+        for syndrome, factor in zip(syndromes, inverse[position]):
+            if factor:
+                row ^= GF_MUL[factor][syndrome]
+        rebuilt[data_index] = row.tobytes()
+    return rebuilt
+
+def pack_parity(group_size, parity_count, parity_index, last_length, parity):
+
+    # last_length is the true size of the group's final data chunk, which may be shorter than the parity.
+    return b"".join((PARITY_STRUCT.pack(group_size, parity_count, parity_index, last_length), parity))
+
+def unpack_parity(payload):
+
+    group_size, parity_count, parity_index, last_length = PARITY_STRUCT.unpack_from(payload)
+    return group_size, parity_count, parity_index, last_length, bytes(payload[PARITY_STRUCT.size:])
+
+class FecEncoder:
+
+    def __init__(self, parity_count, group_size=FEC_GROUP_SIZE):
+
+        if group_size + parity_count > 256:
+            raise ValueError(f"Group of {group_size} data and {parity_count} parity chunks exceeds GF(256)")
+        self.parity_count = parity_count
+        self.group_size = group_size
+        self.group_start = 1
+        self.group = []
+
+    def add(self, chunk_number, is_last, chunk):
+
+        # Returns (group_start, group_size, parity_index, last_length, parity) tuples once a group fills or the stream ends.
+        if not self.group:
+            self.group_start = chunk_number
+        self.group.append(chunk)
+        if len(self.group) < self.group_size and not is_last:
+            return []
+        parity = encode_parity(self.group, self.parity_count)
+        last_length = len(self.group[-1])
+        encoded = [(self.group_start, len(self.group), index, last_length, chunk) for index, chunk in enumerate(parity)]
+        self.group = []
+        return encoded
+
+class FecGroups:
+
+    def __init__(self):
+
+        # group_start -> [group_size, parity_count, last_length, {parity_index: parity}]
+        self.groups = {}
+        self.group_size = None
+        self.recovered = 0
+
+    def add_parity(self, session, group_start, group_size, parity_count, parity_index, last_length, parity):
+
+        if self._group_complete(session, group_start, group_size):
+            return []
+        group = self.groups.setdefault(group_start, [group_size, parity_count, last_length, {}])
+        if parity_index not in group[3]:
+            group[3][parity_index] = parity
+            session.buffered_bytes += len(parity)
+        if self.group_size is None or group_size > self.group_size:
+            self.group_size = group_size
+        return self.repair(session, group_start)
+
+    def group_of(self, chunk_number):
+
+        if self.group_size is None:
+            return None
+        group_start = (chunk_number - 1) // self.group_size * self.group_size + 1
+        return group_start if group_start in self.groups else None
+
+    def repair(self, session, group_start):
+
+        # Returns (chunk_number, chunk) pairs rebuilt from parity; the caller adds them to the session.
+        group_size, parity_count, last_length, parity = self.groups[group_start]
+        data = {}
+        for index in range(group_size):
+            if session.has_chunk(group_start + index):
+                data[index] = session.read_chunk(group_start + index)
+        if len(data) == group_size:
+            self._drop(session, group_start)
+            return []
+        if group_size - len(data) > len(parity):
+            return []
+
+        rebuilt = recover_chunks(group_size, parity_count, data, parity)
+        if group_size - 1 in rebuilt:
+            rebuilt[group_size - 1] = rebuilt[group_size - 1][:last_length]
+        self._drop(session, group_start)
+        self.recovered += len(rebuilt)
+        return [(group_start + index, chunk) for index, chunk in sorted(rebuilt.items())]
+
+    def _group_complete(self, session, group_start, group_size):
+
+        return all(session.has_chunk(group_start + index) for index in range(group_size))
+
+    def _drop(self, session, group_start):
+
+        group = self.groups.pop(group_start)
+        session.buffered_bytes -= sum(len(parity) for parity in group[3].values())
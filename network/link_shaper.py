@@ -0,0 +1,180 @@
+# network/link_shaper.py
+
+import threading
+import time
+from collections import deque
+
+from app.config import (
+    LINK_CAPACITIES, DEFAULT_LINK_CAPACITY, LINK_BURST_SECONDS, LINK_MTU, CWND_INITIAL, CWND_MIN, CWND_MAX,
+    LINK_RATE_WINDOW
+)
+
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+
+        # rate is bytes per second; burst is how many bytes may go out back to back after the link has been idle.
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def delay(self, size, now):
+
+        # Takes size bytes and returns how long the caller must wait before sending them; the balance may go negative,
+        # which makes the next sender wait for this one's bytes as well.
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= size
+        return max(0.0, -self.tokens / self.rate)
+
+class CongestionWindow:
+
+    def __init__(self, initial=CWND_INITIAL, minimum=CWND_MIN, maximum=CWND_MAX, increment=LINK_MTU):
+
+        # Bytes that may be unacknowledged on the link at once: doubled every window while no loss has been seen,
+        # then grown by one MTU per window acknowledged and halved on every failed or timed out send.
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increment = increment
+        self.threshold = maximum
+        self.in_flight = 0
+
+    def acknowledge(self, size):
+
+        if self.size < self.threshold:
+            self.size = min(self.maximum, self.size + size)
+        else:
+            self.size = min(self.maximum, self.size + self.increment * size / self.size)
+
+    def lose(self):
+
+        self.threshold = max(self.minimum, self.size / 2)
+        self.size = self.threshold
+
+class LinkState:
+
+    def __init__(self, capacity):
+
+        self.bucket = None
+        self.set_capacity(capacity)
+        self.window = CongestionWindow()
+        self.recent = deque()
+        self.bytes_sent = 0
+        self.packets_sent = 0
+        self.acknowledged = 0
+        self.losses = 0
+        self.paced_seconds = 0.0
+        self.window_waits = 0
+
+    def set_capacity(self, capacity):
+
+        if not capacity:
+            self.bucket = None
+        elif self.bucket is None:
+            self.bucket = TokenBucket(capacity, max(LINK_MTU, capacity * LINK_BURST_SECONDS))
+        else:
+            # Only the pace changes; the tokens already earned and the window's bytes in flight carry over.
+            self.bucket.delay(0, time.monotonic())
+            self.bucket.rate = capacity
+            self.bucket.burst = max(LINK_MTU, capacity * LINK_BURST_SECONDS)
+            self.bucket.tokens = min(self.bucket.tokens, self.bucket.burst)
+
+    def rate(self, now):
+
+        while self.recent and now - self.recent[0][0] > LINK_RATE_WINDOW:
+            self.recent.popleft()
+        return sum(size for _, size in self.recent) / LINK_RATE_WINDOW
+
+class LinkShaper:
+
+    def __init__(self, capacities=LINK_CAPACITIES, default_capacity=DEFAULT_LINK_CAPACITY):
+
+        # capacities maps neighbor IDs to bytes per second; links not listed use default_capacity, and None leaves a
+        # link unpaced so only its congestion window limits it.
+        self.capacities = dict(capacities)
+        self.default_capacity = default_capacity
+        self.links = {}
+        self.condition = threading.Condition()
+
+    def set_capacity(self, neighbor_id, capacity):
+
+        # The link keeps its state: senders may be waiting on its window, and the sends in flight release into it.
+        with self.condition:
+            self.capacities[neighbor_id] = capacity
+            if neighbor_id in self.links:
+                self.links[neighbor_id].set_capacity(capacity)
+            self.condition.notify_all()
+
+    def acquire(self, neighbor_id, size, packets=1):
+
+        # Blocks until size more bytes fit in the link's window and its bucket has paced them out. A send larger than
+        # the whole window still goes once nothing else is in flight.
+        with self.condition:
+            link = self._link(neighbor_id)
+            if link.window.in_flight and link.window.in_flight + size > link.window.size:
+                link.window_waits += 1
+                while link.window.in_flight and link.window.in_flight + size > link.window.size:
+                    self.condition.wait()
+            link.window.in_flight += size
+            now = time.monotonic()
+            delay = link.bucket.delay(size, now) if link.bucket else 0.0
+            link.paced_seconds += delay
+            link.bytes_sent += size
+            link.packets_sent += packets
+            link.recent.append((now + delay, size))
+        if delay:
+            time.sleep(delay)
+
+    def release(self, neighbor_id, size, delivered):
+
+        # delivered is the neighbor's acknowledgement, never just the kernel accepting bytes; a failed send, a packet the
+        # neighbor rejected or a timeout counts as a loss.
+        with self.condition:
+            link = self._link(neighbor_id)
+            link.window.in_flight = max(0, link.window.in_flight - size)
+            if delivered:
+                link.acknowledged += size
+                link.window.acknowledge(size)
+            else:
+                link.losses += 1
+                link.window.lose()
+            self.condition.notify_all()
+
+    def report_loss(self, neighbor_id):
+
+        # Loss noticed later, e.g. chunks that selective repeat had to resend through this neighbor.
+        with self.condition:
+            link = self._link(neighbor_id)
+            link.losses += 1
+            link.window.lose()
+            self.condition.notify_all()
+
+    def stats(self):
+
+        with self.condition:
+            now = time.monotonic()
+            return {
+                str(neighbor_id): {
+                    "capacity": link.bucket.rate if link.bucket else None,
+                    "bytes_per_second": link.rate(now),
+                    "window": int(link.window.size),
+                    "window_threshold": int(link.window.threshold),
+                    "in_flight": link.window.in_flight,
+                    "bytes_sent": link.bytes_sent,
+                    "packets_sent": link.packets_sent,
+                    "bytes_acknowledged": link.acknowledged,
+                    "losses": link.losses,
+                    "window_waits": link.window_waits,
+                    "paced_seconds": link.paced_seconds,
+                }
+                for neighbor_id, link in self.links.items()
+            }
+
+    def _link(self, neighbor_id):
+
+        link = self.links.get(neighbor_id)
+        if link is None:
+            link = self.links[neighbor_id] = LinkState(self.capacities.get(neighbor_id, self.default_capacity))
+        return link
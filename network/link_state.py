@@ -0,0 +1,198 @@
+# network/link_state.py
+
+import heapq
+import threading
+import time
+
+INFINITY = float("inf")
+
+def make_lsa(origin, sequence, links):
+
+    # links maps neighbor ID to (distance, link MTU); keys are strings so the advertisement survives a JSON round trip.
+    return {"origin": origin, "sequence": sequence, "links": {str(neighbor_id): list(link) for neighbor_id, link in links.items()}}
+
+class LinkStateDatabase:
+
+    def __init__(self, node_id):
+
+        self.node_id = node_id
+        # origin -> (sequence, {neighbor_id: (distance, mtu)})
+        self.lsas = {}
+        self.lock = threading.Lock()
+        # Shortest path tree rooted at this node, kept between updates so an advertisement only reworks the part it touches.
+        self.dist = {node_id: 0.0}
+        self.parent = {}
+        self.children = {}
+        self.first_hop = {}
+        self.path_mtu = {node_id: INFINITY}
+        self.table = {}
+        self.full_runs = 0
+        self.incremental_runs = 0
+        self.last_run_seconds = 0.0
+
+    def install(self, lsa):
+
+        # Returns the destinations whose route changed, or None if the advertisement is not newer than the one held.
+        origin = int(lsa["origin"])
+        sequence = int(lsa["sequence"])
+        with self.lock:
+            current = self.lsas.get(origin)
+            if current is not None and sequence <= current[0]:
+                return None
+            links = {int(neighbor_id): (float(link[0]), int(link[1])) for neighbor_id, link in lsa["links"].items()}
+            peers = set(links) | (set(current[1]) if current else set())
+            before = {edge: self.weight(*edge) for peer in peers for edge in ((origin, peer), (peer, origin))}
+            self.lsas[origin] = (sequence, links)
+            changed = [edge for edge, weight in before.items() if self.weight(*edge) != weight]
+            if not changed:
+                return set()
+
+            start = time.monotonic()
+            touched = self._incremental(changed)
+            self.incremental_runs += 1
+            self.last_run_seconds = time.monotonic() - start
+            return self._update_table(touched)
+
+    def recompute(self):
+
+        # Rebuilds the whole tree from scratch; updates never need this, it is the baseline they are measured against.
+        with self.lock:
+            start = time.monotonic()
+            touched = self._full()
+            self.full_runs += 1
+            self.last_run_seconds = time.monotonic() - start
+            return self._update_table(touched)
+
+    def weight(self, u, v):
+
+        # A link is used only when both ends advertise it, so a stale advertisement from a failed node cannot attract
+        # traffic; this node trusts its own adjacencies without waiting for the neighbor's advertisement.
+        lsa = self.lsas.get(u)
+        if lsa is None or v not in lsa[1]:
+            return None
+        if u != self.node_id and (v not in self.lsas or u not in self.lsas[v][1]):
+            return None
+        return lsa[1][v]
+
+    def advertisements(self):
+
+        with self.lock:
+            return [make_lsa(origin, sequence, links) for origin, (sequence, links) in self.lsas.items()]
+
+    def routes(self):
+
+        with self.lock:
+            return dict(self.table)
+
+    def stats(self):
+
+        with self.lock:
+            return {
+                "lsas": len(self.lsas),
+                "links": sum(1 for u, (_, links) in self.lsas.items() for v in links if u < v and self.weight(u, v)),
+                "full_runs": self.full_runs,
+                "incremental_runs": self.incremental_runs,
+                "last_run_seconds": self.last_run_seconds,
+            }
+
+    def _out_edges(self, u):
+
+        lsa = self.lsas.get(u)
+        if lsa is None:
+            return
+        for v in lsa[1]:
+            weight = self.weight(u, v)
+            if weight is not None:
+                yield v, weight
+
+    def _in_edges(self, v):
+
+        # Anyone with a usable link into v other than this node must also be listed in v's own advertisement.
+        candidates = set(self.lsas[v][1]) if v in self.lsas else set()
+        candidates.add(self.node_id)
+        for u in candidates:
+            weight = self.weight(u, v)
+            if weight is not None:
+                yield u, weight
+
+    def _relax(self, u, v, weight, heap, touched):
+
+        distance = self.dist[u] + weight[0]
+        if distance < self.dist.get(v, INFINITY):
+            self.dist[v] = distance
+            previous = self.parent.get(v)
+            if previous is not None:
+                self.children[previous].discard(v)
+            self.parent[v] = u
+            self.children.setdefault(u, set()).add(v)
+            self.first_hop[v] = v if u == self.node_id else self.first_hop[u]
+            self.path_mtu[v] = min(self.path_mtu[u], weight[1])
+            touched.add(v)
+            heapq.heappush(heap, (distance, v))
+
+    def _run(self, heap, touched):
+
+        while heap:
+            distance, u = heapq.heappop(heap)
+            if distance > self.dist.get(u, INFINITY):
+                continue
+            for v, weight in self._out_edges(u):
+                self._relax(u, v, weight, heap, touched)
+
+    def _full(self):
+
+        touched = set(self.dist) | set(self.table)
+        self.dist = {self.node_id: 0.0}
+        self.parent = {}
+        self.children = {}
+        self.first_hop = {}
+        self.path_mtu = {self.node_id: INFINITY}
+        self._run([(0.0, self.node_id)], touched)
+        return touched
+
+    def _incremental(self, changed):
+
+        # Every changed link on the tree invalidates the subtree below it: the union of those subtrees is reset and
+        # re-seeded from each node's best neighbor outside it. Changed links off the tree can only help, so each one
+        # seeds the heap if it shortens a path.
+        stack = [v for u, v in changed if self.parent.get(v) == u]
+        subtree = set()
+        while stack:
+            v = stack.pop()
+            if v not in subtree:
+                subtree.add(v)
+                stack.extend(self.children.get(v, ()))
+        for v in subtree:
+            parent = self.parent.pop(v, None)
+            if parent is not None and parent not in subtree:
+                self.children[parent].discard(v)
+            for state in (self.dist, self.children, self.first_hop, self.path_mtu):
+                state.pop(v, None)
+
+        heap = []
+        touched = set(subtree)
+        for v in subtree:
+            for u, weight in self._in_edges(v):
+                if u not in subtree and u in self.dist:
+                    self._relax(u, v, weight, heap, touched)
+        for u, v in changed:
+            weight = self.weight(u, v)
+            if weight is not None and u in self.dist:
+                self._relax(u, v, weight, heap, touched)
+        self._run(heap, touched)
+        return touched
+
+    def _update_table(self, touched):
+
+        changed = set()
+        for dest in touched:
+            if dest == self.node_id:
+                continue
+            route = (self.first_hop[dest], self.dist[dest], self.path_mtu[dest]) if dest in self.dist else None
+            if route != self.table.get(dest):
+                if route is None:
+                    del self.table[dest]
+                else:
+                    self.table[dest] = route
+                changed.add(dest)
+        return changed
@@ -0,0 +1,72 @@
+# network/link_stats.py
+
+import threading
+
+from network.packet import Packet, ImageChunkHeader, CHUNK_HASH_SIZE
+from utils.encryption_utils import NONCE_SIZE
+from app.config import (
+    LINK_MTU, MIN_CHUNK_SIZE, INITIAL_CHUNK_SIZE, LINK_EWMA_ALPHA, LINK_RTT_TARGET,
+    LINK_SUCCESS_LOW, LINK_SUCCESS_HIGH
+)
+
+# Bytes every image chunk adds on the wire on top of its compressed data, including the digest deduplicated chunks carry.
+CHUNK_OVERHEAD = Packet.HEADER_SIZE + NONCE_SIZE + ImageChunkHeader.SIZE + CHUNK_HASH_SIZE
+
+class LinkStats:
+
+    def __init__(self, alpha=LINK_EWMA_ALPHA):
+
+        self.alpha = alpha
+        self.rtt = None
+        self.success_rate = 1.0
+        self.samples = 0
+
+    def record(self, delivered, rtt=None):
+
+        # delivered is True/False for one send, or the fraction of chunks that arrived for a whole transfer.
+        self.success_rate += self.alpha * (float(delivered) - self.success_rate)
+        if rtt is not None and delivered:
+            self.rtt = rtt if self.rtt is None else self.rtt + self.alpha * (rtt - self.rtt)
+        self.samples += 1
+
+    def to_json(self):
+
+        return {"rtt": self.rtt, "success_rate": self.success_rate, "samples": self.samples}
+
+class AdaptiveChunkSizer:
+
+    def __init__(self, min_size=MIN_CHUNK_SIZE, initial_size=INITIAL_CHUNK_SIZE, max_size=LINK_MTU - CHUNK_OVERHEAD):
+
+        self.min_size = min_size
+        self.initial_size = initial_size
+        self.max_size = max_size
+        self.sizes = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def record(self, neighbor_id, delivered, rtt=None):
+
+        with self.lock:
+            stats = self.stats.setdefault(neighbor_id, LinkStats())
+            stats.record(delivered, rtt)
+            size = self.sizes.get(neighbor_id, self.initial_size)
+            # Multiplicative decrease on loss or a slow link; gentler growth while the link stays clean and fast.
+            if (delivered < 1 and stats.success_rate < LINK_SUCCESS_LOW) or (stats.rtt or 0) > 2 * LINK_RTT_TARGET:
+                size = max(self.min_size, size // 2)
+            elif stats.success_rate >= LINK_SUCCESS_HIGH and (stats.rtt is None or stats.rtt <= LINK_RTT_TARGET):
+                size = min(self.max_size, size + size // 4)
+            self.sizes[neighbor_id] = size
+
+    def chunk_size(self, neighbor_id, path_mtu=LINK_MTU):
+
+        with self.lock:
+            size = self.sizes.get(neighbor_id, self.initial_size)
+        return max(self.min_size, min(size, path_mtu - CHUNK_OVERHEAD))
+
+    def to_json(self):
+
+        with self.lock:
+            return {
+                str(neighbor_id): dict(stats.to_json(), chunk_size=self.sizes.get(neighbor_id, self.initial_size))
+                for neighbor_id, stats in self.stats.items()
+            }
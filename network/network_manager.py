@@ -1,19 +1,20 @@
 # network/network_manager.py
 
-import requests
 import time
 import threading
 from math import cos, sin
 import json
 import itertools
 
-from app.config import DISCOVERY_RANGE, BROADCAST_INTERVAL, BASE_PORT
+from app.config import (
+    DISCOVERY_RANGE, BROADCAST_INTERVAL, BASE_PORT, NODE_HOST, LINK_MTU, ROUTING_MODE, LSA_MIN_INTERVAL, LSA_FLOOD_DELAY,
+    DISCOVERY_FULL_EVERY, DISCOVERY_MARGIN
+)
 from utils.logging_utils import log, setup_logger
 from utils.distance_utils import calculate_distance
 from network.packet import Packet
-
-session = requests.Session()
-session.trust_env = False
+from network.fanout import FanOut
+from network.link_state import LinkStateDatabase, make_lsa
 
 class NetworkManager:
 
@@ -22,11 +23,29 @@ class NetworkManager:
         self.node = node
         self.neighbors = {}
         self.routing_table = {}
+        # MTU each neighbor advertises; a link carries at most the smaller of the two ends.
+        self.mtu = LINK_MTU
+        self.neighbor_mtu = {}
         self.logger = setup_logger(self.node.node_id, "general")
         self.heartbeat_interval = 15  
         self.heartbeat_timeout = 17  
         self.last_heartbeat = {}  
         self.position_update_interval = 20  
+        self.fanout = FanOut(self.get_neighbor_address)
+        self.peer_ids = list(itertools.chain(range(1, 11), range(1001, 1003)))
+        # Last position each peer reported, in range or not; routine position broadcasts only go to peers near us.
+        self.peer_positions = {}
+        self.position_broadcasts = 0
+        # "distance_vector" exchanges whole routing tables; "link_state" floods advertisements of each node's own links
+        # and runs shortest paths locally over the resulting topology.
+        self.routing_mode = ROUTING_MODE
+        self.link_state = LinkStateDatabase(node.node_id) if self.routing_mode == "link_state" else None
+        # Starts from the clock so advertisements from a restarted node still supersede the ones it sent before.
+        self.lsa_sequence = int(time.time() * 1000)
+        self.lsa_lock = threading.Lock()
+        self.lsa_scheduled = False
+        self.lsa_outbox = {}
+        self.lsa_flush_scheduled = False
 
     def start(self):
       
@@ -58,47 +77,70 @@ class NetworkManager:
       
         if not self.node.is_active():
             return
-        data = {"node_id": self.node.node_id, "position": self.node.position}
-        for node_id in itertools.chain(range(1, 11), range (1001, 1003)):
-            if node_id != self.node.node_id:
-                try:
-                    session.post(
-                        f"http://10.35.70.23:{BASE_PORT + node_id}/update_position",
-                        json=data,
-                    )
-
-                except requests.RequestException:
-                    pass
-
-    def update_position_with_neighbor(self, neighbor_id, position):
+        data = {"node_id": self.node.node_id, "position": self.node.position, "mtu": self.mtu}
+        self.fanout.post_all(self.position_peers(), "/update_position", data)
+
+    def position_peers(self):
+
+        # Every DISCOVERY_FULL_EVERY broadcasts, starting with the first, go to every peer so nodes that came into
+        # range or have never been heard from are found. The ones in between only reach current neighbors and peers
+        # last seen within DISCOVERY_MARGIN times the discovery range, which keeps them from growing with the square
+        # of the constellation.
+        self.position_broadcasts += 1
+        peers = [node_id for node_id in self.peer_ids if node_id != self.node.node_id]
+        if DISCOVERY_FULL_EVERY <= 1 or self.position_broadcasts % DISCOVERY_FULL_EVERY == 1:
+            return peers
+        reach = DISCOVERY_RANGE * DISCOVERY_MARGIN
+        return [
+            node_id for node_id in peers
+            if node_id in self.neighbors
+            or (node_id in self.peer_positions and calculate_distance(self.node.position, self.peer_positions[node_id]) <= reach)
+        ]
+
+    def update_position_with_neighbor(self, neighbor_id, position, mtu=None):
        
+        self.peer_positions[neighbor_id] = position
         distance = calculate_distance(self.node.position, position)
         if distance <= DISCOVERY_RANGE:
+            mtu_changed = self.record_neighbor_mtu(neighbor_id, mtu)
+            known = self.neighbors.get(neighbor_id)
+            if known is not None and known[1] == distance and not mtu_changed:
+                return
             self.neighbors[neighbor_id] = (position, distance)
-            self.routing_table[neighbor_id] = (neighbor_id, distance)
             log(self.logger, f"Node {self.node.node_id}: Added direct neighbor {neighbor_id} with distance {distance}")
             self.broadcast_public_key()
+            if self.link_state is not None:
+                if known is None:
+                    # A new neighbor gets every advertisement held here instead of waiting for them to be flooded again.
+                    self.queue_lsas(self.link_state.advertisements(), [neighbor_id])
+                self.schedule_lsa()
+                return
+            self.routing_table[neighbor_id] = (neighbor_id, distance, self.link_mtu(neighbor_id))
             self.propagate_routing_table()
+            self.node.router.request_drain()
 
     def send_heartbeat(self):
        
         if not self.node.is_active():
             return
 
-        for neighbor_id in self.neighbors:
-            try:
-                session.post(
-                    f"http://10.35.70.23:{BASE_PORT + int(neighbor_id)}/heartbeat",
-                    json={"node_id": self.node.node_id, "timestamp": time.time()},
-                )
-                log(self.node.general_logger, f"Sent heartbeat to Node {neighbor_id}")
-
-            except requests.RequestException:
+        results = self.fanout.post_all(list(self.neighbors), "/heartbeat", {"node_id": self.node.node_id, "timestamp": time.time(), "mtu": self.mtu})
+        for neighbor_id, result in results.items():
+            if isinstance(result, Exception):
                 log(self.node.general_logger, f"Failed to send heartbeat to Node {neighbor_id}", level="error")
+            else:
+                log(self.node.general_logger, f"Sent heartbeat to Node {neighbor_id}")
+        return results
 
-    def receive_heartbeat(self, sender_id, timestamp):
+    def receive_heartbeat(self, sender_id, timestamp, mtu=None):
      
         self.last_heartbeat[sender_id] = timestamp
+        if self.record_neighbor_mtu(sender_id, mtu) and sender_id in self.neighbors:
+            if self.link_state is not None:
+                self.schedule_lsa()
+            else:
+                self.routing_table[sender_id] = (sender_id, self.neighbors[sender_id][1], self.link_mtu(sender_id))
+                self.propagate_routing_table()
         log(self.node.general_logger, f"Received heartbeat from Node {sender_id}")
 
     def monitor_neighbors(self):
@@ -112,13 +154,35 @@ class NetworkManager:
                         self.remove_neighbor(neighbor_id)
             time.sleep(self.heartbeat_interval)
 
+    def record_neighbor_mtu(self, neighbor_id, mtu):
+
+        if mtu is None or self.neighbor_mtu.get(neighbor_id) == mtu:
+            return False
+        self.neighbor_mtu[neighbor_id] = int(mtu)
+        log(self.logger, f"Node {neighbor_id} reports MTU {mtu}")
+        return True
+
+    def link_mtu(self, neighbor_id):
+
+        return min(self.mtu, self.neighbor_mtu.get(neighbor_id, LINK_MTU))
+
+    def path_mtu(self, dest_id):
+
+        route = self.routing_table.get(dest_id)
+        if route is None:
+            return self.mtu
+        return route[2] if len(route) > 2 else self.link_mtu(route[0])
+
     def remove_neighbor(self, neighbor_id):
       
         if neighbor_id in self.neighbors:
             del self.neighbors[neighbor_id]
-            del self.last_heartbeat[neighbor_id]
+            self.last_heartbeat.pop(neighbor_id, None)
             log(self.node.general_logger, f"Removed neighbor {neighbor_id}")
-        self.routing_table.pop(neighbor_id, None)
+            if self.link_state is not None:
+                self.schedule_lsa()
+        if self.link_state is None:
+            self.routing_table.pop(neighbor_id, None)
 
     def broadcast_public_key(self):
        
@@ -126,18 +190,13 @@ class NetworkManager:
             return
 
         public_key = self.node.encryption_manager.get_public_key()
-        for neighbor_id in self.neighbors:
-            try:
-                neighbor_address = self.get_neighbor_address(neighbor_id)
-                if neighbor_address:
-                    session.post(
-                        f"{neighbor_address}/exchange_key",
-                        json={"node_id": self.node.node_id, "public_key": public_key},
-                    )
-                    log(self.logger, f"Broadcasted public key to Node {neighbor_id}")
-
-            except Exception as e:
-                log(self.logger, f"Failed to broadcast public key to Node {neighbor_id}: {e}", level="error")
+        results = self.fanout.post_all(list(self.neighbors), "/exchange_key", {"node_id": self.node.node_id, "public_key": public_key})
+        for neighbor_id, result in results.items():
+            if isinstance(result, Exception):
+                log(self.logger, f"Failed to broadcast public key to Node {neighbor_id}: {result}", level="error")
+            else:
+                log(self.logger, f"Broadcasted public key to Node {neighbor_id}")
+        return results
 
     def get_neighbor_addresses(self):
         
@@ -153,7 +212,7 @@ class NetworkManager:
     
     def get_neighbor_address(self, neighbor_id):
        
-        return f"http://10.35.70.23:{5000 + neighbor_id}"
+        return f"http://{NODE_HOST}:{BASE_PORT + int(neighbor_id)}"
 
     def update_routing_table(self, received_table, sender_id):
        
@@ -162,18 +221,29 @@ class NetworkManager:
             return
 
         updated = False
-        for dest_id, (_, distance) in received_table.items():
+        link_mtu = self.link_mtu(sender_id)
+        for dest_id, route in received_table.items():
+            dest_id = int(dest_id)
             if dest_id == self.node.node_id:
                 continue
 
+            distance = route[1]
+            # The path MTU is the smallest link MTU relays report along the route.
+            path_mtu = min(link_mtu, route[2]) if len(route) > 2 else link_mtu
             new_distance = self.neighbors[sender_id][1] + distance
-            if dest_id not in self.routing_table or new_distance < self.routing_table[dest_id][1]:
-                self.routing_table[dest_id] = (sender_id, new_distance)
+            current = self.routing_table.get(dest_id)
+            if current is None or new_distance < current[1]:
+                self.routing_table[dest_id] = (sender_id, new_distance, path_mtu)
                 updated = True
                 log(self.logger, f"Updated route to {dest_id} via {sender_id} with distance {new_distance}")
+            elif current[0] == sender_id and current[1] == new_distance and self.path_mtu(dest_id) != path_mtu:
+                self.routing_table[dest_id] = (sender_id, new_distance, path_mtu)
+                updated = True
+                log(self.logger, f"Updated path MTU to {dest_id} via {sender_id} to {path_mtu}")
 
         if updated:
             self.propagate_routing_table()
+            self.node.router.request_drain()
 
     def propagate_routing_table(self):
         
@@ -181,16 +251,97 @@ class NetworkManager:
             return
 
         serializable_routing_table = {str(dest): list(route) for dest, route in self.routing_table.items()}
-        for neighbor_id in self.neighbors:
-            try:
-                session.post(
-                    f"http://10.35.70.23:{BASE_PORT + int(neighbor_id)}/receive_routing_table",
-                    json=serializable_routing_table,
-                )
+        results = self.fanout.post_all(list(self.neighbors), f"/receive_routing_table?sender_id={self.node.node_id}", serializable_routing_table)
+        for neighbor_id, result in results.items():
+            if isinstance(result, Exception):
+                log(self.logger, f"Failed to send routing table to Neighbor {neighbor_id} - {result}", level="error")
+            else:
                 log(self.logger, f"Sent routing table to Neighbor {neighbor_id}")
+        return results
+
+    def schedule_lsa(self):
+
+        # Link changes within LSA_MIN_INTERVAL of each other go out as one advertisement.
+        with self.lsa_lock:
+            if self.lsa_scheduled:
+                return
+            self.lsa_scheduled = True
+        self.fanout.defer(self.originate_lsa, LSA_MIN_INTERVAL)
+
+    def originate_lsa(self):
+
+        with self.lsa_lock:
+            self.lsa_scheduled = False
+            self.lsa_sequence += 1
+            sequence = self.lsa_sequence
+        if not self.node.is_active():
+            return
+        links = {neighbor_id: (distance, self.link_mtu(neighbor_id)) for neighbor_id, (_, distance) in list(self.neighbors.items())}
+        log(self.logger, f"Node {self.node.node_id}: Advertising {len(links)} links with sequence {sequence}")
+        self.receive_lsas([make_lsa(self.node.node_id, sequence, links)])
+
+    def receive_lsas(self, lsas, sender_id=None):
+
+        if self.link_state is None:
+            log(self.logger, f"Received link-state advertisements from Node {sender_id} while in {self.routing_mode} mode", level="warning")
+            return 0
+
+        accepted = []
+        changed = set()
+        for lsa in lsas:
+            routes_changed = self.link_state.install(lsa)
+            if routes_changed is not None:
+                accepted.append(lsa)
+                changed |= routes_changed
+        if changed:
+            routes = self.link_state.routes()
+            for dest_id in changed:
+                if dest_id in routes:
+                    self.routing_table[dest_id] = routes[dest_id]
+                else:
+                    self.routing_table.pop(dest_id, None)
+            log(self.logger, f"Node {self.node.node_id}: Link-state update changed routes to {sorted(changed)}")
+            self.node.router.request_drain()
+        # Only advertisements that were new here are flooded on, and never back to the neighbor they came from.
+        if accepted:
+            self.queue_lsas(accepted, [neighbor_id for neighbor_id in self.neighbors if neighbor_id != sender_id])
+        return len(accepted)
+
+    def queue_lsas(self, lsas, neighbor_ids):
+
+        # Advertisements wait LSA_FLOOD_DELAY so several arriving together reach each neighbor in one message.
+        if not neighbor_ids:
+            return
+        with self.lsa_lock:
+            for neighbor_id in neighbor_ids:
+                queued = self.lsa_outbox.setdefault(neighbor_id, {})
+                for lsa in lsas:
+                    origin = int(lsa["origin"])
+                    if origin not in queued or queued[origin]["sequence"] < lsa["sequence"]:
+                        queued[origin] = lsa
+            if self.lsa_flush_scheduled:
+                return
+            self.lsa_flush_scheduled = True
+        self.fanout.defer(self.flush_lsas, LSA_FLOOD_DELAY)
+
+    def flush_lsas(self):
+
+        with self.lsa_lock:
+            outbox, self.lsa_outbox = self.lsa_outbox, {}
+            self.lsa_flush_scheduled = False
+        if not self.node.is_active():
+            return
 
-            except requests.RequestException as e:
-                log(self.logger, f"Failed to send routing table to Neighbor {neighbor_id} - {e}", level="error")
+        # Neighbors due the same advertisements share one fan-out.
+        groups = {}
+        for neighbor_id, queued in outbox.items():
+            key = tuple(sorted((origin, lsa["sequence"]) for origin, lsa in queued.items()))
+            groups.setdefault(key, ([], list(queued.values())))[0].append(neighbor_id)
+        for neighbor_ids, lsas in groups.values():
+            results = self.fanout.post_all(neighbor_ids, f"/receive_lsa?sender_id={self.node.node_id}", {"lsas": lsas})
+            for neighbor_id, result in results.items():
+                if isinstance(result, Exception):
+                    log(self.logger, f"Failed to send link-state advertisements to Neighbor {neighbor_id} - {result}", level="error")
 
     def _heartbeat_thread(self):
         
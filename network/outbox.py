@@ -0,0 +1,129 @@
+# network/outbox.py
+
+import os
+import json
+import threading
+
+from app.config import OUTBOX_DIR
+
+class OutboundTransfer:
+
+    def __init__(self, directory, transfer_id, dest_id, chunk_size, image_path=None, total_chunks=None, last_length=0, codec_id=0, dedup=False):
+
+        self.transfer_id = transfer_id
+        self.dest_id = dest_id
+        self.chunk_size = chunk_size
+        self.image_path = image_path
+        self.total_chunks = total_chunks
+        self.last_length = last_length
+        self.codec_id = codec_id
+        self.dedup = dedup
+        self.manifest_path = os.path.join(directory, f"{transfer_id}.json")
+        self.chunks_path = os.path.join(directory, f"{transfer_id}.chunks")
+        self.retransmitted_chunks = 0
+        self.status = None
+        self.status_event = threading.Event()
+        self.stored = None
+        self.stored_event = threading.Event()
+        self.deduplicated_chunks = 0
+        self.bytes_avoided = 0
+
+    def record(self, chunks):
+
+        # Passes (chunk_number, is_last, chunk) through while keeping a copy on disk for retransmission.
+        fd = os.open(self.chunks_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            for chunk_number, is_last, chunk in chunks:
+                os.pwrite(fd, chunk, (chunk_number - 1) * self.chunk_size)
+                if is_last:
+                    os.fsync(fd)
+                    self.total_chunks = chunk_number
+                    self.last_length = len(chunk)
+                    self.save_manifest()
+                yield chunk_number, is_last, chunk
+
+        finally:
+            os.close(fd)
+
+    def read_chunk(self, chunk_number):
+
+        length = self.last_length if chunk_number == self.total_chunks else self.chunk_size
+        with open(self.chunks_path, "rb") as chunks_file:
+            chunks_file.seek((chunk_number - 1) * self.chunk_size)
+            return chunks_file.read(length)
+
+    def iter_chunks(self):
+
+        with open(self.chunks_path, "rb") as chunks_file:
+            for chunk_number in range(1, self.total_chunks + 1):
+                length = self.last_length if chunk_number == self.total_chunks else self.chunk_size
+                yield chunk_number, chunk_number == self.total_chunks, chunks_file.read(length)
+
+    def is_recorded(self):
+
+        return self.total_chunks is not None
+
+    def save_manifest(self):
+
+        manifest = {
+            "transfer_id": self.transfer_id,
+            "dest_id": self.dest_id,
+            "chunk_size": self.chunk_size,
+            "image_path": self.image_path,
+            "total_chunks": self.total_chunks,
+            "last_length": self.last_length,
+            "codec_id": self.codec_id,
+            "dedup": self.dedup,
+        }
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temp_path, self.manifest_path)
+
+    def remove(self):
+
+        for path in (self.manifest_path, self.chunks_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+class Outbox:
+
+    def __init__(self, node_id, base_dir=OUTBOX_DIR):
+
+        self.directory = os.path.join(base_dir, f"Node_{node_id}")
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.transfers = {}
+        self.lock = threading.Lock()
+
+    def create(self, transfer_id, dest_id, chunk_size, image_path=None, codec_id=0, dedup=False):
+
+        transfer = OutboundTransfer(self.directory, transfer_id, dest_id, chunk_size, image_path, codec_id=codec_id, dedup=dedup)
+        transfer.save_manifest()
+        with self.lock:
+            self.transfers[transfer_id] = transfer
+        return transfer
+
+    def get(self, transfer_id):
+
+        with self.lock:
+            return self.transfers.get(transfer_id)
+
+    def pending(self):
+
+        # Transfers survive restarts on disk; reload any manifest that is not already in memory.
+        with self.lock:
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(".json"):
+                    continue
+                with open(os.path.join(self.directory, name)) as manifest_file:
+                    manifest = json.load(manifest_file)
+                if manifest["transfer_id"] not in self.transfers:
+                    self.transfers[manifest["transfer_id"]] = OutboundTransfer(self.directory, **manifest)
+            return list(self.transfers.values())
+
+    def remove(self, transfer):
+
+        with self.lock:
+            self.transfers.pop(transfer.transfer_id, None)
+        transfer.remove()
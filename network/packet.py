@@ -2,24 +2,59 @@
 
 import struct
 
+HEADER_STRUCT = struct.Struct("!BBHHII")
+LENGTH_STRUCT = struct.Struct("!I")
+FRAMED_HEADER_STRUCT = struct.Struct("!IBBHHII")
+IMAGE_CHUNK_STRUCT = struct.Struct("!IIIBB")
+TRANSFER_STATUS_STRUCT = struct.Struct("!IIB")
+CHUNK_QUERY_STRUCT = struct.Struct("!IIH")
+
+MESSAGE_TRANSFER_STATUS = 3
+MESSAGE_STATUS_REQUEST = 4
+MESSAGE_CHUNK_QUERY = 5
+MESSAGE_CHUNK_HAVE = 6
+
+CHUNK_HASH_SIZE = 16
+
 class Packet:
-    HEADER_FORMAT = "!BBHHII"  
-    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+    HEADER_FORMAT = "!BBHHII"
+    HEADER_SIZE = HEADER_STRUCT.size
+    LENGTH_PREFIX_SIZE = LENGTH_STRUCT.size
+
+    __slots__ = ("version", "message_type", "source_id", "dest_id", "sequence_number", "ttl", "payload")
 
     def __init__(self, version, message_type, source_id, dest_id, sequence_number, payload, ttl=10):
-       
+
         self.version = version
         self.message_type = message_type
         self.source_id = source_id
         self.dest_id = dest_id
         self.sequence_number = sequence_number
-        self.ttl = ttl  
+        self.ttl = ttl
         self.payload = payload
 
+    def size(self):
+
+        return self.HEADER_SIZE + len(self.payload)
+
     def to_bytes(self):
 
-        header = struct.pack(
-            self.HEADER_FORMAT,
+        header = HEADER_STRUCT.pack(
+            self.version,
+            self.message_type,
+            self.source_id,
+            self.dest_id,
+            self.sequence_number,
+            self.ttl
+        )
+        return b"".join((header, self.payload))
+
+    def pack_into(self, buffer, offset=0):
+
+        # Writes header and payload straight into a caller-owned buffer and returns the offset just past the packet.
+        HEADER_STRUCT.pack_into(
+            buffer,
+            offset,
             self.version,
             self.message_type,
             self.source_id,
@@ -27,23 +62,108 @@ class Packet:
             self.sequence_number,
             self.ttl
         )
-        serialized_packet = header + self.payload
-        return serialized_packet
+        start = offset + self.HEADER_SIZE
+        end = start + len(self.payload)
+        buffer[start:end] = self.payload
+        return end
 
     @staticmethod
-    def from_bytes(data):
+    def unpack_from(buffer, offset=0, length=None):
 
-        if len(data) < Packet.HEADER_SIZE:
-            raise ValueError(f"Insufficient data for header: expected {Packet.HEADER_SIZE} bytes, got {len(data)} bytes")
+        # The returned payload is a memoryview into `buffer`; copy it before the buffer is reused.
+        view = buffer if isinstance(buffer, memoryview) else memoryview(buffer)
+        if length is None:
+            length = len(view) - offset
+        if length < Packet.HEADER_SIZE:
+            raise ValueError(f"Insufficient data for header: expected {Packet.HEADER_SIZE} bytes, got {length} bytes")
 
-        header = data[:Packet.HEADER_SIZE]
-        payload = data[Packet.HEADER_SIZE:]
-        version, message_type, source_id, dest_id, sequence_number, ttl = struct.unpack(Packet.HEADER_FORMAT, header)
+        version, message_type, source_id, dest_id, sequence_number, ttl = HEADER_STRUCT.unpack_from(view, offset)
+        payload = view[offset + Packet.HEADER_SIZE:offset + length]
         return Packet(version, message_type, source_id, dest_id, sequence_number, payload, ttl)
 
+    @staticmethod
+    def from_bytes(data):
+
+        return Packet.unpack_from(data, 0, len(data))
+
+    @staticmethod
+    def batch_size(packets):
+
+        return sum(Packet.LENGTH_PREFIX_SIZE + packet.size() for packet in packets)
+
+    @staticmethod
+    def pack_batch_into(packets, buffer, offset=0):
+
+        pack_length = LENGTH_STRUCT.pack_into
+        pack_header = HEADER_STRUCT.pack_into
+        prefix_size = Packet.LENGTH_PREFIX_SIZE + Packet.HEADER_SIZE
+        for packet in packets:
+            payload = packet.payload
+            length = Packet.HEADER_SIZE + len(payload)
+            pack_length(buffer, offset, length)
+            pack_header(
+                buffer,
+                offset + Packet.LENGTH_PREFIX_SIZE,
+                packet.version,
+                packet.message_type,
+                packet.source_id,
+                packet.dest_id,
+                packet.sequence_number,
+                packet.ttl
+            )
+            start = offset + prefix_size
+            offset = start + len(payload)
+            buffer[start:offset] = payload
+        return offset
+
+    @staticmethod
+    def encode_batch(packets):
+
+        pack_framed_header = FRAMED_HEADER_STRUCT.pack
+        parts = []
+        for packet in packets:
+            payload = packet.payload
+            parts.append(pack_framed_header(
+                Packet.HEADER_SIZE + len(payload),
+                packet.version,
+                packet.message_type,
+                packet.source_id,
+                packet.dest_id,
+                packet.sequence_number,
+                packet.ttl
+            ))
+            parts.append(payload)
+        return b"".join(parts)
+
+    @staticmethod
+    def decode_batch(data, offset=0, count=None):
+
+        view = memoryview(data)
+        end = len(view)
+        unpack_length = LENGTH_STRUCT.unpack_from
+        unpack_header = HEADER_STRUCT.unpack_from
+        packets = []
+        while offset < end and (count is None or len(packets) < count):
+            if end - offset < Packet.LENGTH_PREFIX_SIZE:
+                raise ValueError(f"Truncated batch: {end - offset} trailing bytes at offset {offset}")
+
+            (length,) = unpack_length(view, offset)
+            offset += Packet.LENGTH_PREFIX_SIZE
+            if length < Packet.HEADER_SIZE or offset + length > end:
+                raise ValueError(f"Truncated batch: packet of {length} bytes at offset {offset} does not fit in {end} bytes")
+
+            version, message_type, source_id, dest_id, sequence_number, ttl = unpack_header(view, offset)
+            packets.append(Packet(version, message_type, source_id, dest_id, sequence_number, view[offset + Packet.HEADER_SIZE:offset + length], ttl))
+            offset += length
+        return packets
+
+    def with_payload(self, payload):
+
+        return Packet(self.version, self.message_type, self.source_id, self.dest_id, self.sequence_number, payload, self.ttl)
+
     def get_payload(self):
 
-        return self.payload.decode()
+        return bytes(self.payload).decode()
 
     def set_encrypted_payload(self, encrypted_payload):
 
@@ -56,3 +176,137 @@ class Packet:
     def decrement_ttl(self):
 
         self.ttl = max(self.ttl - 1, 0)
+
+class ImageChunkHeader:
+    SIZE = IMAGE_CHUNK_STRUCT.size
+    FLAG_LAST = 0x01
+    FLAG_PARITY = 0x02
+    # Hashed chunks start with a CHUNK_HASH_SIZE digest; references carry only the digest of a chunk the receiver stores.
+    FLAG_HASHED = 0x04
+    FLAG_REFERENCE = 0x08
+
+    __slots__ = ("transfer_id", "chunk_number", "total_chunks", "flags", "codec_id")
+
+    def __init__(self, transfer_id, chunk_number, total_chunks=0, flags=0, codec_id=0):
+
+        self.transfer_id = transfer_id
+        self.chunk_number = chunk_number
+        self.total_chunks = total_chunks
+        self.flags = flags
+        self.codec_id = codec_id
+
+    def is_last(self):
+
+        return bool(self.flags & self.FLAG_LAST)
+
+    def is_parity(self):
+
+        return bool(self.flags & self.FLAG_PARITY)
+
+    def is_hashed(self):
+
+        return bool(self.flags & self.FLAG_HASHED)
+
+    def is_reference(self):
+
+        return bool(self.flags & self.FLAG_REFERENCE)
+
+    def pack(self, chunk):
+
+        header = IMAGE_CHUNK_STRUCT.pack(self.transfer_id, self.chunk_number, self.total_chunks, self.flags, self.codec_id)
+        return b"".join((header, chunk))
+
+    @staticmethod
+    def unpack(payload):
+
+        # Returns the header and a memoryview of the chunk bytes that follow it.
+        view = payload if isinstance(payload, memoryview) else memoryview(payload)
+        if len(view) < ImageChunkHeader.SIZE:
+            raise ValueError(f"Insufficient data for image chunk header: expected {ImageChunkHeader.SIZE} bytes, got {len(view)} bytes")
+
+        transfer_id, chunk_number, total_chunks, flags, codec_id = IMAGE_CHUNK_STRUCT.unpack_from(view)
+        return ImageChunkHeader(transfer_id, chunk_number, total_chunks, flags, codec_id), view[ImageChunkHeader.SIZE:]
+
+class TransferStatus:
+    SIZE = TRANSFER_STATUS_STRUCT.size
+    FLAG_COMPLETE = 0x01
+    FLAG_NEEDS_KEY_FRAME = 0x02
+
+    __slots__ = ("transfer_id", "total_chunks", "flags", "bitmap")
+
+    def __init__(self, transfer_id, total_chunks=0, flags=0, bitmap=b""):
+
+        self.transfer_id = transfer_id
+        self.total_chunks = total_chunks
+        self.flags = flags
+        self.bitmap = bitmap
+
+    @staticmethod
+    def from_chunks(transfer_id, total_chunks, received):
+
+        # Bit n-1 (most significant bit first) is set when chunk n has arrived.
+        bitmap = bytearray((max(received, default=0) + 7) // 8)
+        for chunk_number in received:
+            bitmap[(chunk_number - 1) >> 3] |= 0x80 >> ((chunk_number - 1) & 7)
+        return TransferStatus(transfer_id, total_chunks or 0, 0, bytes(bitmap))
+
+    def is_complete(self):
+
+        return bool(self.flags & self.FLAG_COMPLETE)
+
+    def needs_key_frame(self):
+
+        # Set on a completed delta frame the receiver could not decode because it lacks the reference.
+        return bool(self.flags & self.FLAG_NEEDS_KEY_FRAME)
+
+    def has_chunk(self, chunk_number):
+
+        index = (chunk_number - 1) >> 3
+        return index < len(self.bitmap) and bool(self.bitmap[index] & (0x80 >> ((chunk_number - 1) & 7)))
+
+    def missing(self, total_chunks):
+
+        if self.is_complete():
+            return []
+        return [chunk_number for chunk_number in range(1, total_chunks + 1) if not self.has_chunk(chunk_number)]
+
+    def pack(self):
+
+        return b"".join((TRANSFER_STATUS_STRUCT.pack(self.transfer_id, self.total_chunks, self.flags), self.bitmap))
+
+    @staticmethod
+    def unpack(payload):
+
+        if len(payload) < TransferStatus.SIZE:
+            raise ValueError(f"Insufficient data for transfer status: expected {TransferStatus.SIZE} bytes, got {len(payload)} bytes")
+
+        transfer_id, total_chunks, flags = TRANSFER_STATUS_STRUCT.unpack_from(payload)
+        return TransferStatus(transfer_id, total_chunks, flags, bytes(payload[TransferStatus.SIZE:]))
+
+class ChunkQuery:
+    SIZE = CHUNK_QUERY_STRUCT.size
+
+    __slots__ = ("transfer_id", "first_chunk", "hashes")
+
+    def __init__(self, transfer_id, first_chunk, hashes):
+
+        # hashes[i] is the digest of chunk first_chunk + i; the reply is a TransferStatus bitmap of the ones already stored.
+        self.transfer_id = transfer_id
+        self.first_chunk = first_chunk
+        self.hashes = hashes
+
+    def pack(self):
+
+        return b"".join([CHUNK_QUERY_STRUCT.pack(self.transfer_id, self.first_chunk, len(self.hashes))] + list(self.hashes))
+
+    @staticmethod
+    def unpack(payload):
+
+        if len(payload) < ChunkQuery.SIZE:
+            raise ValueError(f"Insufficient data for chunk query: expected {ChunkQuery.SIZE} bytes, got {len(payload)} bytes")
+
+        transfer_id, first_chunk, count = CHUNK_QUERY_STRUCT.unpack_from(payload)
+        if len(payload) != ChunkQuery.SIZE + count * CHUNK_HASH_SIZE:
+            raise ValueError(f"Chunk query for {count} hashes has {len(payload) - ChunkQuery.SIZE} bytes of digests")
+        hashes = [bytes(payload[offset:offset + CHUNK_HASH_SIZE]) for offset in range(ChunkQuery.SIZE, len(payload), CHUNK_HASH_SIZE)]
+        return ChunkQuery(transfer_id, first_chunk, hashes)
@@ -0,0 +1,316 @@
+# network/reassembly.py
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+from network.fec import FecGroups, unpack_parity
+from app.config import REASSEMBLY_TTL, REASSEMBLY_MAX_BYTES, REASSEMBLY_MAX_SESSIONS, REASSEMBLY_EXPIRE_INTERVAL
+
+def remove_stale_spools(spool_dir, prefix):
+
+    # Spool files are only read through the session that opened them, so any left with this prefix are from a previous
+    # run. Returns how many were removed.
+    if not os.path.isdir(spool_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(spool_dir):
+        if name.startswith(prefix) and name.endswith(".spool"):
+            try:
+                os.remove(os.path.join(spool_dir, name))
+                removed += 1
+
+            except OSError:
+                pass
+    return removed
+
+class MemoryReassembly:
+
+    def __init__(self):
+
+        self.chunks = {}
+        self.total_chunks = None
+        self.buffered_bytes = 0
+        self.fec = None
+        self.codec_id = 0
+
+    def add(self, chunk_number, total_chunks, chunk):
+
+        if total_chunks:
+            self.total_chunks = total_chunks
+        if chunk_number not in self.chunks:
+            self.chunks[chunk_number] = bytes(chunk)
+            self.buffered_bytes += len(chunk)
+        return self.is_complete()
+
+    def is_complete(self):
+
+        return self.total_chunks is not None and len(self.chunks) == self.total_chunks
+
+    def received_chunks(self):
+
+        return list(self.chunks)
+
+    def has_chunk(self, chunk_number):
+
+        return chunk_number in self.chunks
+
+    def read_chunk(self, chunk_number):
+
+        return self.chunks[chunk_number]
+
+    def iter_blocks(self, block_size=None):
+
+        for chunk_number in range(1, self.total_chunks + 1):
+            yield self.chunks[chunk_number]
+
+    def discard(self):
+
+        self.chunks.clear()
+
+class SpoolReassembly:
+
+    def __init__(self, spool_dir, source_id):
+
+        os.makedirs(spool_dir, exist_ok=True)
+        self.path = os.path.join(spool_dir, f"{source_id}_{uuid.uuid4().hex}.spool")
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        self.received = set()
+        self.total_chunks = None
+        self.chunk_size = None
+        self.last_chunk = None
+        self.last_length = 0
+        self.buffered_bytes = 0
+        self.fec = None
+        self.codec_id = 0
+
+    def add(self, chunk_number, total_chunks, chunk):
+
+        if total_chunks:
+            self.total_chunks = total_chunks
+        if chunk_number in self.received:
+            return self.is_complete()
+
+        is_last = self.total_chunks is not None and chunk_number == self.total_chunks
+        if not is_last and self.chunk_size is None:
+            # Every chunk but the last has the same size, so the first one fixes each chunk's file offset.
+            self.chunk_size = len(chunk)
+            self._preallocate()
+            if self.last_chunk is not None:
+                self._write(self.total_chunks, self.last_chunk)
+                self.last_chunk = None
+
+        if is_last:
+            self.last_length = len(chunk)
+            if self.chunk_size is None and chunk_number > 1:
+                self.last_chunk = bytes(chunk)
+            else:
+                self._write(chunk_number, chunk)
+        else:
+            self._write(chunk_number, chunk)
+        if is_last and self.chunk_size is not None:
+            self._preallocate()
+
+        self.received.add(chunk_number)
+        self.buffered_bytes += len(chunk)
+        return self.is_complete()
+
+    def is_complete(self):
+
+        return self.total_chunks is not None and len(self.received) == self.total_chunks
+
+    def received_chunks(self):
+
+        return list(self.received)
+
+    def has_chunk(self, chunk_number):
+
+        return chunk_number in self.received
+
+    def read_chunk(self, chunk_number):
+
+        is_last = chunk_number == self.total_chunks
+        if is_last and self.last_chunk is not None:
+            return self.last_chunk
+        length = self.last_length if is_last else self.chunk_size
+        return os.pread(self.fd, length, (chunk_number - 1) * (self.chunk_size or 0))
+
+    def iter_blocks(self, block_size=64 * 1024):
+
+        size = (self.total_chunks - 1) * (self.chunk_size or 0) + self.last_length
+        offset = 0
+        while offset < size:
+            block = os.pread(self.fd, min(block_size, size - offset), offset)
+            if not block:
+                raise IOError(f"Spool file {self.path} truncated at {offset} of {size} bytes")
+            offset += len(block)
+            yield block
+
+    def discard(self):
+
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _write(self, chunk_number, chunk):
+
+        offset = (chunk_number - 1) * (self.chunk_size or 0)
+        os.pwrite(self.fd, chunk, offset)
+
+    def _preallocate(self):
+
+        if self.total_chunks is None or self.chunk_size is None:
+            return
+        size = (self.total_chunks - 1) * self.chunk_size + max(self.last_length, 1)
+        try:
+            os.posix_fallocate(self.fd, 0, size)
+
+        except (AttributeError, OSError):
+            pass
+
+class ReassemblyTable:
+
+    def __init__(self, session_factory, ttl=REASSEMBLY_TTL, max_bytes=REASSEMBLY_MAX_BYTES, max_sessions=REASSEMBLY_MAX_SESSIONS,
+                 expire_interval=REASSEMBLY_EXPIRE_INTERVAL):
+
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.expire_interval = expire_interval
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        # Keyed by (source_id, transfer_id) and kept in least-recently-updated order.
+        self.sessions = OrderedDict()
+        self.last_update = {}
+        # Remembers recently finished transfers so late duplicate chunks do not open a new session.
+        self.finished = OrderedDict()
+        self.buffered_bytes = 0
+        self.completed = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+        self.running = True
+        self.expire_thread = None
+
+    def add(self, key, chunk_number, total_chunks, chunk, parity=False, codec_id=0):
+
+        # Returns the finished session once its last missing chunk arrives; the caller owns and discards it.
+        # Parity chunks are numbered by the first data chunk of their group.
+        now = time.monotonic()
+        with self.lock:
+            if self.expire_thread is None and self.expire_interval:
+                # Abandoned transfers must expire even if no chunk ever arrives again.
+                self.expire_thread = threading.Thread(target=self._expire_loop, daemon=True)
+                self.expire_thread.start()
+            self._expire(now)
+            if key in self.finished:
+                return None
+            session = self.sessions.get(key)
+            if session is None:
+                session = self.sessions[key] = self.session_factory(key)
+                session.codec_id = codec_id
+            else:
+                self.sessions.move_to_end(key)
+            self.last_update[key] = now
+
+            before = session.buffered_bytes
+            if parity:
+                complete = self._add_parity(session, chunk_number, total_chunks, chunk)
+            else:
+                complete = session.add(chunk_number, total_chunks, chunk)
+                group_start = session.fec.group_of(chunk_number) if session.fec else None
+                if group_start is not None and not complete:
+                    complete = self._add_rebuilt(session, session.fec.repair(session, group_start))
+            self.buffered_bytes += session.buffered_bytes - before
+            if complete:
+                self._remove(key)
+                self.completed += 1
+                self.finished[key] = now
+                if len(self.finished) > self.max_sessions:
+                    self.finished.popitem(last=False)
+                return session
+
+            while self.sessions and (self.buffered_bytes > self.max_bytes or len(self.sessions) > self.max_sessions):
+                self._evict(next(iter(self.sessions)))
+        return None
+
+    def _add_parity(self, session, group_start, total_chunks, payload):
+
+        if total_chunks:
+            session.total_chunks = total_chunks
+        if session.fec is None:
+            session.fec = FecGroups()
+        group_size, parity_count, parity_index, last_length, parity = unpack_parity(payload)
+        rebuilt = session.fec.add_parity(session, group_start, group_size, parity_count, parity_index, last_length, parity)
+        return self._add_rebuilt(session, rebuilt) or session.is_complete()
+
+    def _add_rebuilt(self, session, rebuilt):
+
+        complete = False
+        for chunk_number, chunk in rebuilt:
+            complete = session.add(chunk_number, session.total_chunks if chunk_number == session.total_chunks else 0, chunk)
+        return complete
+
+    def expire(self, now=None):
+
+        with self.lock:
+            self._expire(time.monotonic() if now is None else now)
+
+    def stop(self):
+
+        self.running = False
+
+    def reopen(self, key):
+
+        # Forgets that a transfer finished, e.g. when its image could not be written, so resent chunks start it again.
+        with self.lock:
+            self.finished.pop(key, None)
+
+    def status(self, key):
+
+        # Returns (finished, total_chunks, received chunk numbers) for a selective-repeat status reply.
+        with self.lock:
+            if key in self.finished:
+                return True, None, []
+            session = self.sessions.get(key)
+            if session is None:
+                return False, None, []
+            return False, session.total_chunks, session.received_chunks()
+
+    def stats(self):
+
+        with self.lock:
+            return {
+                "active_transfers": len(self.sessions),
+                "buffered_bytes": self.buffered_bytes,
+                "completed_transfers": self.completed,
+                "evicted_transfers": self.evicted,
+            }
+
+    def _expire(self, now):
+
+        while self.sessions:
+            key = next(iter(self.sessions))
+            if now - self.last_update[key] < self.ttl:
+                break
+            self._evict(key)
+
+    def _expire_loop(self):
+
+        while self.running:
+            time.sleep(self.expire_interval)
+            self.expire()
+
+    def _remove(self, key):
+
+        session = self.sessions.pop(key)
+        del self.last_update[key]
+        self.buffered_bytes -= session.buffered_bytes
+        return session
+
+    def _evict(self, key):
+
+        self._remove(key).discard()
+        self.evicted += 1
@@ -1,31 +1,83 @@
 # network/route_manager.py
 
-import requests
-from utils.logging_utils import log
-from network.packet import Packet
-import zlib
-
-session = requests.Session()
-session.trust_env = False
+from utils.logging_utils import log, setup_logger
+from network.packet import (
+    Packet, ImageChunkHeader, TransferStatus, ChunkQuery, MESSAGE_TRANSFER_STATUS, MESSAGE_STATUS_REQUEST,
+    MESSAGE_CHUNK_QUERY, MESSAGE_CHUNK_HAVE, CHUNK_HASH_SIZE
+)
+from network.chunk_store import chunk_digest
+from network.batcher import PacketCoalescer
+from network.bundle_queue import BundleQueue
+from network.scheduler import OutboundScheduler, traffic_class, transfer_flow, completed, BULK
+from network.transport import create_transport, StreamServer, stream_port
+from network.link_stats import AdaptiveChunkSizer, CHUNK_OVERHEAD
+from network.link_shaper import LinkShaper
+from utils.compression_utils import get_codec
+from utils.stripe_utils import read_stripe_header, stripe_path
+from network.reassembly import MemoryReassembly, SpoolReassembly, ReassemblyTable, remove_stale_spools
+from app.config import (
+    BATCH_ENABLED, TRANSPORT, SPOOL_REASSEMBLY, SPOOL_DIR, MIN_CHUNK_SIZE, DEDUP_CHUNK_SIZE, STORE_AND_FORWARD,
+    SCHEDULER_ENABLED, LINK_SHAPING
+)
+import os
+import threading
+import time
+from concurrent.futures import Future
 
 class RouteManager:
 
     def __init__(self, node):
 
         self.node = node
-        self.image_chunks = {}  
+        if SPOOL_REASSEMBLY:
+            remove_stale_spools(SPOOL_DIR, f"{node.node_id}_")
+        self.reassembly = ReassemblyTable(self.new_reassembly)
+        self.images_received = 0
+        self.stripes_received = 0
+        self.batcher = PacketCoalescer(self.send_batch_to_node, setup_logger(node.node_id, "general")) if BATCH_ENABLED else None
+        self.scheduler = OutboundScheduler(self.dispatch, setup_logger(node.node_id, "general")) if SCHEDULER_ENABLED else None
+        self.transport = create_transport(node)
+        self.chunk_sizer = AdaptiveChunkSizer()
+        self.shaper = LinkShaper() if LINK_SHAPING else None
+        self.stream_server = None
+        self.bundles = BundleQueue(node.node_id) if STORE_AND_FORWARD else None
+        self.drain_event = threading.Event()
+        self.drain_thread = None
+        self.drain_lock = threading.Lock()
+
+    def start(self):
+
+        if TRANSPORT == "stream":
+            self.stream_server = StreamServer(self.node, self.receive_packet, stream_port(self.node.node_id))
+            self.stream_server.start()
+
+    def stop(self):
+
+        # Queued packets go out before the transport closes: the scheduler hands its queues to the batcher first.
+        if self.scheduler:
+            self.scheduler.stop()
+        if self.batcher:
+            self.batcher.stop()
+        if self.stream_server is not None:
+            self.stream_server.stop()
+            self.stream_server = None
+        self.transport.close()
+        if self.bundles is not None:
+            self.bundles.close()
 
     def forward_packet(self, packet):
 
+        # Returns a future resolving to whether the next hop took the packet (or it was held for later); sends are
+        # queued, so only the future tells the caller the packet really left.
         if not self.node.is_active():
             log(self.node.general_logger, "Node is offline and cannot forward packets.")
-            return False
+            return completed(False)
 
         network = self.node.network
         dest_id = packet.dest_id
         if dest_id == self.node.node_id:
             log(self.node.general_logger, f"Node {self.node.node_id}: Received packet for destination {dest_id}")
-            return True
+            return completed(True)
 
         if dest_id in network.routing_table:
             next_hop = network.routing_table[dest_id][0]
@@ -33,101 +85,398 @@ class RouteManager:
                 log(self.node.general_logger, f"Node {self.node.node_id}: No symmetric key with Node {next_hop}. Initiating key exchange.")
                 if not self.node.exchange_keys_with_neighbor(next_hop):
                     log(self.node.general_logger, f"Node {self.node.node_id}: Key exchange with Node {next_hop} failed. Cannot forward packet.", level="error")
-                    return False
+                    return completed(False)
 
             log(self.node.general_logger, f"Node {self.node.node_id}: Forwarding packet to next hop {next_hop} for destination {dest_id}")
-            self.send_to_node(next_hop, packet)
-            return True
+            return self.send_to_node(next_hop, packet)
+        if self.holds(packet):
+            log(self.node.general_logger, f"Node {self.node.node_id}: No route found for destination {dest_id}. Holding packet until one appears.")
+            return completed(self.hold_packet(packet))
         log(self.node.general_logger, f"Node {self.node.node_id}: No route found for destination {dest_id}. Initiating fallback.")
         return self.flood_packet(packet)
 
     def flood_packet(self, packet):
 
+        # The future resolves to True as soon as one copy is sent, or False once every copy has failed.
         if not self.node.is_active():
             log(self.node.general_logger, "Node is offline and cannot flood packets.")
-            return False
+            return completed(False)
 
-        for neighbor_id in self.node.network.neighbors:
+        flooded = Future()
+        deliveries = []
+        for neighbor_id in list(self.node.network.neighbors):
             log(self.node.general_logger, f"Node {self.node.node_id}: Flooding packet to Node {neighbor_id}")
-            self.send_to_node(neighbor_id, packet)
-        return True
+            deliveries.append(self.send_to_node(neighbor_id, packet))
+        lock = threading.Lock()
+
+        def copy_done(delivery):
+
+            with lock:
+                if not flooded.done() and (delivery.result() or all(copy.done() for copy in deliveries)):
+                    flooded.set_result(delivery.result())
 
-    def send_to_node(self, neighbor_id, packet):
+        if not deliveries:
+            flooded.set_result(False)
+        for delivery in deliveries:
+            delivery.add_done_callback(copy_done)
+        return flooded
+
+    def send_to_node(self, neighbor_id, packet, hold=True):
 
         if not self.node.is_active():
             log(self.node.general_logger, "Node is offline and cannot send packets.")
-            return
+            return completed(False)
 
         if neighbor_id not in self.node.shared_symmetric_keys:
             log(self.node.general_logger, f"Node {self.node.node_id}: No symmetric key with Node {neighbor_id}. Cannot send packet.", level="error")
-            return
+            return completed(False)
         shared_key = self.node.shared_symmetric_keys[neighbor_id]
         log(self.node.general_logger, f"{self.node.node_id} Shared key with {neighbor_id} - {shared_key}")
-        encrypted_payload = self.node.encryption_manager.encrypt(packet.payload, shared_key)
-        packet.payload = encrypted_payload
+        # Encrypts a copy: the caller's packet stays plaintext, so flooding or holding it later does not encrypt it twice.
+        encrypted_packet = packet.with_payload(self.node.encryption_manager.encrypt(packet.payload, shared_key))
+        if self.scheduler:
+            flow = transfer_flow(packet) if traffic_class(packet) == BULK else None
+            return self.scheduler.submit(neighbor_id, encrypted_packet, flow, hold)
+        delivery = self.dispatch(neighbor_id, encrypted_packet, hold)
+        return delivery if isinstance(delivery, Future) else completed(delivery)
+
+    def dispatch(self, neighbor_id, packet, hold=True):
+
+        # packet is already encrypted for neighbor_id. Returns whether it was sent, or for a batched packet a future
+        # that resolves when its batch goes out.
+        # Status requests share the chunk queue so they cannot overtake chunks still waiting in a batch. A packet that
+        # must not be held again goes out on its own, since a failed batch holds every packet in it.
+        if packet.message_type in (2, MESSAGE_STATUS_REQUEST) and self.batcher and hold:
+            return self.batcher.add(neighbor_id, packet)
+
         serialized_packet = packet.to_bytes()
-        log(self.node.general_logger, f"Serialized packet sent: {serialized_packet}")
-        log(self.node.general_logger, f"Shared symmetric key for Node {neighbor_id}: {shared_key}")
+        log(self.node.general_logger, f"Node {self.node.node_id}: Sending packet {packet.sequence_number} ({len(serialized_packet)} bytes) to Node {neighbor_id}")
+        sent = self.shaped_send(neighbor_id, len(serialized_packet), 1, lambda: self.transport.send(neighbor_id, serialized_packet, packet.message_type))
+        if not sent and hold:
+            return self.hold_failed(neighbor_id, [packet]) > 0
+        return sent
 
-        if packet.message_type == 2:
-            url = f"http://10.35.70.23:{5000 + int(neighbor_id)}/receive_image_from_satellite"
-        else:
-            url = f"http://10.35.70.23:{5000 + int(neighbor_id)}/receive"
+    def send_batch_to_node(self, neighbor_id, packets):
+
+        if not self.node.is_active():
+            log(self.node.general_logger, "Node is offline and cannot send packets.")
+            return False
+
+        size = sum(packet.size() for packet in packets)
+        sent = self.shaped_send(neighbor_id, size, len(packets), lambda: self.transport.send_batch(neighbor_id, packets))
+        if not sent:
+            self.hold_failed(neighbor_id, packets)
+        return sent
+
+    def shaped_send(self, neighbor_id, size, packets, send):
+
+        # The neighbor's acknowledgement opens the congestion window: its HTTP 200, or on the stream the ack it writes
+        # back once it has handled every packet. A rejected packet, a failure or a timeout shrinks it.
+        # The RTT sample is per packet: a stream ack only comes back once the whole batch is handled, so a large batch
+        # would otherwise look like a slow link to the chunk sizer.
+        if self.shaper:
+            self.shaper.acquire(neighbor_id, size, packets)
+        start = time.monotonic()
+        sent = False
         try:
-            response = session.post(url, data=serialized_packet)
-            if response.status_code == 200:
-                log(self.node.general_logger, f"Node {self.node.node_id}: Successfully sent packet to Node {neighbor_id}")
-            else:
-                log(self.node.general_logger, f"Failed to send packet to Node {neighbor_id}: {response.status_code}", level="error")
+            sent = send()
+
+        finally:
+            if self.shaper:
+                self.shaper.release(neighbor_id, size, sent)
+        self.chunk_sizer.record(neighbor_id, sent, (time.monotonic() - start) / max(packets, 1))
+        return sent
+
+    def hold_failed(self, neighbor_id, packets):
+
+        # Packets are already encrypted for this hop; they are held as plaintext so any later route can carry them.
+        held = [packet for packet in packets if self.holds(packet)]
+        if not held or neighbor_id not in self.node.shared_symmetric_keys:
+            return 0
+        shared_key = self.node.shared_symmetric_keys[neighbor_id]
+        held = [packet for packet in held if self.hold_packet(packet.with_payload(self.node.encryption_manager.decrypt(packet.payload, shared_key)))]
+        log(self.node.general_logger, f"Node {self.node.node_id}: Send to Node {neighbor_id} failed. Holding {len(held)} relayed packets.", level="warning")
+        return len(held)
+
+    def holds(self, packet):
+
+        # Only relayed packets and our own text messages are held: a node's own image transfers are already kept in its
+        # outbox and repaired end to end by selective repeat.
+        return self.bundles is not None and (packet.source_id != self.node.node_id or packet.message_type == 1)
+
+    def hold_packet(self, packet):
+
+        if not self.bundles.hold(packet):
+            log(self.node.general_logger, f"Node {self.node.node_id}: Bundle queue is full. Dropping packet for Node {packet.dest_id}.", level="error")
+            return False
+        return True
+
+    def request_drain(self):
+
+        # Called when a route may have appeared; draining runs on its own thread so control handlers return at once.
+        if self.bundles is None or not self.bundles.pending():
+            return
+        with self.drain_lock:
+            if self.drain_thread is None:
+                self.drain_thread = threading.Thread(target=self._drain_loop, daemon=True)
+                self.drain_thread.start()
+        self.drain_event.set()
+
+    def drain_bundles(self):
+
+        sent = 0
+        routing_table = self.node.network.routing_table
+        for dest_id in self.bundles.pending():
+            if dest_id in routing_table and self.node.is_active():
+                count = self.bundles.drain(dest_id, self.send_held)
+                if count:
+                    log(self.node.general_logger, f"Node {self.node.node_id}: Sent {count} held packets toward Node {dest_id}")
+                sent += count
+        self.flush()
+        return sent
+
+    def send_held(self, packet):
+
+        route = self.node.network.routing_table.get(packet.dest_id)
+        if route is None:
+            return False
+        next_hop = route[0]
+        if next_hop not in self.node.shared_symmetric_keys and not self.node.exchange_keys_with_neighbor(next_hop):
+            return False
+        # Waits for the send: the packet is only consumed once it has really left, and a failure leaves it at the
+        # head of its queue instead of holding it again behind newer packets.
+        return self.send_to_node(next_hop, packet, hold=False).result()
+
+    def _drain_loop(self):
+
+        while True:
+            self.drain_event.wait()
+            self.drain_event.clear()
+            try:
+                self.drain_bundles()
+
+            except Exception as e:
+                log(self.node.general_logger, f"Failed to drain held packets: {e}", level="error")
+
+    def chunk_size_for(self, dest_id):
+
+        # Sized for the first hop's observed quality, capped by the smallest MTU relays report along the path.
+        network = self.node.network
+        next_hop = network.routing_table[dest_id][0] if dest_id in network.routing_table else None
+        return self.chunk_sizer.chunk_size(next_hop, network.path_mtu(dest_id))
 
-        except requests.RequestException as e:
-            log(self.node.general_logger, f"Failed to send packet to Node {neighbor_id}: {str(e)}", level="error")
+    def dedup_chunk_size(self, dest_id):
 
-    def receive_packet(self, serialized_packet):
+        # Deduplication only matches chunks cut at the same boundaries, so it ignores link adaptation and only honours the path MTU.
+        return max(MIN_CHUNK_SIZE, min(DEDUP_CHUNK_SIZE, self.node.network.path_mtu(dest_id) - CHUNK_OVERHEAD))
 
+    def record_delivery(self, dest_id, delivered_fraction):
+
+        # End-to-end loss seen by selective repeat also counts against the first hop toward dest_id.
+        route = self.node.network.routing_table.get(dest_id)
+        if route is not None:
+            self.chunk_sizer.record(route[0], delivered_fraction)
+            if self.shaper and delivered_fraction < 1:
+                self.shaper.report_loss(route[0])
+
+    def link_stats(self):
+
+        # Per neighbor: chunk sizing inputs, plus live throughput and congestion window when shaping is on.
+        links = self.chunk_sizer.to_json()
+        for neighbor_id, stats in (self.shaper.stats() if self.shaper else {}).items():
+            links.setdefault(neighbor_id, {}).update(stats)
+        return links
+
+    def flush(self):
+
+        if self.scheduler:
+            self.scheduler.flush()
+        if self.batcher:
+            self.batcher.flush()
+
+    def has_pending(self):
+
+        return bool(self.scheduler and self.scheduler.pending()) or bool(self.batcher and self.batcher.pending)
+
+    def new_reassembly(self, key):
+
+        if SPOOL_REASSEMBLY:
+            sender_id, transfer_id = key
+            return SpoolReassembly(SPOOL_DIR, f"{self.node.node_id}_{sender_id}_{transfer_id}")
+        return MemoryReassembly()
+
+    def complete_image(self, reassembly, sender_id, transfer_id):
+
+        # Decompression and the disk write happen on the node's image writer thread, which discards the reassembly afterwards.
+        pieces = get_codec(reassembly.codec_id).iter_decompressed(reassembly.iter_blocks())
+        key = (sender_id, transfer_id)
+        self.node.image_writer.submit(
+            sender_id, pieces, key=key, on_written=lambda image_path: self.image_written(image_path, sender_id),
+            on_failed=lambda error: self.reassembly.reopen(key), on_done=reassembly.discard,
+        )
+
+    def image_written(self, image_path, sender_id):
+
+        if not self.node.frame_references.restore(sender_id, image_path):
+            log(self.node.general_logger, f"Dropped delta frame from Node {sender_id}: its reference frame is not cached", level="warning")
+            return
+        image_path = self.node.progressive_images.receive(sender_id, image_path)
+        if image_path is None:
+            log(self.node.general_logger, f"Stored part of a progressive image from Node {sender_id}")
+            return
+        stripe = read_stripe_header(image_path)
+        if stripe is not None:
+            self.store_stripe(image_path, sender_id, *stripe)
+            return
+        self.images_received += 1
+        self.node.catalog.add(image_path, sender_id)
+        log(self.node.general_logger, f"Image received and saved at {image_path}")
+
+    def store_stripe(self, image_path, sender_id, image_id, index, count, offset, image_size):
+
+        # A stripe is only a byte range of an image; it waits under its own name until a merge joins it with the others.
+        path = stripe_path(os.path.dirname(image_path), sender_id, image_id, index, count)
+        os.replace(image_path, path)
+        self.stripes_received += 1
+        self.node.catalog.add_stripe(path, sender_id, image_id, index, count, offset, image_size)
+        log(self.node.general_logger, f"Stored stripe {index + 1}/{count} of image {image_id} from Node {sender_id} at {path}")
+
+    def reply_transfer_status(self, sender_id, transfer_id):
+
+        # A transfer is only reported complete once its image is on disk, which also settles whether a delta frame was
+        # dropped. The reply waits on the image writer rather than here, so a slow disk never holds up the stream
+        # acknowledgement; a sender that gives up first simply asks again. A failed write reopens the transfer, so the
+        # status sent afterwards asks for every chunk again.
+        if not self.node.image_writer.when_done((sender_id, transfer_id), lambda written: self.send_transfer_status(sender_id, transfer_id, written)):
+            self.send_transfer_status(sender_id, transfer_id, True)
+
+    def send_transfer_status(self, sender_id, transfer_id, written):
+
+        finished, total_chunks, received = self.reassembly.status((sender_id, transfer_id))
+        if finished and not written:
+            log(self.node.general_logger, f"Image from transfer {transfer_id} could not be written", level="warning")
+        status = TransferStatus.from_chunks(transfer_id, total_chunks, received)
+        if finished and written:
+            status.flags |= TransferStatus.FLAG_COMPLETE
+        # Delta frames use their transfer ID as the frame ID.
+        if self.node.frame_references.needs_key_frame(sender_id, transfer_id):
+            status.flags |= TransferStatus.FLAG_NEEDS_KEY_FRAME
+        log(self.node.general_logger, f"Transfer {transfer_id} from Node {sender_id}: "
+            f"{'complete' if finished else f'{len(received)} chunks received'}")
+        packet = self.node.create_packet(dest_id=sender_id, payload=status.pack(), message_type=MESSAGE_TRANSFER_STATUS)
+        if packet is not None:
+            self.forward_packet(packet)
+
+    def reply_chunk_query(self, sender_id, query):
+
+        store = self.node.chunk_store
+        present = [query.first_chunk + index for index, digest in enumerate(query.hashes) if store.has(digest)]
+        log(self.node.general_logger, f"Transfer {query.transfer_id} from Node {sender_id}: {len(present)}/{len(query.hashes)} queried chunks already stored")
+        status = TransferStatus.from_chunks(query.transfer_id, 0, present)
+        packet = self.node.create_packet(dest_id=sender_id, payload=status.pack(), message_type=MESSAGE_CHUNK_HAVE)
+        if packet is not None:
+            self.forward_packet(packet)
+
+    def resolve_hashed_chunk(self, sender_id, header, chunk):
+
+        # Returns the chunk data, or None when it is corrupt or a reference to a chunk no longer stored.
+        digest = bytes(chunk[:CHUNK_HASH_SIZE])
+        if header.is_reference():
+            data = self.node.chunk_store.get(digest)
+            if data is None:
+                log(self.node.general_logger, f"Chunk {header.chunk_number} of transfer {header.transfer_id} from Node {sender_id} "
+                    "refers to a chunk that is not stored; waiting for it to be resent", level="warning")
+            return data
+
+        data = bytes(chunk[CHUNK_HASH_SIZE:])
+        if chunk_digest(data) != digest:
+            log(self.node.general_logger, f"Dropping chunk {header.chunk_number} of transfer {header.transfer_id} from Node {sender_id}: digest mismatch", level="error")
+            return None
+        self.node.chunk_store.put(digest, data)
+        return data
+
+    def receive_packet(self, serialized_packet, hop_id=None):
+
+        # True once the packet is handled or queued toward its next hop; False when it could not be read, decrypted,
+        # forwarded or processed, which the neighbor's acknowledgement reports back as a loss.
         if not self.node.is_active():
             log(self.node.general_logger, "Node is offline and cannot receive packets.")
-            return
+            return False
 
         try:
-            packet = Packet.from_bytes(serialized_packet)
+            packet = serialized_packet if isinstance(serialized_packet, Packet) else Packet.from_bytes(serialized_packet)
 
         except Exception as e:
             log(self.node.general_logger, f"Error deserializing packet: {e}", level="error")
-            return
+            return False
             
         sender_id = packet.source_id
-        if sender_id not in self.node.shared_symmetric_keys:
-            log(self.node.general_logger, f"No symmetric key with Node {sender_id}. Cannot decrypt packet.", level="error")
-            return
+        # Payloads are encrypted per hop; without a known previous hop assume the source sent it directly.
+        key_id = hop_id if hop_id is not None else sender_id
+        if key_id not in self.node.shared_symmetric_keys:
+            log(self.node.general_logger, f"No symmetric key with Node {key_id}. Cannot decrypt packet.", level="error")
+            return False
 
         try:
-            decrypted_payload = self.node.encryption_manager.decrypt(packet.payload, self.node.shared_symmetric_keys[sender_id])
+            decrypted_payload = self.node.encryption_manager.decrypt(packet.payload, self.node.shared_symmetric_keys[key_id])
 
         except Exception as e:
             log(self.node.general_logger, f"Failed to decrypt packet payload: {e}", level="error")
-            return
+            return False
+
+        if packet.dest_id != self.node.node_id:
+            packet.payload = decrypted_payload
+            packet.decrement_ttl()
+            if not packet.is_valid():
+                log(self.node.general_logger, f"Dropping packet from Node {sender_id} to Node {packet.dest_id}: TTL expired", level="warning")
+                return False
+            # Accepted once queued toward the next hop; a relayed packet whose send fails later is held, not lost.
+            delivery = self.forward_packet(packet)
+            return not delivery.done() or delivery.result()
 
         if packet.message_type == 2:  
             try:
-                metadata, chunk = decrypted_payload.split(b"|", 1)
-                chunk_number, total_chunks = map(int, metadata.decode('utf-8').split("/"))                
-                if sender_id not in self.image_chunks:
-                    self.image_chunks[sender_id] = {}
-                self.image_chunks[sender_id][chunk_number] = chunk                
-                if len(self.image_chunks[sender_id]) == total_chunks:
-                    full_image_data = b"".join(self.image_chunks[sender_id][i] for i in range(1, total_chunks + 1))
-                    try:
-                        decompressed_image_data = zlib.decompress(full_image_data)
-                        image_path = self.node.save_received_image(decompressed_image_data, sender_id)
-                        log(self.node.general_logger, f"Image received and saved at {image_path}")
-
-                    except Exception as e:
-                        log(self.node.general_logger, f"Failed to decompress and save image: {e}", level="error")
-                    finally:
-                        del self.image_chunks[sender_id]
+                header, chunk = ImageChunkHeader.unpack(decrypted_payload)
+                if header.is_hashed():
+                    chunk = self.resolve_hashed_chunk(sender_id, header, chunk)
+                    if chunk is None:
+                        return False
+                # Streaming senders only put the total on the final chunk (0 means not yet known).
+                reassembly = self.reassembly.add((sender_id, header.transfer_id), header.chunk_number, header.total_chunks, chunk, header.is_parity(), header.codec_id)
+                if reassembly is not None:
+                    self.complete_image(reassembly, sender_id, header.transfer_id)
 
             except Exception as e:
                 log(self.node.general_logger, f"Error processing image chunk: {e}", level="error")
+                return False
+        elif packet.message_type == MESSAGE_STATUS_REQUEST:
+            try:
+                self.reply_transfer_status(sender_id, TransferStatus.unpack(decrypted_payload).transfer_id)
+
+            except Exception as e:
+                log(self.node.general_logger, f"Error answering transfer status request: {e}", level="error")
+                return False
+        elif packet.message_type == MESSAGE_CHUNK_QUERY:
+            try:
+                self.reply_chunk_query(sender_id, ChunkQuery.unpack(decrypted_payload))
+
+            except Exception as e:
+                log(self.node.general_logger, f"Error answering chunk query: {e}", level="error")
+                return False
+        elif packet.message_type == MESSAGE_CHUNK_HAVE:
+            try:
+                self.node.handle_chunk_have(sender_id, TransferStatus.unpack(decrypted_payload))
+
+            except Exception as e:
+                log(self.node.general_logger, f"Error processing chunk query reply: {e}", level="error")
+                return False
+        elif packet.message_type == MESSAGE_TRANSFER_STATUS:
+            try:
+                self.node.handle_transfer_status(sender_id, TransferStatus.unpack(decrypted_payload))
+
+            except Exception as e:
+                log(self.node.general_logger, f"Error processing transfer status: {e}", level="error")
+                return False
         else:
             log(self.node.general_logger, f"Packet received: {decrypted_payload.decode('utf-8')}")
+        return True
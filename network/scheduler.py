@@ -0,0 +1,266 @@
+# network/scheduler.py
+
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from utils.logging_utils import log
+from network.packet import MESSAGE_TRANSFER_STATUS, MESSAGE_STATUS_REQUEST, MESSAGE_CHUNK_QUERY, MESSAGE_CHUNK_HAVE
+from app.config import SCHEDULER_QUANTUM, SCHEDULER_MAX_BULK_PACKETS
+
+CONTROL = "control"
+MESSAGE = "message"
+BULK = "bulk"
+# Served in this order: a class only gets the link when every class before it is empty.
+TRAFFIC_CLASSES = (CONTROL, MESSAGE, BULK)
+TRANSFER_ID_STRUCT = struct.Struct("!I")
+
+def completed(result):
+
+    future = Future()
+    future.set_result(result)
+    return future
+
+def chain(source, target, func=bool):
+
+    # Resolves target with func(source's result) once source is done; an error on either side counts as a failed send.
+    def done(source):
+
+        try:
+            result = func(source.result())
+
+        except Exception:
+            result = False
+        target.set_result(result)
+
+    source.add_done_callback(done)
+    return target
+
+def traffic_class(packet):
+
+    if packet.message_type in (MESSAGE_TRANSFER_STATUS, MESSAGE_CHUNK_QUERY, MESSAGE_CHUNK_HAVE):
+        return CONTROL
+    # Status requests travel with their transfer's chunks so they never overtake chunks still queued ahead of them.
+    if packet.message_type in (2, MESSAGE_STATUS_REQUEST):
+        return BULK
+    return MESSAGE
+
+def transfer_flow(packet):
+
+    # Image chunks and status requests both start with the transfer ID; read it before the payload is encrypted.
+    return packet.source_id, TRANSFER_ID_STRUCT.unpack_from(packet.payload)[0]
+
+class ClassStats:
+
+    def __init__(self):
+
+        self.packets = 0
+        self.bytes = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record(self, size, latency):
+
+        self.packets += 1
+        self.bytes += size
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def to_json(self):
+
+        return {
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "mean_latency": self.latency_total / self.packets if self.packets else None,
+            "max_latency": self.latency_max if self.packets else None,
+        }
+
+class NeighborQueue:
+
+    def __init__(self, quantum, weights):
+
+        self.quantum = quantum
+        self.weights = weights
+        self.queues = {CONTROL: deque(), MESSAGE: deque()}
+        # Deficit round robin between transfers: each turn a transfer may send up to quantum * weight more bytes.
+        self.flows = OrderedDict()
+        self.deficits = {}
+        self.bulk_packets = 0
+        self.sending = False
+        # Guards this neighbor's queues; only its worker and the senders waiting for bulk room wait on it.
+        self.condition = threading.Condition()
+
+    def __len__(self):
+
+        return len(self.queues[CONTROL]) + len(self.queues[MESSAGE]) + self.bulk_packets
+
+    def push(self, cls, flow, item):
+
+        if cls == BULK:
+            self.flows.setdefault(flow, deque()).append(item)
+            self.bulk_packets += 1
+        else:
+            self.queues[cls].append(item)
+
+    def pop(self):
+
+        for cls in (CONTROL, MESSAGE):
+            if self.queues[cls]:
+                return cls, self.queues[cls].popleft()
+        while self.flows:
+            flow, items = next(iter(self.flows.items()))
+            size = items[0][1].size()
+            deficit = self.deficits.get(flow, 0)
+            if deficit < size:
+                self.deficits[flow] = deficit + self.quantum * self.weights.get(flow, 1)
+                self.flows.move_to_end(flow)
+                continue
+            self.deficits[flow] = deficit - size
+            item = items.popleft()
+            self.bulk_packets -= 1
+            if not items:
+                # An idle transfer keeps no credit, so it cannot burst ahead when it comes back.
+                del self.flows[flow]
+                del self.deficits[flow]
+            return BULK, item
+        return None
+
+class OutboundScheduler:
+
+    def __init__(self, send_func, logger, quantum=SCHEDULER_QUANTUM, max_bulk_packets=SCHEDULER_MAX_BULK_PACKETS):
+
+        # send_func(neighbor_id, packet, hold) does the actual send; each neighbor gets one worker that calls it in
+        # priority order, so a backlog of image chunks on one link never sits in front of control traffic.
+        self.send_func = send_func
+        self.logger = logger
+        self.quantum = quantum
+        self.max_bulk_packets = max_bulk_packets
+        self.weights = {}
+        self.neighbors = {}
+        self.stats_by_class = {cls: ClassStats() for cls in TRAFFIC_CLASSES}
+        # Guards the neighbor table and the stats, and is notified when a neighbor's queue goes idle so flush() can
+        # return; a queue's own condition is always taken after this one, never before.
+        self.condition = threading.Condition()
+        self.running = True
+
+    def submit(self, neighbor_id, packet, flow=None, hold=True):
+
+        # Bulk packets are queued per flow; pass it in when the payload is already encrypted. Returns a future that
+        # resolves to send_func's result once the packet has really been sent, not merely queued.
+        cls = traffic_class(packet)
+        if cls == BULK and flow is None:
+            flow = transfer_flow(packet)
+        with self.condition:
+            if not self.running:
+                return completed(False)
+            queue = self.neighbors.get(neighbor_id)
+            if queue is None:
+                queue = self.neighbors[neighbor_id] = NeighborQueue(self.quantum, self.weights)
+                threading.Thread(target=self._worker, args=(neighbor_id, queue), daemon=True).start()
+        with queue.condition:
+            # Bulk senders wait for room; control and messages are never refused.
+            while cls == BULK and queue.bulk_packets >= self.max_bulk_packets and self.running:
+                queue.condition.wait()
+            if not self.running:
+                return completed(False)
+            delivery = Future()
+            queue.push(cls, flow, (time.monotonic(), packet, hold, delivery))
+            queue.condition.notify_all()
+        return delivery
+
+    def set_weight(self, flow, weight):
+
+        # flow is (source_id, transfer_id); a transfer with weight 2 gets twice the bytes of one with weight 1.
+        with self.condition:
+            self.weights[flow] = weight
+
+    def pending(self):
+
+        with self.condition:
+            return sum(self._pending(queue) for queue in self.neighbors.values())
+
+    def flush(self, timeout=None):
+
+        # Waits until every queued packet has been handed to the transport; latency is measured from submit to that point.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while any(self._pending(queue) for queue in self.neighbors.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=None):
+
+        # Sends what is already queued, then ends the workers; packets still queued after timeout are reported unsent.
+        self.flush(timeout)
+        with self.condition:
+            self.running = False
+            queues = list(self.neighbors.values())
+        for queue in queues:
+            with queue.condition:
+                queue.condition.notify_all()
+
+    def stats(self):
+
+        with self.condition:
+            queued = {}
+            active_transfers = 0
+            for neighbor_id, queue in self.neighbors.items():
+                with queue.condition:
+                    if len(queue):
+                        queued[neighbor_id] = len(queue)
+                    active_transfers += len(queue.flows)
+            return {
+                "classes": {cls: stats.to_json() for cls, stats in self.stats_by_class.items()},
+                "queued": queued,
+                "active_transfers": active_transfers,
+            }
+
+    def _pending(self, queue):
+
+        with queue.condition:
+            return len(queue) + queue.sending
+
+    def _worker(self, neighbor_id, queue):
+
+        while True:
+            with queue.condition:
+                entry = queue.pop()
+                while entry is None and self.running:
+                    queue.condition.wait()
+                    entry = queue.pop()
+                if not self.running:
+                    # Stopped: whatever is still queued is reported unsent rather than left waiting forever.
+                    unsent = ([entry] if entry else []) + list(iter(queue.pop, None))
+                    break
+                queue.sending = True
+                # Popping a chunk may have made room for a bulk sender waiting on this neighbor.
+                queue.condition.notify_all()
+            cls, (queued_at, packet, hold, delivery) = entry
+            result = False
+            try:
+                result = self.send_func(neighbor_id, packet, hold)
+
+            except Exception as e:
+                log(self.logger, f"Failed to send a {cls} packet to Node {neighbor_id}: {e}", level="error")
+
+            finally:
+                with queue.condition:
+                    queue.sending = False
+                    idle = not len(queue)
+                with self.condition:
+                    self.stats_by_class[cls].record(packet.size(), time.monotonic() - queued_at)
+                    # flush() only needs waking once this neighbor has nothing left to send.
+                    if idle:
+                        self.condition.notify_all()
+                # A batched packet is only sent when its batch is, so send_func may hand back a future of its own.
+                if isinstance(result, Future):
+                    chain(result, delivery)
+                else:
+                    delivery.set_result(bool(result))
+        for _, (_, _, _, delivery) in unsent:
+            delivery.set_result(False)
@@ -0,0 +1,141 @@
+# network/sim_bus.py
+
+from collections import Counter, deque
+import threading
+
+from utils.logging_utils import log
+from network.transport import LoopbackTransport
+
+class BusDelivery:
+
+    status_code = 200
+
+class BusFanOut:
+
+    def __init__(self, bus, node):
+
+        self.bus = bus
+        self.node = node
+
+    def post_all(self, peer_ids, path, payload, timeout=None):
+
+        results = {}
+        for peer_id in peer_ids:
+            self.bus.post(self.node.node_id, peer_id, path, payload)
+            results[peer_id] = BusDelivery()
+        return results
+
+    def defer(self, callback, delay):
+
+        # The delay is not simulated: callback runs once everything already queued on the bus has been delivered.
+        self.bus.post_callback(self.node.node_id, callback)
+
+class SimulationBus:
+
+    def __init__(self):
+
+        self.nodes = {}
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.control_messages = Counter()
+        self.data_packets = 0
+        self.data_bytes = 0
+        self.dropped_packets = 0
+        # Optional callable(sender_id, neighbor_id, packet) returning True to lose that packet on the link.
+        self.loss_filter = None
+        self.lost_packets = 0
+
+    def register(self, node):
+
+        self.nodes[node.node_id] = node
+        node.network.fanout = BusFanOut(self, node)
+        node.router.transport = LoopbackTransport(node, self)
+
+    def connect_all(self):
+
+        node_ids = list(self.nodes)
+        for node in self.nodes.values():
+            node.network.peer_ids = node_ids
+
+    def post(self, sender_id, peer_id, path, payload):
+
+        with self.lock:
+            self.queue.append((sender_id, peer_id, path.split("?", 1)[0], payload))
+
+    def post_callback(self, node_id, callback):
+
+        with self.lock:
+            self.queue.append((node_id, node_id, None, callback))
+
+    def run_until_idle(self, max_messages=None):
+
+        # Control messages are queued rather than dispatched inline so that propagation storms stay iterative.
+        delivered = 0
+        while max_messages is None or delivered < max_messages:
+            with self.lock:
+                if not self.queue:
+                    break
+                sender_id, peer_id, path, payload = self.queue.popleft()
+            self._dispatch(sender_id, peer_id, path, payload)
+            delivered += 1
+        return delivered
+
+    def deliver_packets(self, sender_id, neighbor_id, packets, size):
+
+        node = self.nodes.get(neighbor_id)
+        if node is None or not node.is_active():
+            with self.lock:
+                self.dropped_packets += len(packets)
+            return False
+
+        with self.lock:
+            self.data_packets += len(packets)
+            self.data_bytes += size
+        for packet in packets:
+            if self.loss_filter and self.loss_filter(sender_id, neighbor_id, packet):
+                with self.lock:
+                    self.lost_packets += 1
+                continue
+            node.router.receive_packet(packet, sender_id)
+        return True
+
+    def reset_counters(self):
+
+        with self.lock:
+            self.control_messages.clear()
+            self.data_packets = 0
+            self.data_bytes = 0
+            self.dropped_packets = 0
+            self.lost_packets = 0
+
+    def _dispatch(self, sender_id, peer_id, path, payload):
+
+        node = self.nodes.get(peer_id)
+        if path is None:
+            try:
+                payload()
+
+            except Exception as e:
+                log(node.general_logger, f"Simulation bus: deferred callback on Node {peer_id} failed - {e}", level="error")
+            return
+
+        self.control_messages[path] += 1
+        if node is None or not node.is_active():
+            return
+
+        try:
+            if path == "/update_position":
+                node.network.update_position_with_neighbor(payload["node_id"], tuple(payload["position"]), payload.get("mtu"))
+            elif path == "/heartbeat":
+                node.network.receive_heartbeat(payload["node_id"], payload["timestamp"], payload.get("mtu"))
+            elif path == "/exchange_key":
+                node.accept_public_key(payload["node_id"], payload["public_key"])
+            elif path == "/receive_routing_table":
+                node.network.update_routing_table(payload, sender_id)
+            elif path == "/receive_lsa":
+                node.network.receive_lsas(payload["lsas"], sender_id)
+            else:
+                log(node.general_logger, f"Simulation bus: no handler for {path} from Node {sender_id}", level="warning")
+
+        except Exception as e:
+            log(node.general_logger, f"Simulation bus: error handling {path} from Node {sender_id} - {e}", level="error")
@@ -0,0 +1,280 @@
+# network/transport.py
+
+import asyncio
+import struct
+import threading
+import time
+import requests
+
+from app.config import NODE_HOST, BASE_PORT, STREAM_PORT_OFFSET, TRANSPORT, STREAM_RETRY_INTERVAL, SEND_TIMEOUT, STREAM_MAX_FRAME
+from utils.logging_utils import log
+from network.packet import Packet, LENGTH_STRUCT
+from network.batcher import encode_frame
+
+HELLO_MAGIC = b"ALH1"
+HELLO_STRUCT = struct.Struct("!4sI")
+# Closes every write on a stream: magic, packets in the write. The receiver answers with ACK_STRUCT once it has
+# handled them: magic, packets handled, packets that failed.
+WRITE_END_MAGIC = b"ALE1"
+ACK_MAGIC = b"ALK1"
+ACK_STRUCT = struct.Struct("!4sII")
+HOP_HEADER = "X-Hop-Id"
+
+session = requests.Session()
+session.trust_env = False
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def get_event_loop():
+
+    # One background event loop per process carries every stream connection and server.
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+    return _loop
+
+def http_port(node_id):
+
+    return BASE_PORT + int(node_id)
+
+def stream_port(node_id):
+
+    return BASE_PORT + STREAM_PORT_OFFSET + int(node_id)
+
+class HttpTransport:
+
+    def __init__(self, node, host=NODE_HOST):
+
+        self.node = node
+        self.host = host
+
+    def send(self, neighbor_id, data, message_type):
+
+        if message_type == 2:
+            url = f"http://{self.host}:{http_port(neighbor_id)}/receive_image_from_satellite"
+        else:
+            url = f"http://{self.host}:{http_port(neighbor_id)}/receive"
+        return self._post(neighbor_id, url, data, "packet")
+
+    def send_batch(self, neighbor_id, packets):
+
+        url = f"http://{self.host}:{http_port(neighbor_id)}/receive_batch"
+        return self._post(neighbor_id, url, encode_frame(packets), f"batch of {len(packets)} packets", len(packets))
+
+    def _post(self, neighbor_id, url, data, description, count=None):
+
+        # The response is the neighbor's acknowledgement: a single packet it rejects answers non-2xx, and a batch reports
+        # how many of its count packets were handled, as a stream acknowledgement does.
+        try:
+            response = session.post(url, data=data, headers={HOP_HEADER: str(self.node.node_id)}, timeout=SEND_TIMEOUT)
+            if response.status_code == 200 and count is not None:
+                result = response.json()
+                if result.get("failed") or result.get("handled", count) != count:
+                    log(self.node.general_logger, f"Node {self.node.node_id}: Node {neighbor_id} failed to handle "
+                        f"{count - result.get('handled', 0)} of {count} packets", level="error")
+                    return False
+            if response.status_code == 200:
+                log(self.node.general_logger, f"Node {self.node.node_id}: Successfully sent {description} to Node {neighbor_id}")
+                return True
+            log(self.node.general_logger, f"Failed to send {description} to Node {neighbor_id}: {response.status_code}", level="error")
+
+        except (requests.RequestException, ValueError) as e:
+            log(self.node.general_logger, f"Failed to send {description} to Node {neighbor_id}: {str(e)}", level="error")
+        return False
+
+    def close(self):
+
+        pass
+
+class StreamTransport:
+
+    def __init__(self, node, host=NODE_HOST, fallback=None):
+
+        self.node = node
+        self.host = host
+        self.fallback = fallback if fallback is not None else HttpTransport(node, host)
+        self.loop = get_event_loop()
+        self.connections = {}
+        self.connection_locks = {}
+        self.unreachable_until = {}
+        # The first frame on every stream names the sending node so the receiver can pick the hop key. Built here so a
+        # node ID that is not an integer fails at construction instead of turning every stream send into an HTTP fallback.
+        hello = HELLO_STRUCT.pack(HELLO_MAGIC, int(node.node_id))
+        self.hello = b"".join((LENGTH_STRUCT.pack(len(hello)), hello))
+
+    def send(self, neighbor_id, data, message_type):
+
+        sent = self._write(neighbor_id, b"".join((LENGTH_STRUCT.pack(len(data)), data)), 1) if self._stream_available(neighbor_id) else None
+        return self.fallback.send(neighbor_id, data, message_type) if sent is None else sent
+
+    def send_batch(self, neighbor_id, packets):
+
+        # A packet batch is already a run of length-prefixed packets, i.e. valid stream frames.
+        sent = self._write(neighbor_id, Packet.encode_batch(packets), len(packets)) if self._stream_available(neighbor_id) else None
+        return self.fallback.send_batch(neighbor_id, packets) if sent is None else sent
+
+    def close(self):
+
+        for neighbor_id in list(self.connections):
+            asyncio.run_coroutine_threadsafe(self._close_connection(neighbor_id), self.loop).result(SEND_TIMEOUT)
+
+    def _stream_available(self, neighbor_id):
+
+        return time.monotonic() >= self.unreachable_until.get(neighbor_id, 0)
+
+    def _write(self, neighbor_id, frames, count):
+
+        # True once the neighbor acknowledges every packet as handled, False if it reports a failure or the stream broke
+        # after frames went out, None if no stream could be opened and the caller should fall back to HTTP.
+        written = []
+        future = asyncio.run_coroutine_threadsafe(self._write_frames(neighbor_id, frames, count, written), self.loop)
+        try:
+            handled, failed = future.result(SEND_TIMEOUT)
+
+        except Exception as e:
+            future.cancel()
+            self.unreachable_until[neighbor_id] = time.monotonic() + STREAM_RETRY_INTERVAL
+            asyncio.run_coroutine_threadsafe(self._close_connection(neighbor_id), self.loop)
+            if not written:
+                log(self.node.general_logger, f"Node {self.node.node_id}: Stream to Node {neighbor_id} failed, falling back to HTTP - {e}", level="warning")
+                return None
+            # The neighbor may already have handled part of the write, so resending it over HTTP could deliver it twice.
+            log(self.node.general_logger, f"Node {self.node.node_id}: Stream to Node {neighbor_id} broke before the write of {count} packets was acknowledged - {e}", level="error")
+            return False
+        if failed or handled != count:
+            log(self.node.general_logger, f"Node {self.node.node_id}: Node {neighbor_id} failed to handle {count - handled} of {count} packets", level="error")
+            return False
+        return True
+
+    async def _write_frames(self, neighbor_id, frames, count, written):
+
+        lock = self.connection_locks.setdefault(neighbor_id, asyncio.Lock())
+        async with lock:
+            connection = self.connections.get(neighbor_id)
+            if connection is None or connection[1].is_closing():
+                connection = await asyncio.open_connection(self.host, stream_port(neighbor_id))
+                connection[1].write(self.hello)
+                self.connections[neighbor_id] = connection
+                log(self.node.general_logger, f"Node {self.node.node_id}: Opened stream to Node {neighbor_id}")
+            reader, writer = connection
+            written.append(count)
+            end = HELLO_STRUCT.pack(WRITE_END_MAGIC, count)
+            writer.write(b"".join((frames, LENGTH_STRUCT.pack(len(end)), end)))
+            await writer.drain()
+            magic, handled, failed = ACK_STRUCT.unpack(await reader.readexactly(ACK_STRUCT.size))
+            if magic != ACK_MAGIC:
+                raise ValueError(f"Bad acknowledgement magic {magic!r}")
+            return handled, failed
+
+    async def _close_connection(self, neighbor_id):
+
+        connection = self.connections.pop(neighbor_id, None)
+        if connection is not None:
+            connection[1].close()
+
+class StreamServer:
+
+    def __init__(self, node, handler, port, host="0.0.0.0"):
+
+        self.node = node
+        self.handler = handler
+        self.port = port
+        self.host = host
+        self.loop = get_event_loop()
+        self.server = None
+        self.writers = set()
+
+    def start(self):
+
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle_connection, self.host, self.port), self.loop
+        ).result()
+        log(self.node.general_logger, f"Node {self.node.node_id}: Stream server listening on port {self.port}")
+
+    def stop(self):
+
+        # Returns once the port is released; open connections are closed too, since they would keep the server alive.
+        if self.server is not None:
+            asyncio.run_coroutine_threadsafe(self._close(), self.loop).result(SEND_TIMEOUT)
+            self.server = None
+
+    async def _close(self):
+
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        await self.server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+
+        self.writers.add(writer)
+        hop_id = None
+        handled = failed = 0
+        try:
+            while True:
+                header = await reader.readexactly(LENGTH_STRUCT.size)
+                (length,) = LENGTH_STRUCT.unpack(header)
+                # A length past any packet the sender could batch means the stream is corrupt; nothing after it can be trusted.
+                if length > STREAM_MAX_FRAME:
+                    log(self.node.general_logger, f"Node {self.node.node_id}: Closing stream from Node {hop_id}: frame of {length} bytes "
+                        f"exceeds {STREAM_MAX_FRAME}", level="error")
+                    break
+                data = await reader.readexactly(length)
+                if length == HELLO_STRUCT.size and data[:4] in (HELLO_MAGIC, WRITE_END_MAGIC):
+                    magic, value = HELLO_STRUCT.unpack(data)
+                    if magic == HELLO_MAGIC:
+                        hop_id = value
+                    else:
+                        writer.write(ACK_STRUCT.pack(ACK_MAGIC, handled, failed))
+                        await writer.drain()
+                        handled = failed = 0
+                    continue
+                # Packet handling may block on forwarding, so keep it off the event loop. A packet the handler rejects
+                # only fails itself; the packets queued behind it on the stream are still handled.
+                try:
+                    ok = await self.loop.run_in_executor(None, self.handler, data, hop_id)
+
+                except Exception as e:
+                    log(self.node.general_logger, f"Node {self.node.node_id}: Failed to handle packet from Node {hop_id} - {e}", level="error")
+                    ok = False
+                if not ok:
+                    failed += 1
+                else:
+                    handled += 1
+
+        except asyncio.IncompleteReadError:
+            pass
+
+        except Exception as e:
+            log(self.node.general_logger, f"Node {self.node.node_id}: Stream connection error - {e}", level="error")
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+class LoopbackTransport:
+
+    def __init__(self, node, bus):
+
+        self.node = node
+        self.bus = bus
+
+    def send(self, neighbor_id, data, message_type):
+
+        return self.bus.deliver_packets(self.node.node_id, neighbor_id, [Packet.from_bytes(data)], len(data))
+
+    def send_batch(self, neighbor_id, packets):
+
+        return self.bus.deliver_packets(self.node.node_id, neighbor_id, packets, sum(packet.size() for packet in packets))
+
+    def close(self):
+
+        pass
+
+def create_transport(node, kind=TRANSPORT):
+
+    if kind == "stream":
+        return StreamTransport(node)
+    return HttpTransport(node)
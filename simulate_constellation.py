@@ -0,0 +1,197 @@
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+from PIL import Image
+
+from app.config import DISCOVERY_RANGE, PACKET_TTL
+from utils.logging_utils import set_file_logging
+from network.sim_bus import SimulationBus
+import network.network_manager as network_manager
+
+set_file_logging(False)
+
+import app.satellite_node as satellite_node
+import app.ground_station as ground_station
+from app.satellite_node import SatelliteNode
+from app.ground_station import GroundStation
+
+# Distance-vector routing floods whole tables on every change, so it converges far more slowly than link state
+# (about 200s and 1.2M control messages at 200 satellites, against under 5s for link state); it defaults to a smaller
+# constellation.
+DEFAULT_SATELLITES = {"distance_vector": 50, "link_state": 200}
+
+def build_constellation(bus, num_satellites, num_stations, target_degree, seed):
+
+    rng = random.Random(seed)
+    # Satellites sit in a thin shell so density, not box volume, sets the neighbor count.
+    side = math.sqrt(num_satellites * math.pi * (0.9 * DISCOVERY_RANGE) ** 2 / target_degree)
+    satellites = []
+    for node_id in range(1, num_satellites + 1):
+        position = (rng.uniform(0, side), rng.uniform(0, side), rng.uniform(5, 10))
+        satellites.append(SatelliteNode(node_id, position, start_services=False))
+    stations = []
+    for index in range(num_stations):
+        position = (rng.uniform(0, side), rng.uniform(0, side), 0.0)
+        stations.append(GroundStation(1001 + index, position, start_services=False))
+
+    for node in satellites + stations:
+        bus.register(node)
+    bus.connect_all()
+    return satellites, stations, side
+
+def routing_snapshot(nodes):
+
+    return {node.node_id: dict(node.network.routing_table) for node in nodes}
+
+def measure_convergence(bus, nodes, max_rounds):
+
+    bus.reset_counters()
+    start = time.monotonic()
+    previous = routing_snapshot(nodes)
+    rounds = 0
+    for rounds in range(1, max_rounds + 1):
+        for node in nodes:
+            node.network.broadcast_position()
+        bus.run_until_idle()
+        current = routing_snapshot(nodes)
+        if current == previous:
+            break
+        previous = current
+    elapsed = time.monotonic() - start
+    return rounds, elapsed, sum(bus.control_messages.values()), dict(bus.control_messages)
+
+def route_diameter(nodes):
+
+    # Longest route, in hops, that the converged routing tables send a packet along; routes follow the shortest distance,
+    # so this can exceed the fewest-hops diameter of the neighbor graph.
+    by_id = {node.node_id: node for node in nodes}
+    longest = 0
+    for dest_id in by_id:
+        hops = {dest_id: 0}
+        for node in nodes:
+            path = []
+            current = node.node_id
+            while current is not None and current not in hops and len(path) <= len(nodes):
+                path.append(current)
+                route = by_id[current].network.routing_table.get(dest_id) if current in by_id else None
+                current = route[0] if route else None
+            # Nodes without a route, or caught in a loop, are marked unreachable so later walks stop at them.
+            end = hops.get(current)
+            for distance, node_id in enumerate(reversed(path), start=1):
+                hops[node_id] = None if end is None else end + distance
+            if end is not None and path:
+                longest = max(longest, end + len(path))
+    return longest
+
+def set_packet_ttl(ttl):
+
+    satellite_node.PACKET_TTL = ttl
+    ground_station.PACKET_TTL = ttl
+
+def drain(nodes):
+
+    # Relays coalesce forwarded chunks, so keep flushing until no batch is left anywhere.
+    while True:
+        pending = [node for node in nodes if node.router.has_pending()]
+        if not pending:
+            return
+        for node in pending:
+            node.router.flush()
+
+def write_test_image(path, size, rng):
+
+    Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3)).save(path)
+
+def measure_image_delivery(bus, satellites, stations, num_images, image_size, seed):
+
+    rng = random.Random(seed)
+    station_ids = [station.node_id for station in stations]
+    routed = [(sat, dest) for sat in satellites for dest in station_ids if dest in sat.network.routing_table]
+    if not routed:
+        return None
+
+    before = sum(station.router.images_received for station in stations)
+    bus.reset_counters()
+    sent_bytes = 0
+    start = time.monotonic()
+    for satellite, dest_id in rng.sample(routed, min(num_images, len(routed))):
+        image_path = satellite.capture_image()
+        write_test_image(image_path, image_size, rng)
+        sent_bytes += os.path.getsize(image_path)
+        satellite.transmit_image(dest_id, image_path)
+    drain(satellites + stations)
+    elapsed = time.monotonic() - start
+    delivered = sum(station.router.images_received for station in stations) - before
+    return {
+        "attempted": min(num_images, len(routed)),
+        "delivered": delivered,
+        "seconds": elapsed,
+        "image_bytes": sent_bytes,
+        "goodput_bps": sent_bytes / elapsed if elapsed > 0 else 0.0,
+        "hop_packets": bus.data_packets,
+        "hop_bytes": bus.data_bytes,
+        "dropped_packets": bus.dropped_packets,
+    }
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Run many satellites and ground stations in one process over an in-memory bus.")
+    parser.add_argument("--satellites", type=int, default=None,
+                        help=f"Satellite count (default {DEFAULT_SATELLITES['distance_vector']} for distance_vector, "
+                             f"{DEFAULT_SATELLITES['link_state']} for link_state)")
+    parser.add_argument("--stations", type=int, default=2)
+    parser.add_argument("--degree", type=float, default=8.0, help="Target average neighbor count")
+    parser.add_argument("--rounds", type=int, default=20, help="Maximum discovery rounds")
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--image-size", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--routing", choices=["distance_vector", "link_state"], default=network_manager.ROUTING_MODE)
+    args = parser.parse_args()
+    network_manager.ROUTING_MODE = args.routing
+    if args.satellites is None:
+        args.satellites = DEFAULT_SATELLITES[args.routing]
+
+    # Every node keeps its outbox, bundles, spools and images under the working directory, so a run happens in a
+    # temporary one and leaves nothing behind in the checkout.
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            run(args)
+
+        finally:
+            os.chdir(cwd)
+
+def run(args):
+
+    bus = SimulationBus()
+    start = time.monotonic()
+    satellites, stations, side = build_constellation(bus, args.satellites, args.stations, args.degree, args.seed)
+    print(f"Built {len(satellites)} satellites and {len(stations)} ground stations over a {side:.0f}x{side:.0f} area "
+          f"in {time.monotonic() - start:.2f}s")
+
+    nodes = satellites + stations
+    rounds, elapsed, messages, by_path = measure_convergence(bus, nodes, args.rounds)
+    degrees = [len(node.network.neighbors) for node in nodes]
+    covered = sum(1 for sat in satellites if any(station.node_id in sat.network.routing_table for station in stations))
+    print(f"{args.routing} routing converged after {rounds} rounds in {elapsed:.2f}s with {messages} control messages")
+    print(f"  messages by endpoint: {by_path}")
+    print(f"  mean degree {sum(degrees) / len(degrees):.1f}; {covered}/{len(satellites)} satellites have a route to a ground station")
+    # Large constellations have routes longer than the default TTL, so packets are given enough hops for the longest one.
+    diameter = route_diameter(nodes)
+    set_packet_ttl(max(PACKET_TTL, diameter))
+    print(f"  longest route {diameter} hops; packet TTL {max(PACKET_TTL, diameter)}")
+
+    delivery = measure_image_delivery(bus, satellites, stations, args.images, args.image_size, args.seed)
+    if delivery is None:
+        print("No satellite has a route to a ground station; skipping image delivery.")
+        return
+    print(f"Delivered {delivery['delivered']}/{delivery['attempted']} images in {delivery['seconds']:.2f}s "
+          f"({delivery['goodput_bps'] / 1e6:.2f} MB/s of image data, {delivery['hop_packets']} hop packets, "
+          f"{delivery['hop_bytes']} hop bytes, {delivery['dropped_packets']} dropped)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import time
+
+from network.packet import Packet
+from network.batcher import PacketCoalescer, encode_frame, decode_frame
+
+def make_packets(count, size=32):
+
+    return [Packet(1, 2, 1, 1001, i, bytes([i % 256]) * size) for i in range(count)]
+
+def test_frame_round_trip():
+
+    packets = make_packets(10)
+    decoded = decode_frame(encode_frame(packets))
+    assert [p.sequence_number for p in decoded] == list(range(10))
+    assert bytes(decoded[3].payload) == packets[3].payload
+    print("Test passed: Frame carries all packets in one body.")
+
+def test_frame_rejects_bad_magic():
+
+    data = bytearray(encode_frame(make_packets(2)))
+    data[0:4] = b"XXXX"
+    try:
+        decode_frame(bytes(data))
+    except ValueError:
+        print("Test passed: Frame with bad magic is rejected.")
+        return
+    assert False, "Frame with bad magic was accepted!"
+
+def test_coalescer_flushes_on_size():
+
+    flushed = []
+
+    def flush(neighbor_id, packets):
+
+        flushed.append((neighbor_id, len(packets)))
+        return len(flushed) != 2
+
+    coalescer = PacketCoalescer(flush, max_packets=4, max_bytes=1 << 20, max_age=60)
+    deliveries = [coalescer.add(2, packet) for packet in make_packets(9)]
+    assert flushed == [(2, 4), (2, 4)] and not deliveries[8].done()
+    coalescer.stop()
+    assert flushed == [(2, 4), (2, 4), (2, 1)]
+    # Each packet's future carries its own batch's result.
+    assert [delivery.result() for delivery in deliveries] == [True] * 4 + [False] * 4 + [True]
+    print("Test passed: Coalescer flushes full batches and the remainder on stop.")
+
+def test_coalescer_flushes_on_age():
+
+    flushed = []
+    coalescer = PacketCoalescer(lambda neighbor_id, packets: flushed.append((neighbor_id, len(packets))), max_packets=100, max_bytes=1 << 20, max_age=0.05)
+    for packet in make_packets(3):
+        coalescer.add(5, packet)
+    time.sleep(0.2)
+    assert flushed == [(5, 3)]
+    coalescer.stop()
+    print("Test passed: Coalescer flushes aged batches.")
+
+def test_age_flush_survives_failed_send():
+
+    flushed = []
+
+    def flush(neighbor_id, packets):
+
+        if not flushed:
+            flushed.append(None)
+            raise ConnectionError("link down")
+        flushed.append((neighbor_id, len(packets)))
+
+    coalescer = PacketCoalescer(flush, max_packets=100, max_bytes=1 << 20, max_age=0.05)
+    first = coalescer.add(5, make_packets(1)[0])
+    time.sleep(0.2)
+    assert first.done() and not first.result()
+    # The age flush thread is still running after the failure and sends the next partial batch on its own.
+    for packet in make_packets(2):
+        coalescer.add(5, packet)
+    time.sleep(0.2)
+    assert flushed == [None, (5, 2)]
+    coalescer.stop()
+    print("Test passed: A failed send does not stop aged batches from being flushed.")
+
+if __name__ == "__main__":
+    test_frame_round_trip()
+    test_frame_rejects_bad_magic()
+    test_coalescer_flushes_on_size()
+    test_coalescer_flushes_on_age()
+    test_age_flush_survives_failed_send()
@@ -0,0 +1,203 @@
+import os
+import tempfile
+import threading
+import time
+import pytest
+
+from utils.logging_utils import set_file_logging
+from network.bundle_queue import BundleQueue, SEGMENT_SUFFIX
+from network.packet import Packet
+import app.satellite_node as satellite_node
+
+set_file_logging(False)
+
+def text_packet(sequence_number, dest_id=9):
+
+    return Packet(1, 1, 5, dest_id, sequence_number, f"message {sequence_number}".encode() * 10)
+
+def settle(nodes):
+
+    # Outbound packets go through each node's scheduler and batcher; flush until nothing is left in flight.
+    while any(node.router.has_pending() for node in nodes):
+        for node in nodes:
+            node.router.flush()
+
+def segment_files(directory):
+
+    return [name for _, _, names in os.walk(directory) for name in names if name.endswith(SEGMENT_SUFFIX)]
+
+def test_queue_survives_restart_and_keeps_order():
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue = BundleQueue(5, base_dir=directory, segment_bytes=1024)
+        for sequence_number in range(50):
+            assert queue.hold(text_packet(sequence_number))
+        assert queue.pending() == {9: 50} and len(segment_files(directory)) > 1
+
+        sent = []
+
+        def send_until(limit):
+
+            def send(packet):
+
+                if len(sent) >= limit:
+                    return False
+                sent.append(packet.sequence_number)
+                return True
+            return send
+
+        assert queue.drain(9, send_until(20)) == 20
+        queue.close()
+        # A record cut short by a crash is dropped when the queue is reopened.
+        last_segment = sorted(segment_files(directory))[-1]
+        with open(os.path.join(directory, "Node_5", "dest_9", last_segment), "ab") as segment_file:
+            segment_file.write(b"\x00\x00\x01")
+
+        queue = BundleQueue(5, base_dir=directory, segment_bytes=1024)
+        assert queue.pending(9) == 30
+        assert queue.drain(9, send_until(50)) == 30
+        assert sent == list(range(50)) and queue.pending() == {} and segment_files(directory) == []
+        stats = queue.stats()
+        assert stats["queued_packets"] == 0 and stats["drained"] == 30 and stats["last_drain_rate"] > 0
+        queue.close()
+
+        expiring = BundleQueue(6, base_dir=directory, lifetime=0)
+        expiring.hold(text_packet(1))
+        time.sleep(0.01)
+        assert expiring.drain(9, send_until(100)) == 0 and expiring.stats()["expired"] == 1
+        expiring.close()
+    print("Test passed: Held packets survive a restart and drain in order.")
+
+def test_emptied_log_is_closed_and_reopened():
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue = BundleQueue(5, base_dir=directory)
+        assert queue.hold(text_packet(0))
+        log = queue.logs[9]
+        assert queue.drain(9, lambda packet: True) == 1
+        # Drained to empty: the destination no longer keeps its index file and mmap open.
+        assert 9 not in queue.logs and log.index.closed and log.index_file.closed
+        assert queue.hold(text_packet(1)) and queue.pending(9) == 1
+        queue.close()
+
+        # Only destinations with packets still queued are opened on restart.
+        queue = BundleQueue(5, base_dir=directory)
+        assert list(queue.logs) == [9]
+        sent = []
+        assert queue.drain(9, lambda packet: sent.append(packet.sequence_number) or True) == 1
+        assert sent == [1] and queue.logs == {}
+        queue.close()
+    print("Test passed: An emptied destination log is closed and reopened when a packet is held for it again.")
+
+def test_concurrent_holds_respect_max_bytes():
+
+    with tempfile.TemporaryDirectory() as directory:
+        size = len(text_packet(0).to_bytes())
+        queue = BundleQueue(5, base_dir=directory, max_bytes=10 * size)
+        start = threading.Barrier(8)
+
+        def hold_many(dest_id):
+
+            start.wait()
+            for sequence_number in range(10):
+                queue.hold(text_packet(sequence_number, dest_id))
+
+        threads = [threading.Thread(target=hold_many, args=(dest_id,)) for dest_id in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = queue.stats()
+        assert stats["queued_bytes"] == 10 * size and stats["held"] == 10 and stats["dropped"] == 70
+        queue.close()
+    print("Test passed: Concurrent holds never push the queue past its byte limit.")
+
+def test_relay_holds_packet_until_link_returns(bus, chain):
+
+    satellites, station = chain
+    relay = satellites[2]
+    # Held packets persist on disk, so discard any an earlier interrupted run left for the station.
+    relay.router.bundles.drain(1001, lambda packet: True)
+    received = []
+    receive_packet = station.router.receive_packet
+
+    def record(packet, *args, **kwargs):
+
+        received.append((packet.source_id, packet.message_type))
+        return receive_packet(packet, *args, **kwargs)
+
+    station.router.receive_packet = record
+    station.state = "FAILED"
+    packet = satellites[0].create_packet(dest_id=1001, payload=b"held across an outage", message_type=1)
+    assert satellites[0].router.forward_packet(packet).result(5)
+    settle(satellites)
+    assert relay.router.bundles.pending(1001) == 1 and received == []
+
+    # The relay's heartbeat monitor drops the station; when it is heard again the held packet goes out.
+    relay.network.remove_neighbor(1001)
+    station.state = "ACTIVE"
+    station.network.broadcast_position()
+    bus.run_until_idle()
+    # The drain thread updates its counters after the send has been handed to the scheduler, so wait for both.
+    deadline = time.monotonic() + 5
+    while (not received or relay.router.bundles.stats()["drained"] < 1) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert received == [(1, 1)] and relay.router.bundles.pending(1001) == 0
+    assert relay.router.bundles.stats()["drained"] == 1
+    print("Test passed: A relay held a packet through a link outage and sent it once the link returned.")
+
+def test_failed_drain_keeps_held_packets_in_order(chain):
+
+    satellites, station = chain
+    relay = satellites[2]
+    relay.router.bundles.drain(1001, lambda packet: True)
+    received = []
+    station.router.receive_packet = lambda packet, *args, **kwargs: received.append(packet.sequence_number) or True
+    for sequence_number in range(3):
+        relay.router.hold_packet(Packet(1, 2, 1, 1001, sequence_number, sequence_number.to_bytes(4, "big") * 8))
+
+    # The station is down: the first send fails and the drain stops with it still at the head of the queue.
+    station.state = "FAILED"
+    assert relay.router.drain_bundles() == 0
+    assert relay.router.bundles.pending(1001) == 3 and relay.router.bundles.stats()["held"] == 3
+
+    station.state = "ACTIVE"
+    assert relay.router.drain_bundles() == 3
+    assert received == [0, 1, 2] and relay.router.bundles.pending(1001) == 0
+    print("Test passed: A failed drain leaves held packets queued in their original order.")
+
+def test_flood_encrypts_each_copy_once(chain):
+
+    satellites, station = chain
+    payloads = []
+    for node in (satellites[0], satellites[2]):
+        receive_packet = node.router.receive_packet
+
+        def record(packet, sender_id, receive_packet=receive_packet, node=node):
+
+            payloads.append(node.encryption_manager.decrypt(packet.payload, node.shared_symmetric_keys[sender_id]))
+            return receive_packet(packet, sender_id)
+
+        node.router.receive_packet = record
+    packet = satellites[1].create_packet(dest_id=2, payload=b"flooded", message_type=1)
+    assert satellites[1].router.flood_packet(packet).result(5)
+    settle(satellites)
+    assert packet.payload == b"flooded" and payloads == [b"flooded", b"flooded"]
+    print("Test passed: Every flooded copy decrypts to the original payload.")
+
+def test_send_endpoint_holds_message_without_route(chain):
+
+    satellites, station = chain
+    sender = satellites[0]
+    sender.router.bundles.drain(7, lambda packet: True)
+    satellite_node.satellite = sender
+    # No node 7 exists, so the text message is held for it instead of being flooded.
+    response = satellite_node.app.test_client().post("/send", json={"dest_id": 7, "payload": "hello"})
+    assert response.status_code == 200 and sender.router.bundles.pending(7) == 1
+    held = []
+    sender.router.bundles.drain(7, lambda packet: held.append(packet.payload) or True)
+    assert held == [b"hello"]
+    print("Test passed: A /send message with no route is held as bytes.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,79 @@
+import threading
+import time
+import pytest
+
+from utils.logging_utils import set_file_logging
+from app.capture_pipeline import CapturePipeline
+import app.satellite_node as satellite_node
+
+set_file_logging(False)
+
+def wait_until(condition, timeout=10):
+
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_capture_status_endpoints(chain):
+
+    satellites, station = chain
+    satellite_node.satellite = satellites[0]
+    client = satellite_node.app.test_client()
+
+    response = client.post("/capture_image", json={"dest_id": 1001})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    assert wait_until(lambda: satellites[0].capture_pipeline.get(job_id).done.is_set())
+
+    job = client.get(f"/capture_status?job_id={job_id}").get_json()["job"]
+    assert job["state"] == "done" and job["transfer"]["complete"]
+    assert job["latency"]["total"] >= job["latency"]["transmit"] > 0
+    assert station.router.images_received == 1
+    pipeline = client.get("/capture_status").get_json()["pipeline"]
+    assert pipeline["jobs"] == {"done": 1} and pipeline["capture_queue_depth"] == 0
+    assert client.get("/capture_status?job_id=999").status_code == 404
+    print(f"Test passed: Capture job {job_id} finished in {job['latency']['total']:.3f}s.")
+
+def test_full_queues_refuse_new_captures(chain):
+
+    satellites, station = chain
+    sender = satellites[0]
+    release = threading.Event()
+    transmitted = []
+
+    def slow_downlink(dest_id, image_path, options):
+
+        release.wait()
+        transmitted.append(image_path)
+        return True, None
+
+    sender.transmit_captured = slow_downlink
+    pipeline = CapturePipeline(sender, capture_queue_size=1, transmit_queue_size=1)
+    jobs = [pipeline.submit(1001)]
+    # One job transmitting, one waiting to transmit, one captured but blocked, one waiting to be captured.
+    for state in ("transmitting", "captured", "captured", "queued"):
+        assert wait_until(lambda: jobs[-1].state == state)
+        jobs.append(pipeline.submit(1001))
+    assert jobs[-1] is None and pipeline.stats()["rejected"] == 1
+
+    release.set()
+    assert wait_until(lambda: all(job.done.is_set() for job in jobs[:-1]))
+    assert len(transmitted) == 4 and pipeline.stats()["jobs"] == {"done": 4}
+    print("Test passed: A stalled downlink fills both queues and new captures are refused.")
+
+def test_back_to_back_captures_keep_distinct_files(chain):
+
+    satellites, station = chain
+    pipeline = CapturePipeline(satellites[0])
+    jobs = [pipeline.submit(1001) for _ in range(4)]
+    assert wait_until(lambda: all(job.done.is_set() for job in jobs))
+    paths = [job.image_path for job in jobs]
+    assert len(set(paths)) == 4
+    assert all(job.state == "done" for job in jobs) and station.router.images_received == 4
+    # Each job keeps the stats of its own transfer rather than whatever the node sent last.
+    assert len({job.transfer["transfer_id"] for job in jobs}) == 4 and all(job.transfer["complete"] for job in jobs)
+    print("Test passed: Four captures submitted within one second are stored and sent as four images.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,90 @@
+import io
+import os
+import zlib
+
+import pytest
+from PIL import Image
+
+from utils.compression_utils import iter_compressed_chunks, available_codecs, select_codec, get_codec
+
+def test_streamed_chunks_decompress_to_input():
+
+    data = os.urandom(50000) + bytes(200000)
+    chunks = list(iter_compressed_chunks(io.BytesIO(data), chunk_size=512, read_size=4096))
+    assert [number for number, _, _ in chunks] == list(range(1, len(chunks) + 1))
+    assert [is_last for _, is_last, _ in chunks] == [False] * (len(chunks) - 1) + [True]
+    assert all(len(chunk) == 512 for _, _, chunk in chunks[:-1])
+    assert zlib.decompress(b"".join(chunk for _, _, chunk in chunks)) == data
+    print(f"Test passed: {len(data)} bytes streamed as {len(chunks)} chunks.")
+
+def test_first_chunk_available_before_eof():
+
+    class CountingReader(io.BytesIO):
+        reads = 0
+
+        def read(self, size=-1):
+            CountingReader.reads += 1
+            return super().read(size)
+
+    reader = CountingReader(os.urandom(1 << 20))
+    next(iter_compressed_chunks(reader, chunk_size=512, read_size=4096))
+    assert CountingReader.reads < 16, f"First chunk needed {CountingReader.reads} of 256 reads"
+    print(f"Test passed: First chunk produced after {CountingReader.reads} reads of a 1 MiB input.")
+
+def test_empty_input():
+
+    chunks = list(iter_compressed_chunks(io.BytesIO(b""), chunk_size=512, read_size=4096))
+    assert len(chunks) == 1 and chunks[0][1]
+    assert zlib.decompress(chunks[0][2]) == b""
+    print("Test passed: Empty input yields a single final chunk.")
+
+def test_every_codec_round_trips():
+
+    data = os.urandom(20000) + bytes(80000)
+    for codec in available_codecs() + [get_codec("none")]:
+        chunks = [chunk for _, _, chunk in iter_compressed_chunks(io.BytesIO(data), chunk_size=1024, read_size=4096, codec=codec)]
+        # Trailing padding after the end of the stream, as a rebuilt FEC chunk could carry, must be ignored.
+        padded = chunks + ([bytes(64)] if codec.name != "none" else [])
+        assert b"".join(codec.iter_decompressed(padded, max_length=4096)) == data, codec.name
+    print(f"Test passed: {', '.join(codec.name for codec in available_codecs())} and none round-trip in chunks.")
+
+def check_bounded_decompression(name):
+
+    # A highly compressible stream must come back in pieces no larger than max_length, and a cut-off one must fail.
+    codec = get_codec(name)
+    data = bytes(4 << 20) + os.urandom(1000)
+    compressed = codec.compress(data)
+    blocks = [compressed[offset:offset + 512] for offset in range(0, len(compressed), 512)]
+    pieces = list(codec.iter_decompressed(blocks + [bytes(64)], max_length=65536))
+    assert b"".join(pieces) == data and max(len(piece) for piece in pieces) <= 65536
+    with pytest.raises(ValueError):
+        b"".join(codec.iter_decompressed([compressed[:-8]], max_length=65536))
+    print(f"Test passed: {name} decompressed {len(data)} bytes in {len(pieces)} pieces of at most 64 KiB.")
+
+def test_zstd_output_is_bounded():
+
+    pytest.importorskip("zstandard")
+    check_bounded_decompression("zstd-3")
+
+def test_lz4_output_is_bounded():
+
+    pytest.importorskip("lz4.frame")
+    check_bounded_decompression("lz4")
+
+def test_selection_skips_png_and_compresses_raw_frames():
+
+    png = io.BytesIO()
+    Image.frombytes("RGB", (128, 128), os.urandom(128 * 128 * 3)).save(png, format="PNG")
+    assert select_codec(png.getvalue()).name == "none"
+    raw_frame = bytes(range(256)) * 256
+    assert select_codec(raw_frame).name != "none"
+    print(f"Test passed: PNG is sent as-is and a raw frame uses {select_codec(raw_frame).name}.")
+
+if __name__ == "__main__":
+    test_streamed_chunks_decompress_to_input()
+    test_first_chunk_available_before_eof()
+    test_empty_input()
+    test_every_codec_round_trips()
+    test_zstd_output_is_bounded()
+    test_lz4_output_is_bounded()
+    test_selection_skips_png_and_compresses_raw_frames()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import pytest
+
+from utils.logging_utils import set_file_logging
+from network.chunk_store import ChunkStore, chunk_digest
+from network.packet import ChunkQuery
+
+set_file_logging(False)
+
+def test_chunk_store_evicts_least_recently_used():
+
+    chunks = [os.urandom(100) for _ in range(3)]
+    query = ChunkQuery.unpack(ChunkQuery(5, 1, [chunk_digest(chunk) for chunk in chunks]).pack())
+    assert query.transfer_id == 5 and query.hashes == [chunk_digest(chunk) for chunk in chunks]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ChunkStore(1001, base_dir=directory, max_bytes=250)
+        store.put(query.hashes[0], chunks[0])
+        store.put(query.hashes[1], chunks[1])
+        assert store.get(query.hashes[0]) == chunks[0]
+        store.put(query.hashes[2], chunks[2])
+        assert not store.has(query.hashes[1]) and store.has(query.hashes[0])
+        assert ChunkStore(1001, base_dir=directory).stats()["stored_bytes"] == 200
+    print("Test passed: Chunk store keeps recently used chunks within its byte budget.")
+
+def test_repeated_image_sends_only_references(chain, write_image):
+
+    satellites, station = chain
+    sender = satellites[0]
+    image_path = write_image(sender, 256)
+    with tempfile.TemporaryDirectory() as directory:
+        station.chunk_store = ChunkStore(1001, base_dir=directory)
+
+        assert sender.transmit_image(1001, image_path, dedup=True)
+        first = sender.last_transfer_stats
+        assert sender.transmit_image(1001, image_path, dedup=True)
+        second = sender.last_transfer_stats
+
+        assert station.router.images_received == 2
+        assert first["deduplicated_chunks"] == 0
+        assert second["deduplicated_chunks"] == second["total_chunks"]
+        assert second["bytes_avoided"] > 0 and second["bytes"] < first["bytes"] / 10
+        assert station.chunk_store.stats()["bytes_avoided"] == second["bytes_avoided"]
+    print(f"Test passed: Resending an image took {second['bytes']} bytes instead of {first['bytes']}.")
+
+def test_evicted_reference_is_resent_in_full(bus, chain, write_image):
+
+    satellites, station = chain
+    sender = satellites[0]
+    image_path = write_image(sender, 256)
+    with tempfile.TemporaryDirectory() as directory:
+        station.chunk_store = ChunkStore(1001, base_dir=directory)
+        assert sender.transmit_image(1001, image_path, dedup=True)
+
+        def evict_after_query(sender_id, neighbor_id, packet):
+
+            # Empty the store after the query reply, so the references that follow all miss.
+            if sender_id == 1 and packet.message_type == 2 and station.chunk_store.index:
+                with station.chunk_store.lock:
+                    while station.chunk_store.index:
+                        station.chunk_store._evict()
+            return False
+
+        bus.loss_filter = evict_after_query
+        assert sender.transmit_image(1001, image_path, dedup=True)
+        stats = sender.last_transfer_stats
+        assert station.router.images_received == 2
+        assert stats["retransmitted_chunks"] == stats["deduplicated_chunks"] == stats["total_chunks"]
+    print("Test passed: References to evicted chunks are resent in full.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,65 @@
+import pytest
+import numpy as np
+from PIL import Image
+
+from utils.logging_utils import set_file_logging
+from utils.delta_utils import DeltaEncoder, FrameReferences, KEY_FRAME, DELTA_FRAME
+
+set_file_logging(False)
+
+def star_frames(count, size=128, seed=3):
+
+    # A fixed star field with sensor noise in a small patch, so successive frames differ only slightly.
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 40, (size, size, 3), dtype=np.uint8)
+    base[rng.integers(0, size, 50), rng.integers(0, size, 50)] = 250
+    frames = []
+    for _ in range(count):
+        frame = base.copy()
+        frame[:8, :8] = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+        frames.append(frame)
+    return frames
+
+def test_residuals_round_trip_with_key_frame_interval():
+
+    encoder = DeltaEncoder(key_frame_interval=2)
+    references = FrameReferences()
+    frame_types = []
+    for frame_id, frame in enumerate(star_frames(5), start=1):
+        frame_type, payload = encoder.encode(1001, frame_id, frame, "RGB")
+        _, _, pixels = references.decode(7, payload)
+        assert np.array_equal(pixels, frame)
+        encoder.acknowledge(1001, frame_id)
+        frame_types.append(frame_type)
+    assert frame_types == [KEY_FRAME, DELTA_FRAME, DELTA_FRAME, KEY_FRAME, DELTA_FRAME]
+
+    _, payload = encoder.encode(1001, 6, star_frames(1, seed=9)[0], "RGB")
+    _, _, pixels = FrameReferences().decode(7, payload)
+    assert pixels is None
+    print("Test passed: Delta frames reconstruct exactly and key frames recur at the interval.")
+
+def test_sender_falls_back_to_key_frame(chain):
+
+    satellites, station = chain
+    sender = satellites[0]
+    frames = star_frames(3, size=256)
+    image_path = sender.capture_image()
+
+    frame_bytes = []
+    for index, frame in enumerate(frames):
+        Image.fromarray(frame, "RGB").save(image_path)
+        if index == 2:
+            # A restarted ground station has lost its reference frames.
+            station.frame_references = FrameReferences()
+        assert sender.transmit_image(1001, image_path, delta=True)
+        frame_bytes.append(sender.last_transfer_stats["bytes"])
+        _, received = next(reversed(station.frame_references.frames[1].values()))
+        assert np.array_equal(received, frame)
+
+    assert station.router.images_received == 3
+    assert sender.last_transfer_stats["frame"] == "key"
+    assert frame_bytes[1] < frame_bytes[0] / 4
+    print(f"Test passed: Delta frame sent in {frame_bytes[1]} bytes against a {frame_bytes[0]} byte key frame; missing reference resent as a key frame.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
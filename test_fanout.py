@@ -0,0 +1,56 @@
+import logging
+import threading
+import time
+from flask import Flask, jsonify
+from werkzeug.serving import make_server
+
+from network.fanout import FanOut
+
+PORT = 8950
+SLOW_PEER = 3
+SLOW_DELAY = 1.5
+
+def start_server():
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app = Flask(__name__)
+
+    @app.route('/peer/<int:peer_id>/heartbeat', methods=['POST'])
+    def heartbeat(peer_id):
+        if peer_id == SLOW_PEER:
+            time.sleep(SLOW_DELAY)
+        return jsonify({"status": "success"}), 200
+
+    server = make_server("127.0.0.1", PORT, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_fanout_collects_results_concurrently():
+
+    server = start_server()
+    try:
+        fanout = FanOut(lambda peer_id: f"http://127.0.0.1:{PORT}/peer/{peer_id}", timeout=1)
+        peers = list(range(1, 9))
+        start = time.monotonic()
+        results = fanout.post_all(peers, "/heartbeat", {"node_id": 99})
+        elapsed = time.monotonic() - start
+
+        assert set(results) == set(peers)
+        assert all(FanOut.succeeded(results[peer]) for peer in peers if peer != SLOW_PEER)
+        assert isinstance(results[SLOW_PEER], Exception)
+        assert elapsed < SLOW_DELAY, f"Fan-out round took {elapsed:.2f}s"
+        print(f"Test passed: {len(peers)} peers answered in {elapsed:.2f}s with one slow peer timed out.")
+    finally:
+        server.shutdown()
+
+def test_fanout_unreachable_peer():
+
+    fanout = FanOut(lambda peer_id: f"http://127.0.0.1:{PORT + 1}/peer/{peer_id}", timeout=1)
+    results = fanout.post_all([1], "/heartbeat", {"node_id": 99})
+    assert isinstance(results[1], Exception)
+    assert not FanOut.succeeded(results[1])
+    print("Test passed: Unreachable peer reported as failed.")
+
+if __name__ == "__main__":
+    test_fanout_collects_results_concurrently()
+    test_fanout_unreachable_peer()
@@ -0,0 +1,57 @@
+import os
+import random
+import pytest
+from PIL import Image
+
+from utils.logging_utils import set_file_logging
+from network.fec import encode_parity, recover_chunks, FecEncoder
+
+set_file_logging(False)
+
+def test_rebuild_up_to_parity_count():
+
+    rng = random.Random(5)
+    for parity_count in (1, 3):
+        data = [os.urandom(512) for _ in range(15)] + [os.urandom(100)]
+        parity = dict(enumerate(encode_parity(data, parity_count)))
+        lost = rng.sample(range(len(data)), parity_count)
+        present = {index: chunk for index, chunk in enumerate(data) if index not in lost}
+        rebuilt = recover_chunks(len(data), parity_count, present, parity)
+        assert sorted(rebuilt) == sorted(lost)
+        for index in lost:
+            assert rebuilt[index][:len(data[index])] == data[index]
+    print("Test passed: XOR and Reed-Solomon parity rebuild as many chunks as they carry.")
+
+def test_encoder_groups():
+
+    encoder = FecEncoder(2, group_size=4)
+    emitted = [encoder.add(number, number == 10, bytes([number]) * 8) for number in range(1, 11)]
+    assert [len(parity) for parity in emitted] == [0, 0, 0, 2, 0, 0, 0, 2, 0, 2]
+    assert [(start, size, last_length) for start, size, _, last_length, _ in emitted[-1]] == [(9, 2, 8), (9, 2, 8)]
+    print("Test passed: Encoder emits parity per full group and for the final partial group.")
+
+def test_lossy_transfer_without_round_trips(bus, chain):
+
+    satellites, station = chain
+    rng = random.Random(8)
+    sent = set()
+
+    def lose_one_per_group(sender_id, neighbor_id, packet):
+
+        # Drop a single first-hop data chunk in each group of 16, which one parity chunk per group can rebuild.
+        if sender_id != 1 or packet.message_type != 2 or packet.sequence_number in sent:
+            return False
+        sent.add(packet.sequence_number)
+        return len(sent) % 17 == 5
+
+    bus.loss_filter = lose_one_per_group
+    image_path = satellites[0].capture_image()
+    Image.frombytes("RGB", (256, 256), rng.randbytes(256 * 256 * 3)).save(image_path)
+    assert satellites[0].transmit_image(1001, image_path, fec_parity=1)
+    stats = satellites[0].last_transfer_stats
+    assert bus.lost_packets > 0 and stats["retransmitted_chunks"] == 0
+    assert station.router.images_received == 1
+    print(f"Test passed: {bus.lost_packets} lost chunks rebuilt from {stats['parity_chunks']} parity chunks without retransmission.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
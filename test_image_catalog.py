@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+import pytest
+from PIL import Image
+
+from utils.logging_utils import set_file_logging
+from app.image_catalog import ImageCatalog, file_checksum
+import app.ground_station as ground_station
+
+set_file_logging(False)
+
+def write_image(path, shade):
+
+    Image.new("L", (8, 8), shade).save(path)
+    return path
+
+def test_catalog_filters_and_pages():
+
+    with tempfile.TemporaryDirectory() as directory:
+        # An image already on disk is picked up when the catalog is first created; previews are not.
+        existing = write_image(os.path.join(directory, "image_from_satellite_7_100.png"), 1)
+        write_image(os.path.join(directory, "image_from_satellite_7_100_preview.png"), 2)
+        catalog = ImageCatalog(os.path.join(directory, "catalog.sqlite3"), directory)
+        assert catalog.count() == 1
+
+        for index in range(10):
+            path = write_image(os.path.join(directory, f"image_{index}.png"), index * 20)
+            catalog.add(path, source_id=1 + index % 2, received_at=1000.0 + index)
+
+        pages, cursor = [], None
+        while True:
+            entries, cursor = catalog.list(source_id=1, cursor=cursor, limit=2)
+            pages.append(entries)
+            if cursor is None:
+                break
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert all(entry["source_id"] == 1 for page in pages for entry in page)
+
+        entries, cursor = catalog.list(since=1003.0, until=1006.0)
+        assert [entry["received_at"] for entry in entries] == [1003.0, 1004.0, 1005.0] and cursor is None
+        entries, _ = catalog.list(source_id=7)
+        assert entries[0]["path"] == existing and entries[0]["checksum"] == file_checksum(existing)
+        catalog.close()
+    print("Test passed: Catalog backfills existing images and pages through filtered listings.")
+
+def test_received_images_endpoint(chain):
+
+    satellites, station = chain
+    started = time.time()
+    sender = satellites[0]
+    assert sender.transmit_image(1001, sender.capture_image())
+
+    ground_station.ground_station = station
+    client = ground_station.app.test_client()
+    body = client.get(f"/get_received_images?source_id={sender.node_id}&since={started}").get_json()
+    assert len(body["entries"]) == 1 and body["next_cursor"] is None
+    entry = body["entries"][0]
+    assert body["images"] == [entry["path"]] and entry["size"] == os.path.getsize(entry["path"])
+    assert client.get(f"/get_received_images?source_id={sender.node_id + 1000}").get_json()["images"] == []
+    print(f"Test passed: Ground station lists {entry['path']} from its catalog.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
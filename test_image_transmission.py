@@ -19,7 +19,7 @@ def calculate_file_hash(file_path):
 def test_capture_and_transmit_image():
     
     print("Step 1: Capturing and transmitting image from the satellite...")
-    response = session.post(f"{SATELLITE_BASE_URL}/capture_image")
+    response = session.post(f"{SATELLITE_BASE_URL}/capture_image", json={"wait": True})
     if response.status_code != 200:
         print(f"Failed to capture and transmit image: {response.json()}")
         return
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from utils.logging_utils import set_file_logging, setup_logger
+from app.image_writer import ImageWriter
+
+set_file_logging(False)
+
+def test_burst_gets_unique_names_and_batched_fsync():
+
+    with tempfile.TemporaryDirectory() as directory:
+        writer = ImageWriter(setup_logger("writer_test", "general"), directory, queue_size=32, batch_size=8)
+        started, release = threading.Event(), threading.Event()
+        written = []
+
+        def held_image(data):
+
+            # The first image holds the writer so the rest of the burst queues up behind it.
+            started.set()
+            release.wait()
+            yield data
+
+        paths = [writer.submit(7, held_image(b"first"), key=(7, 0), on_written=written.append)]
+        assert started.wait(5)
+        paths += [writer.submit(7, [f"image {index}".encode()], key=(7, index + 1), on_written=written.append) for index in range(9)]
+        assert len(set(paths)) == 10
+        release.set()
+        assert writer.flush()
+
+        assert sorted(written) == sorted(paths)
+        with open(paths[3], "rb") as image_file:
+            assert image_file.read() == b"image 2"
+        assert not any(name.endswith(".partial") for name in os.listdir(directory))
+        stats = writer.stats()
+        assert stats["written"] == 10 and stats["queue_depth"] == 0 and stats["max_queue_depth"] == 9
+        assert stats["batches"] == 3 and stats["mean_write_latency"] > 0
+    print(f"Test passed: Ten images from one satellite in one second written in {stats['batches']} batches under unique names.")
+
+def test_failed_write_leaves_no_image():
+
+    with tempfile.TemporaryDirectory() as directory:
+        writer = ImageWriter(setup_logger("writer_test", "general"), directory)
+        done = []
+
+        def broken_image():
+
+            yield b"partial data"
+            raise ValueError("corrupt stream")
+
+        path = writer.submit(3, broken_image(), key=(3, 1), on_written=done.append, on_failed=lambda error: done.append(str(error)),
+                             on_done=lambda: done.append("discarded"))
+        # The sender must not be told the transfer is complete.
+        assert not writer.wait((3, 1))
+        assert done == ["corrupt stream", "discarded"] and not os.path.exists(path) and os.listdir(directory) == []
+        assert writer.stats()["failed"] == 1
+    print("Test passed: A failed image write is discarded without leaving a file behind.")
+
+def test_failed_rename_keeps_writer_running():
+
+    with tempfile.TemporaryDirectory() as directory:
+        writer = ImageWriter(setup_logger("writer_test", "general"), directory)
+        done = []
+        replace = os.replace
+
+        def failing_replace(source, target):
+
+            with open(source, "rb") as image_file:
+                if image_file.read() == b"first":
+                    raise OSError("read-only file system")
+            return replace(source, target)
+
+        with mock.patch("app.image_writer.os.replace", failing_replace):
+            writer.submit(3, [b"first"], key=(3, 1), on_done=lambda: done.append("first"))
+            assert not writer.wait((3, 1))
+        # The writer thread survived the failed rename and still writes the next image.
+        path = writer.submit(3, [b"second"], key=(3, 2), on_done=lambda: done.append("second"))
+        assert writer.wait((3, 2)) and os.path.exists(path)
+        assert done == ["first", "second"] and writer.stats()["failed"] == 1
+        assert not any(name.endswith(".partial") for name in os.listdir(directory))
+    print("Test passed: A failed rename fails only its own image and the writer keeps running.")
+
+def test_when_done_notifies_without_blocking():
+
+    with tempfile.TemporaryDirectory() as directory:
+        writer = ImageWriter(setup_logger("writer_test", "general"), directory)
+        release = threading.Event()
+        notified = []
+
+        def slow_image():
+
+            release.wait()
+            yield b"slow"
+
+        writer.submit(5, slow_image(), key=(5, 1))
+        # The callback is only registered; the caller returns while the image is still being written.
+        assert writer.when_done((5, 1), notified.append) and notified == []
+        assert not writer.when_done((5, 2), notified.append)
+        release.set()
+        assert writer.flush() and notified == [True]
+    print("Test passed: A status reply waits on the writer's callback instead of blocking its caller.")
+
+if __name__ == "__main__":
+    test_burst_gets_unique_names_and_batched_fsync()
+    test_failed_write_leaves_no_image()
+    test_failed_rename_keeps_writer_running()
+    test_when_done_notifies_without_blocking()
@@ -8,7 +8,7 @@ BASE_URL = "http://10.35.70.23:5002"
 def test_capture_image():
     
     print("Testing image capture...")
-    response = session.post(f"{BASE_URL}/capture_image")
+    response = session.post(f"{BASE_URL}/capture_image", json={"wait": True})
     if response.status_code == 200:
         print("Image captured successfully:", response.json())
         return response.json().get("image_path")
@@ -9,6 +9,16 @@ def test_key_exchange_and_encrypted_communication():
     
     node_1 = SatelliteNode(node_id=1, position=(0, 0, 0))
     node_2 = SatelliteNode(node_id=2, position=(10, 0, 0))    
+    try:
+        exchange_keys_and_communicate(node_1, node_2)
+
+    finally:
+        # The nodes' stream servers would otherwise keep their ports bound for later tests.
+        node_1.router.stop()
+        node_2.router.stop()
+
+def exchange_keys_and_communicate(node_1, node_2):
+
     public_key_1 = node_1.encryption_manager.get_public_key()
     response_1 = session.post(
         f"http://10.35.70.23:{5001}/exchange_key", 
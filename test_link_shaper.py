@@ -0,0 +1,177 @@
+import threading
+import time
+from unittest import mock
+from urllib.parse import urlsplit
+import pytest
+
+from utils.logging_utils import set_file_logging
+from network.link_shaper import LinkShaper, CongestionWindow
+from network.transport import StreamTransport, StreamServer, HttpTransport, stream_port
+from app.config import CWND_INITIAL
+import network.transport as transport
+import app.satellite_node as satellite_node
+
+set_file_logging(False)
+
+def test_token_bucket_paces_to_capacity():
+
+    shaper = LinkShaper({2: 200 * 1024})
+    start = time.monotonic()
+    for _ in range(10):
+        shaper.acquire(2, 16 * 1024)
+        shaper.release(2, 16 * 1024, True)
+    elapsed = time.monotonic() - start
+    # The first 16 KB go out as a burst; the remaining 144 KB take 0.7 s at 200 KB/s.
+    assert 0.6 < elapsed < 1.5
+    stats = shaper.stats()["2"]
+    assert stats["bytes_sent"] == 160 * 1024 and stats["paced_seconds"] > 0.6
+    print(f"Test passed: 160 KB took {elapsed:.2f} s on a 200 KB/s link.")
+
+def test_window_grows_on_acks_and_halves_on_loss():
+
+    window = CongestionWindow(initial=64 * 1024, minimum=16 * 1024, maximum=1024 * 1024, increment=16 * 1024)
+    window.acknowledge(64 * 1024)
+    assert window.size == 128 * 1024
+    window.lose()
+    assert window.size == window.threshold == 64 * 1024
+    # Past the threshold a whole window of acknowledgements adds one MTU.
+    window.acknowledge(64 * 1024)
+    assert window.size == 80 * 1024
+    for _ in range(10):
+        window.lose()
+    assert window.size == 16 * 1024
+
+    shaper = LinkShaper()
+    shaper.acquire(2, 60 * 1024)
+    blocked = threading.Event()
+    released = threading.Event()
+
+    def second_sender():
+
+        blocked.set()
+        shaper.acquire(2, 16 * 1024)
+        released.set()
+
+    threading.Thread(target=second_sender, daemon=True).start()
+    assert blocked.wait(1) and not released.wait(0.2)
+    assert shaper.stats()["2"]["window_waits"] == 1
+    shaper.release(2, 60 * 1024, True)
+    assert released.wait(1)
+    print("Test passed: The window doubles, then grows by one MTU per window, halves on loss, and holds back senders when full.")
+
+def test_capacity_change_keeps_waiting_senders():
+
+    shaper = LinkShaper({2: 1024 * 1024})
+    shaper.acquire(2, 60 * 1024)
+    released = threading.Event()
+
+    def second_sender():
+
+        shaper.acquire(2, 16 * 1024)
+        released.set()
+
+    threading.Thread(target=second_sender, daemon=True).start()
+    assert not released.wait(0.2)
+    # A new contact window re-rates the link while the second sender waits on it; the first send still frees its room.
+    shaper.set_capacity(2, 2 * 1024 * 1024)
+    assert not released.wait(0.2)
+    shaper.release(2, 60 * 1024, True)
+    assert released.wait(1)
+    stats = shaper.stats()["2"]
+    assert stats["capacity"] == 2 * 1024 * 1024 and stats["bytes_sent"] == 76 * 1024
+    shaper.release(2, 16 * 1024, True)
+    print("Test passed: Changing a link's capacity keeps its window, so a waiting sender is released by the send in flight.")
+
+def test_transfer_is_shaped_and_loss_shrinks_window(bus, chain, write_image):
+
+    satellites, station = chain
+    sender = satellites[0]
+    sender.router.shaper.set_capacity(2, 512 * 1024)
+    image_path = write_image(sender, 256)
+    start = time.monotonic()
+    assert sender.transmit_image(1001, image_path)
+    elapsed = time.monotonic() - start
+    link = sender.router.link_stats()["2"]
+    assert station.router.images_received == 1
+    assert link["capacity"] == 512 * 1024 and link["bytes_sent"] > 0 and link["bytes_per_second"] > 0
+    assert elapsed >= (link["bytes_sent"] - 64 * 1024) / (512 * 1024) * 0.8
+    window = link["window"]
+
+    lost = []
+
+    def lose_every_tenth_chunk(sender_id, neighbor_id, packet):
+
+        if sender_id == 1 and packet.message_type == 2 and packet.sequence_number % 10 == 0 and packet.sequence_number not in lost:
+            lost.append(packet.sequence_number)
+            return True
+        return False
+
+    bus.loss_filter = lose_every_tenth_chunk
+    assert sender.transmit_image(1001, write_image(sender, 256))
+    link = sender.router.link_stats()["2"]
+    assert lost and link["losses"] >= 1 and link["window"] < window
+    print(f"Test passed: {link['bytes_sent']} bytes sent at up to 512 KB/s; loss cut the window from {window} to {link['window']} bytes.")
+
+def test_stream_acknowledgements_drive_the_window(chain):
+
+    satellites, station = chain
+    sender, receiver = satellites[0], satellites[1]
+    server = StreamServer(receiver, receiver.router.receive_packet, stream_port(receiver.node_id), host="127.0.0.1")
+    server.start()
+    sender.router.transport = StreamTransport(sender, host="127.0.0.1", fallback=HttpTransport(sender, host="127.0.0.1"))
+    sender.router.bundles.drain(2, lambda packet: True)
+    try:
+        def send_text(count):
+
+            for _ in range(count):
+                packet = sender.create_packet(dest_id=2, payload=b"x" * 4096, message_type=1)
+                sender.router.forward_packet(packet).result(5)
+
+        send_text(20)
+        grown = sender.router.link_stats()["2"]
+        assert grown["losses"] == 0 and grown["window"] > CWND_INITIAL
+
+        # The receiver can no longer decrypt: the bytes still reach its socket, but its acknowledgements report the loss.
+        del receiver.shared_symmetric_keys[1]
+        send_text(3)
+        link = sender.router.link_stats()["2"]
+        assert link["losses"] == 3 and link["window"] < grown["window"]
+    finally:
+        sender.router.transport.close()
+        server.stop()
+        sender.router.bundles.drain(2, lambda packet: True)
+    print(f"Test passed: Stream acknowledgements grew the window to {grown['window']} bytes and rejected packets cut it to {link['window']}.")
+
+def test_http_rejections_drive_the_window(chain, client_response):
+
+    satellites, station = chain
+    sender, receiver = satellites[0], satellites[1]
+    satellite_node.satellite = receiver
+    client = satellite_node.app.test_client()
+    post = lambda url, data=None, headers=None, **kwargs: client_response(client.post(urlsplit(url).path, data=data, headers=headers))
+    sender.router.transport = HttpTransport(sender, host="127.0.0.1")
+    sender.router.bundles.drain(2, lambda packet: True)
+    try:
+        with mock.patch.object(transport.session, "post", post):
+            for _ in range(20):
+                assert sender.router.forward_packet(sender.create_packet(dest_id=2, payload=b"x" * 4096)).result(5)
+            grown = sender.router.link_stats()["2"]
+            assert grown["losses"] == 0 and grown["window"] > CWND_INITIAL
+
+            # A batch whose chunks the receiver cannot read is answered 200 with its failures counted, and still fails.
+            chunks = [sender.router.forward_packet(sender.create_packet(dest_id=2, payload=b"not a chunk", message_type=2)) for _ in range(3)]
+            sender.router.flush()
+            assert not any(chunk.result(5) for chunk in chunks)
+            # A single packet the receiver cannot decrypt is answered with an error status; the sender holds it for later.
+            del receiver.shared_symmetric_keys[1]
+            sender.router.forward_packet(sender.create_packet(dest_id=2, payload=b"x" * 4096)).result(5)
+            assert sender.router.bundles.pending(2) == 1
+        link = sender.router.link_stats()["2"]
+        assert link["losses"] == 2 and link["window"] < grown["window"]
+
+    finally:
+        sender.router.bundles.drain(2, lambda packet: True)
+    print(f"Test passed: HTTP acknowledgements grew the window to {grown['window']} bytes and rejected packets cut it to {link['window']}.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
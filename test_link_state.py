@@ -0,0 +1,91 @@
+import pytest
+
+from utils.logging_utils import set_file_logging
+from network.link_state import LinkStateDatabase, make_lsa
+import network.network_manager as network_manager
+
+set_file_logging(False)
+
+def square(database, sequence, cost_2_4=5.0):
+
+    # 1 - 2 - 4 and 1 - 3 - 4; node 4 also reaches 5.
+    links = {
+        1: {2: (1.0, 4096), 3: (2.0, 8192)},
+        2: {1: (1.0, 4096), 4: (cost_2_4, 8192)},
+        3: {1: (2.0, 8192), 4: (2.0, 2048)},
+        4: {2: (cost_2_4, 8192), 3: (2.0, 2048), 5: (1.0, 8192)},
+        5: {4: (1.0, 8192)},
+    }
+    return [database.install(make_lsa(origin, sequence, node_links)) for origin, node_links in links.items()]
+
+def test_dijkstra_and_incremental_updates():
+
+    database = LinkStateDatabase(1)
+    square(database, 1)
+    routes = database.routes()
+    assert routes[4] == (3, 4.0, 2048) and routes[5] == (3, 5.0, 2048) and routes[2] == (2, 1.0, 4096)
+    assert database.install(make_lsa(2, 1, {})) is None
+
+    # Cheapening 2-4 moves 4 and 5 behind node 2; only one link changed, so no full run is needed.
+    full_runs = database.full_runs
+    changed = database.install(make_lsa(2, 2, {1: (1.0, 4096), 4: (1.5, 8192)}))
+    assert changed == {4, 5}
+    assert database.install(make_lsa(4, 2, {2: (1.5, 8192), 3: (2.0, 2048), 5: (1.0, 8192)})) == set()
+    assert database.routes()[5] == (2, 3.5, 4096)
+    assert database.full_runs == full_runs and database.incremental_runs >= 2
+
+    reference = LinkStateDatabase(1)
+    square(reference, 1, cost_2_4=1.5)
+    assert reference.routes() == database.routes()
+
+    # Node 4 stops listing node 2: the link goes down even though node 2's old advertisement still lists it.
+    database.install(make_lsa(4, 3, {3: (2.0, 2048), 5: (1.0, 8192)}))
+    assert database.routes()[5] == (3, 5.0, 2048)
+    print(f"Test passed: Routes follow shortest paths through {database.incremental_runs} incremental updates.")
+
+def test_advertisement_changing_several_links_stays_incremental():
+
+    database = LinkStateDatabase(1)
+    square(database, 1)
+    full_runs = database.full_runs
+    # Node 4 moved: all three of its links changed in one advertisement, and its neighbors follow with their own.
+    moved = {2: (1.0, 8192), 3: (6.0, 2048), 5: (0.5, 8192)}
+    changed = database.install(make_lsa(4, 2, moved))
+    database.install(make_lsa(2, 2, {1: (1.0, 4096), 4: (1.0, 8192)}))
+    database.install(make_lsa(3, 2, {1: (2.0, 8192), 4: (6.0, 2048)}))
+    database.install(make_lsa(5, 2, {4: (0.5, 8192)}))
+    assert changed and database.full_runs == full_runs
+
+    reference = LinkStateDatabase(1)
+    for lsa in database.advertisements():
+        reference.install(lsa)
+    reference.recompute()
+    assert reference.routes() == database.routes()
+    assert database.routes()[5] == (2, 2.5, 4096)
+    print(f"Test passed: Multi-link advertisements were applied in {database.incremental_runs} incremental updates and no full runs.")
+
+def test_link_state_mode_over_bus(bus, build_chain, write_image):
+
+    mode = network_manager.ROUTING_MODE
+    network_manager.ROUTING_MODE = "link_state"
+    try:
+        satellites, station = build_chain()
+    finally:
+        network_manager.ROUTING_MODE = mode
+
+    assert bus.control_messages["/receive_lsa"] > 0 and bus.control_messages["/receive_routing_table"] == 0
+    assert satellites[0].network.routing_table[1001][0] == 2
+    assert station.network.routing_table[1][0] == 3
+    assert satellites[0].transmit_image(1001, write_image(satellites[0]))
+    assert station.router.images_received == 1
+
+    # A failed link is advertised by both ends and the route behind it is withdrawn everywhere.
+    satellites[1].network.remove_neighbor(3)
+    satellites[2].network.remove_neighbor(2)
+    bus.run_until_idle()
+    assert 1001 not in satellites[0].network.routing_table and 3 not in satellites[0].network.routing_table
+    assert 2 in satellites[0].network.routing_table
+    print(f"Test passed: Link-state routing converged with {bus.control_messages['/receive_lsa']} advertisement messages and withdrew the failed link.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
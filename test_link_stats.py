@@ -0,0 +1,63 @@
+import time
+import pytest
+
+from utils.logging_utils import set_file_logging
+from network.link_stats import AdaptiveChunkSizer, CHUNK_OVERHEAD
+from app.config import INITIAL_CHUNK_SIZE
+
+set_file_logging(False)
+
+from app.satellite_node import SatelliteNode
+from app.ground_station import GroundStation
+
+def test_sizer_grows_on_clean_link_and_backs_off_on_loss():
+
+    sizer = AdaptiveChunkSizer(min_size=256, initial_size=1024, max_size=8192)
+    for _ in range(20):
+        sizer.record(2, True, 0.01)
+    assert sizer.chunk_size(2) == 8192
+    sizer.record(2, False)
+    assert sizer.chunk_size(2) == 4096
+    for _ in range(10):
+        sizer.record(3, True, 2.0)
+    assert sizer.chunk_size(3) == 256
+    assert sizer.chunk_size(2, path_mtu=2048) == 2048 - CHUNK_OVERHEAD
+    print("Test passed: Chunk size grows on a clean link, halves on loss, and shrinks on a slow link.")
+
+def test_batch_rtt_is_sampled_per_packet(workspace):
+
+    node = SatelliteNode(1, (0, 0, 5), start_services=False)
+
+    def slow_batch():
+
+        time.sleep(0.64)
+        return True
+
+    # 64 packets acknowledged together after 0.64s is 10ms per packet, well inside the RTT target.
+    for _ in range(3):
+        assert node.router.shaped_send(2, 64 * 1024, 64, slow_batch)
+    link = node.router.chunk_sizer.to_json()["2"]
+    assert link["rtt"] < 0.02 and link["chunk_size"] > INITIAL_CHUNK_SIZE
+    print(f"Test passed: A slow batch acknowledgement gave a per-packet RTT of {link['rtt'] * 1000:.1f} ms and did not shrink chunks.")
+
+def test_path_mtu_reported_by_relay(bus):
+
+    satellites = [SatelliteNode(node_id, (8.0 * (node_id - 1), 0, 5), start_services=False) for node_id in (1, 2, 3)]
+    station = GroundStation(1001, (24.0, 0, 0), start_services=False)
+    # The middle relay only accepts small frames; the sender must learn that through routing updates.
+    satellites[1].network.mtu = 2048
+    for node in satellites + [station]:
+        bus.register(node)
+    bus.connect_all()
+    for _ in range(3):
+        for node in satellites + [station]:
+            node.network.broadcast_position()
+        bus.run_until_idle()
+
+    assert satellites[0].network.path_mtu(1001) == 2048
+    assert satellites[2].network.path_mtu(1001) > 2048
+    assert satellites[0].router.chunk_size_for(1001) == 2048 - CHUNK_OVERHEAD
+    print(f"Test passed: Sender sizes chunks at {satellites[0].router.chunk_size_for(1001)} bytes for a 2048-byte path MTU.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,47 @@
+from network.packet import Packet
+
+def test_packet_round_trip():
+
+    packet = Packet(version=1, message_type=2, source_id=1, dest_id=1001, sequence_number=7, payload=b"chunk-data", ttl=9)
+    decoded = Packet.from_bytes(packet.to_bytes())
+    assert (decoded.version, decoded.message_type, decoded.source_id, decoded.dest_id) == (1, 2, 1, 1001)
+    assert (decoded.sequence_number, decoded.ttl) == (7, 9)
+    assert bytes(decoded.payload) == b"chunk-data"
+    print("Test passed: Packet survives a to_bytes/from_bytes round trip.")
+
+def test_pack_into_shared_buffer():
+
+    packets = [Packet(1, 2, 1, 1001, i, bytes([i]) * (i + 1)) for i in range(5)]
+    buffer = bytearray(Packet.batch_size(packets) + 8)
+    end = Packet.pack_batch_into(packets, buffer, offset=8)
+    assert end == len(buffer)
+
+    decoded = Packet.decode_batch(buffer, offset=8)
+    assert [p.sequence_number for p in decoded] == list(range(5))
+    assert [bytes(p.payload) for p in decoded] == [p.payload for p in packets]
+    print("Test passed: Batch packed into a shared buffer decodes back to the same packets.")
+
+def test_batch_round_trip():
+
+    packets = [Packet(1, 1, 2, 3, i, f"message {i}".encode()) for i in range(100)]
+    decoded = Packet.decode_batch(Packet.encode_batch(packets))
+    assert len(decoded) == 100
+    assert decoded[42].get_payload() == "message 42"
+    assert Packet.decode_batch(Packet.encode_batch([])) == []
+    print("Test passed: encode_batch/decode_batch round trip.")
+
+def test_truncated_batch_rejected():
+
+    data = Packet.encode_batch([Packet(1, 1, 2, 3, 0, b"payload")])
+    try:
+        Packet.decode_batch(data[:-1])
+    except ValueError:
+        print("Test passed: Truncated batch is rejected.")
+        return
+    assert False, "Truncated batch was accepted!"
+
+if __name__ == "__main__":
+    test_packet_round_trip()
+    test_pack_into_shared_buffer()
+    test_batch_round_trip()
+    test_truncated_batch_rejected()
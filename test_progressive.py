@@ -0,0 +1,136 @@
+import os
+import tempfile
+import time
+import pytest
+import numpy as np
+from PIL import Image
+
+from utils.logging_utils import set_file_logging
+from utils.tile_utils import ProgressiveImages, iter_progressive_payloads, preview_path
+
+set_file_logging(False)
+
+def gradient_image(height, width):
+
+    rows = np.linspace(0, 255, height, dtype=np.uint8)[:, None, None]
+    cols = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+    return np.concatenate([np.broadcast_to(rows, (height, width, 1)), np.broadcast_to(cols, (height, width, 1)),
+                           np.full((height, width, 1), 90, dtype=np.uint8)], axis=2)
+
+def test_preview_after_overview_then_exact_image():
+
+    pixels = gradient_image(300, 500)
+    payloads = list(iter_progressive_payloads(7, pixels, "RGB", tile_size=128, scale=8))
+    assert len(payloads) == 1 + 3 * 4
+    images = ProgressiveImages()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for index, payload in enumerate(payloads):
+            path = os.path.join(directory, f"part_{index}.png")
+            with open(path, "wb") as part_file:
+                part_file.write(payload)
+            paths.append(images.receive(1, path))
+            if index == 0:
+                preview = np.asarray(Image.open(preview_path(path)))
+                assert preview.shape == pixels.shape
+                assert np.abs(preview.astype(int) - pixels.astype(int)).max() < 40
+
+        assert paths[:-1] == [None] * (len(payloads) - 1)
+        assert paths[-1] == os.path.join(directory, "part_0.png")
+        assert np.array_equal(np.asarray(Image.open(paths[-1])), pixels)
+        assert sorted(os.listdir(directory)) == ["part_0.png"]
+    print("Test passed: Overview preview appears first and tiles assemble the exact image.")
+
+def test_evicted_images_are_spooled_and_finish():
+
+    images = ProgressiveImages(max_images=2)
+    frames = [gradient_image(200, 200) // (index + 1) for index in range(3)]
+    payloads = [list(iter_progressive_payloads(index, pixels, "RGB", tile_size=128, scale=8)) for index, pixels in enumerate(frames)]
+    with tempfile.TemporaryDirectory() as directory:
+        def receive(image_id, index):
+
+            path = os.path.join(directory, f"image_{image_id}_{index}.png")
+            with open(path, "wb") as part_file:
+                part_file.write(payloads[image_id][index])
+            return images.receive(1, path)
+
+        # Three overviews with room for two canvases: the first image moves to disk instead of being dropped.
+        for image_id in range(3):
+            assert receive(image_id, 0) is None
+        assert list(images.spooled) == [(1, 0)] and images.spooled_total == 1
+        assert os.path.exists(os.path.join(directory, "image_0_0_progressive.npz"))
+        previews = images.previews()
+        assert sorted(preview["image_id"] for preview in previews) == [0, 1, 2]
+        assert [preview["spooled"] for preview in previews if preview["image_id"] == 0] == [True]
+
+        finished = []
+        for index in range(1, 5):
+            for image_id in range(3):
+                finished.append(receive(image_id, index))
+        assert finished[:-3] == [None] * (len(finished) - 3)
+        for image_id, path in enumerate(finished[-3:]):
+            assert path == os.path.join(directory, f"image_{image_id}_0.png")
+            assert np.array_equal(np.asarray(Image.open(path)), frames[image_id])
+        assert images.previews() == [] and not images.spooled
+        assert sorted(os.listdir(directory)) == [f"image_{image_id}_0.png" for image_id in range(3)]
+    print(f"Test passed: {images.spooled_total} partial canvases were spooled to disk and every image still finished.")
+
+def test_previews_listed_with_received_images(chain):
+
+    import app.ground_station as ground_station_app
+
+    _, station = chain
+    overview = next(iter_progressive_payloads(9, gradient_image(64, 64), "RGB"))
+    path = os.path.join(station.received_images_dir, "progressive_preview_test.png")
+    with open(path, "wb") as part_file:
+        part_file.write(overview)
+    assert station.progressive_images.receive(3, path) is None
+
+    ground_station_app.ground_station = station
+    response = ground_station_app.app.test_client().get("/get_received_images")
+    assert response.status_code == 200
+    previews = [preview for preview in response.get_json()["previews"] if preview["source_id"] == 3]
+    assert previews == [{"source_id": 3, "image_id": 9, "preview_path": preview_path(path),
+                         "tiles_received": 0, "tile_count": 1, "spooled": False}]
+    os.remove(preview_path(path))
+    print("Test passed: A partial image's preview is listed by /get_received_images.")
+
+def test_abandoned_images_expire_with_their_spools():
+
+    images = ProgressiveImages(max_images=1, ttl=10, expire_interval=None)
+    payloads = [list(iter_progressive_payloads(image_id, gradient_image(200, 200), "RGB", tile_size=128, scale=8)) for image_id in range(2)]
+    with tempfile.TemporaryDirectory() as directory:
+        for image_id in range(2):
+            path = os.path.join(directory, f"image_{image_id}_0.png")
+            with open(path, "wb") as part_file:
+                part_file.write(payloads[image_id][0])
+            assert images.receive(1, path) is None
+        assert list(images.spooled) == [(1, 0)] and os.path.exists(os.path.join(directory, "image_0_0_progressive.npz"))
+
+        # Neither image gets another tile, so both expire: the canvas in memory and the one spooled to disk.
+        images.expire(time.monotonic() + 11)
+        assert not images.images and not images.spooled and images.expired == 2
+        assert os.listdir(directory) == [] and images.previews() == []
+    print("Test passed: Abandoned progressive images expire and their spooled canvases and previews are deleted.")
+
+def test_progressive_transfer_over_chain(chain):
+
+    satellites, station = chain
+    sender = satellites[0]
+    image_path = sender.capture_image()
+    pixels = gradient_image(512, 512)
+    Image.fromarray(pixels, "RGB").save(image_path)
+
+    started = time.time()
+    assert sender.transmit_progressive(1001, image_path)
+    stats = sender.last_transfer_stats
+    assert stats["transfers"] == 1 + 4 and stats["complete"]
+    assert station.router.images_received == 1
+    assert not any("preview" in name for name in os.listdir(station.received_images_dir))
+    entries, _ = station.catalog.list(since=started)
+    assert len(entries) == 1
+    assert np.array_equal(np.asarray(Image.open(entries[0]["path"])), pixels)
+    print(f"Test passed: Overview sent after {stats['overview_seconds']:.3f}s of a {stats['seconds']:.3f}s progressive transfer.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
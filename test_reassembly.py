@@ -0,0 +1,129 @@
+import io
+import os
+import random
+import tempfile
+import time
+import zlib
+
+from utils.logging_utils import set_file_logging, setup_logger
+from utils.compression_utils import iter_compressed_chunks, get_codec
+from network.packet import ImageChunkHeader
+from network.reassembly import SpoolReassembly, MemoryReassembly, ReassemblyTable, remove_stale_spools
+from app.image_writer import ImageWriter
+
+set_file_logging(False)
+
+def compressed_chunks(data, chunk_size=512):
+
+    # Mirrors the streaming sender: non-final chunks carry total 0, the final chunk carries the count.
+    return [(number, number if is_last else 0, chunk)
+            for number, is_last, chunk in iter_compressed_chunks(io.BytesIO(data), chunk_size, 4096)]
+
+def write_image(blocks, image_dir):
+
+    # The receive path: decompress on the image writer thread; returns the written path, or None if the write failed.
+    writer = ImageWriter(setup_logger("reassembly_test", "general"), image_dir)
+    image_path = writer.submit(1, get_codec("zlib-6").iter_decompressed(blocks), key=1)
+    return image_path if writer.wait(1) else None
+
+def test_spool_out_of_order():
+
+    data = os.urandom(40000) + bytes(100000)
+    chunks = compressed_chunks(data)
+    random.Random(3).shuffle(chunks)
+    # Deliver the final chunk first so it has to wait for the chunk size.
+    chunks.sort(key=lambda item: item[1] == 0)
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        reassembly = SpoolReassembly(spool_dir, 1)
+        results = [reassembly.add(*chunk) for chunk in chunks]
+        assert results == [False] * (len(chunks) - 1) + [True]
+        assert reassembly.add(*chunks[0]) and len(reassembly.received) == len(chunks)
+
+        image_path = write_image(reassembly.iter_blocks(), spool_dir)
+        reassembly.discard()
+        with open(image_path, "rb") as image_file:
+            assert image_file.read() == data
+        assert os.listdir(spool_dir) == [os.path.basename(image_path)]
+    print(f"Test passed: {len(chunks)} shuffled chunks reassembled through the spool file.")
+
+def test_single_chunk_and_memory_mode():
+
+    data = b"small image"
+    for reassembly_type in (MemoryReassembly, SpoolReassembly):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            reassembly = MemoryReassembly() if reassembly_type is MemoryReassembly else SpoolReassembly(spool_dir, 1)
+            for chunk in compressed_chunks(data):
+                assert reassembly.add(*chunk)
+            image_path = write_image(reassembly.iter_blocks(), spool_dir)
+            reassembly.discard()
+            with open(image_path, "rb") as image_file:
+                assert image_file.read() == data
+    print("Test passed: Single-chunk images reassemble in memory and spool modes.")
+
+def test_truncated_stream_leaves_no_file():
+
+    data = os.urandom(5000)
+    chunks = compressed_chunks(data)
+    with tempfile.TemporaryDirectory() as spool_dir:
+        assert write_image((chunk for _, _, chunk in chunks[:-1]), spool_dir) is None
+        assert os.listdir(spool_dir) == []
+    print("Test passed: An incomplete stream leaves neither a partial nor a final file.")
+
+def test_concurrent_transfers_from_one_source():
+
+    images = {7: os.urandom(3000), 8: os.urandom(3000)}
+    table = ReassemblyTable(lambda key: MemoryReassembly())
+    streams = {transfer_id: compressed_chunks(data, chunk_size=256) for transfer_id, data in images.items()}
+    finished = {}
+    # Interleave both transfers chunk by chunk, as two windows from the same satellite would.
+    for pair in zip(*streams.values()):
+        for transfer_id, (number, total, chunk) in zip(streams, pair):
+            payload = ImageChunkHeader(transfer_id, number, total, ImageChunkHeader.FLAG_LAST if total else 0).pack(chunk)
+            header, body = ImageChunkHeader.unpack(payload)
+            session = table.add((1, header.transfer_id), header.chunk_number, header.total_chunks, body)
+            if session is not None:
+                finished[header.transfer_id] = zlib.decompress(b"".join(session.iter_blocks()))
+    assert finished == images
+    assert table.stats() == {"active_transfers": 0, "buffered_bytes": 0, "completed_transfers": 2, "evicted_transfers": 0}
+    assert table.add((1, 7), 1, 0, b"late duplicate") is None and not table.sessions
+    print("Test passed: Two interleaved transfers from one source reassembled independently.")
+
+def test_eviction_by_ttl_and_size():
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        table = ReassemblyTable(lambda key: SpoolReassembly(spool_dir, key[1]), ttl=10, max_bytes=1000)
+        table.add((1, 1), 1, 0, bytes(400))
+        table.add((1, 2), 1, 0, bytes(400))
+        # The third transfer pushes buffered bytes past the cap, so the least recently updated one goes.
+        table.add((1, 3), 1, 0, bytes(400))
+        assert list(table.sessions) == [(1, 2), (1, 3)] and table.buffered_bytes == 800
+        table.expire(time.monotonic() + 11)
+        assert table.stats()["evicted_transfers"] == 3 and table.buffered_bytes == 0
+        assert os.listdir(spool_dir) == []
+    print("Test passed: Stale and over-budget transfers are evicted and their spool files removed.")
+
+def test_idle_expiry_and_stale_spools():
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        SpoolReassembly(spool_dir, "5_1_9")
+        SpoolReassembly(spool_dir, "15_1_9")
+        # Only this node's spools from an earlier run are removed; another node sharing the directory keeps its own.
+        assert remove_stale_spools(spool_dir, "5_") == 1 and len(os.listdir(spool_dir)) == 1
+        table = ReassemblyTable(lambda key: SpoolReassembly(spool_dir, f"5_{key[0]}_{key[1]}"), ttl=0.1, expire_interval=0.05)
+        table.add((1, 1), 1, 0, bytes(400))
+        deadline = time.monotonic() + 5
+        while table.sessions and time.monotonic() < deadline:
+            time.sleep(0.05)
+        table.stop()
+        # No further chunk arrived, yet the abandoned transfer was evicted and its spool removed.
+        assert table.stats()["evicted_transfers"] == 1 and len(os.listdir(spool_dir)) == 1
+    print("Test passed: Idle transfers expire on a timer and stale spools are cleared at startup.")
+
+if __name__ == "__main__":
+    test_spool_out_of_order()
+    test_single_chunk_and_memory_mode()
+    test_truncated_stream_leaves_no_file()
+    test_concurrent_transfers_from_one_source()
+    test_eviction_by_ttl_and_size()
+    test_idle_expiry_and_stale_spools()
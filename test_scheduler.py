@@ -0,0 +1,122 @@
+import threading
+from concurrent.futures import Future
+
+from utils.logging_utils import set_file_logging, setup_logger
+from network.packet import Packet, ImageChunkHeader, TransferStatus, MESSAGE_TRANSFER_STATUS
+from network.scheduler import OutboundScheduler, CONTROL, BULK
+
+set_file_logging(False)
+
+def chunk_packet(transfer_id, chunk_number):
+
+    return Packet(1, 2, 1, 1001, chunk_number, ImageChunkHeader(transfer_id, chunk_number).pack(b"x" * 1000))
+
+def blocked_scheduler(**kwargs):
+
+    # The first packet holds the worker so everything submitted after it queues up.
+    started, release = threading.Event(), threading.Event()
+    order = []
+
+    def send(neighbor_id, packet, hold):
+
+        if not order:
+            started.set()
+            release.wait()
+        order.append(packet)
+
+    scheduler = OutboundScheduler(send, setup_logger("scheduler_test", "general"), **kwargs)
+    scheduler.submit(2, chunk_packet(99, 1))
+    assert started.wait(5)
+    return scheduler, release, order
+
+def test_control_first_then_fair_share_between_transfers():
+
+    scheduler, release, order = blocked_scheduler(quantum=1000)
+    for chunk_number in range(1, 7):
+        scheduler.submit(2, chunk_packet(7, chunk_number))
+    for chunk_number in range(1, 7):
+        scheduler.submit(2, chunk_packet(8, chunk_number))
+    status = Packet(1, MESSAGE_TRANSFER_STATUS, 1001, 1, 0, TransferStatus(7, 6).pack())
+    scheduler.submit(2, status)
+    text = Packet(1, 1, 1, 1001, 0, b"hello")
+    scheduler.submit(2, text)
+    release.set()
+    assert scheduler.flush(5)
+
+    assert order[1] is status and order[2] is text
+    transfers = [ImageChunkHeader.unpack(packet.payload)[0].transfer_id for packet in order[3:]]
+    # With a quantum of one chunk the two transfers alternate instead of one waiting for the other to finish.
+    assert transfers == [7, 8] * 6
+    stats = scheduler.stats()
+    assert stats["classes"][CONTROL]["packets"] == 1 and stats["classes"][BULK]["packets"] == 13
+    assert stats["classes"][CONTROL]["max_latency"] < stats["classes"][BULK]["max_latency"]
+    assert scheduler.pending() == 0
+    print(f"Test passed: Control went out after {stats['classes'][CONTROL]['max_latency'] * 1000:.1f} ms, ahead of 12 queued chunks.")
+
+def test_weighted_transfer_gets_larger_share():
+
+    scheduler, release, order = blocked_scheduler(quantum=1000)
+    scheduler.set_weight((1, 8), 2)
+    for chunk_number in range(1, 7):
+        scheduler.submit(2, chunk_packet(7, chunk_number))
+        scheduler.submit(2, chunk_packet(8, chunk_number))
+    release.set()
+    assert scheduler.flush(5)
+    transfers = [ImageChunkHeader.unpack(packet.payload)[0].transfer_id for packet in order[1:]]
+    assert transfers[:6].count(8) == 4
+    print("Test passed: A transfer with weight 2 sends two chunks for every one of a weight-1 transfer.")
+
+def test_submit_resolves_to_send_result():
+
+    # A packet is only reported delivered once it is really sent: a failure, an exception, or a batch that has not
+    # gone out yet all keep the caller's future from saying so.
+    batch = Future()
+
+    def send(neighbor_id, packet, hold):
+
+        if packet.sequence_number == 2:
+            raise ConnectionError("link down")
+        if packet.sequence_number == 3:
+            return batch
+        return packet.sequence_number == 0
+
+    scheduler = OutboundScheduler(send, setup_logger("scheduler_test", "general"))
+    deliveries = [scheduler.submit(2, Packet(1, 1, 1, 1001, sequence_number, b"hello")) for sequence_number in range(4)]
+    assert scheduler.flush(5)
+    assert [delivery.result(5) for delivery in deliveries[:3]] == [True, False, False]
+    assert not deliveries[3].done()
+    batch.set_result(True)
+    assert deliveries[3].result(5)
+    print("Test passed: Submitted packets resolve to their real send result.")
+
+def test_stop_reports_queued_packets_unsent():
+
+    started, release = threading.Event(), threading.Event()
+    sent = []
+
+    def send(neighbor_id, packet, hold):
+
+        if neighbor_id == 2:
+            started.set()
+            release.wait()
+        sent.append((neighbor_id, packet.sequence_number))
+        return True
+
+    scheduler = OutboundScheduler(send, setup_logger("scheduler_test", "general"))
+    scheduler.submit(2, chunk_packet(7, 1))
+    assert started.wait(5)
+    # Each neighbor has its own queue and condition, so a stalled link does not hold up another neighbor's packets.
+    assert scheduler.submit(3, chunk_packet(7, 1)).result(5)
+    queued = scheduler.submit(2, chunk_packet(7, 2))
+    scheduler.stop(timeout=0.1)
+    release.set()
+    assert queued.result(5) is False and scheduler.pending() == 0
+    assert scheduler.submit(2, chunk_packet(7, 3)).result(5) is False
+    assert sent == [(3, 1), (2, 1)]
+    print("Test passed: Stopping the scheduler ends its workers and reports still-queued packets as unsent.")
+
+if __name__ == "__main__":
+    test_control_first_then_fair_share_between_transfers()
+    test_weighted_transfer_gets_larger_share()
+    test_submit_resolves_to_send_result()
+    test_stop_reports_queued_packets_unsent()
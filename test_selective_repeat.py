@@ -0,0 +1,114 @@
+import random
+import time
+import pytest
+
+from utils.logging_utils import set_file_logging
+from network.packet import TransferStatus, ImageChunkHeader
+
+set_file_logging(False)
+
+def test_status_bitmap_round_trip():
+
+    status = TransferStatus.unpack(TransferStatus.from_chunks(9, 20, [1, 2, 5, 17]).pack())
+    assert status.transfer_id == 9 and status.total_chunks == 20 and not status.is_complete()
+    assert status.missing(20) == [3, 4] + list(range(6, 17)) + [18, 19, 20]
+    print("Test passed: Transfer status bitmap round-trips.")
+
+def test_only_lost_chunks_are_resent(bus, chain, write_image):
+
+    satellites, station = chain
+    rng = random.Random(4)
+    lost = []
+
+    def lossy_first_hop(sender_id, neighbor_id, packet):
+
+        if sender_id == 1 and packet.message_type == 2 and rng.random() < 0.2:
+            lost.append(packet.sequence_number)
+            return True
+        return False
+
+    bus.loss_filter = lossy_first_hop
+    assert satellites[0].transmit_image(1001, write_image(satellites[0], 256))
+    stats = satellites[0].last_transfer_stats
+    assert station.router.images_received == 1
+    assert lost and stats["retransmitted_chunks"] == len(lost) < stats["total_chunks"]
+    assert satellites[0].outbox.pending() == []
+    print(f"Test passed: {len(lost)} lost chunks resent out of {stats['total_chunks']}.")
+
+def test_transfer_resumes_after_recover(bus, chain, write_image):
+
+    satellites, station = chain
+    sender = satellites[0]
+    delivered = []
+
+    def fail_mid_transfer(sender_id, neighbor_id, packet):
+
+        if sender_id == 1 and packet.message_type == 2:
+            delivered.append(packet.sequence_number)
+            if len(delivered) == 10:
+                sender.fail()
+        return False
+
+    bus.loss_filter = fail_mid_transfer
+    assert not sender.transmit_image(1001, write_image(sender, 256))
+    assert len(sender.outbox.pending()) == 1 and station.router.images_received == 0
+
+    sender.recover()
+    deadline = time.monotonic() + 10
+    while sender.outbox.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert station.router.images_received == 1
+    assert sender.outbox.pending() == []
+    print(f"Test passed: Transfer resumed after recovery; {len(delivered)} chunk sends in total.")
+
+def test_window_only_counts_chunks_the_next_hop_took(chain):
+
+    satellites, station = chain
+    sender = satellites[0]
+    batches = []
+    send_batch = sender.router.transport.send_batch
+
+    def failing_batch(neighbor_id, packets):
+
+        numbers = [ImageChunkHeader.unpack(packet.with_payload(sender.encryption_manager.decrypt(
+            packet.payload, sender.shared_symmetric_keys[neighbor_id])).payload)[0].chunk_number for packet in packets]
+        batches.append(numbers)
+        # The link drops out under the second window.
+        return False if 6 in numbers else send_batch(neighbor_id, packets)
+
+    sender.router.transport.send_batch = failing_batch
+    chunks = ((chunk_number, ImageChunkHeader(77, chunk_number).pack(b"x" * 100)) for chunk_number in range(1, 21))
+    stats = sender.send_chunks_windowed(1001, chunks, window=4, transfer_id=77)
+    # Each full window goes out as its own batch rather than waiting for a batch of BATCH_MAX_PACKETS to fill.
+    assert batches[:2] == [[1, 2, 3, 4], [5, 6, 7, 8]]
+    assert stats["acked_chunks"] == 4 and stats["failed_chunks"] == [5, 6, 7, 8]
+    print(f"Test passed: {stats['acked_chunks']} chunks acknowledged and {len(stats['failed_chunks'])} charged to the failed batch.")
+
+def test_failed_image_write_is_resent(chain, write_image):
+
+    satellites, station = chain
+    submit = station.image_writer.submit
+    failures = []
+
+    def fail_first_write(source_id, pieces, **kwargs):
+
+        def broken():
+
+            yield b"partial"
+            raise OSError("disk full")
+
+        if not failures:
+            failures.append(kwargs["key"])
+            return submit(source_id, broken(), **kwargs)
+        return submit(source_id, pieces, **kwargs)
+
+    station.image_writer.submit = fail_first_write
+    assert satellites[0].transmit_image(1001, write_image(satellites[0], 128))
+    stats = satellites[0].last_transfer_stats
+    # The status reply after the failed write asked for every chunk again instead of reporting the transfer complete.
+    assert failures and station.router.images_received == 1
+    assert stats["retransmitted_chunks"] == stats["total_chunks"]
+    print(f"Test passed: An image whose write failed was resent in full ({stats['total_chunks']} chunks) and saved.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
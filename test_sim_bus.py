@@ -0,0 +1,72 @@
+import os
+import pytest
+from PIL import Image
+
+from utils.logging_utils import set_file_logging
+from network.packet import Packet
+from network.transport import HOP_HEADER
+
+set_file_logging(False)
+
+import app.ground_station as ground_station
+
+def test_routing_converges_over_bus(bus, chain):
+
+    satellites, station = chain
+    assert satellites[0].network.routing_table[1001][0] == 2
+    assert station.network.routing_table[1][0] == 3
+    assert 1001 in satellites[2].shared_symmetric_keys and 3 in station.shared_symmetric_keys
+    assert bus.control_messages["/update_position"] > 0
+    print(f"Test passed: Routing converged with {sum(bus.control_messages.values())} control messages.")
+
+def test_image_delivered_across_hops(bus, chain):
+
+    satellites, station = chain
+    image_path = satellites[0].capture_image()
+    Image.frombytes("RGB", (64, 64), os.urandom(64 * 64 * 3)).save(image_path)
+
+    assert satellites[0].transmit_image(1001, image_path)
+    while any(node.router.has_pending() for node in satellites):
+        for node in satellites:
+            node.router.flush()
+    assert station.router.images_received == 1
+    assert bus.data_packets > 0 and bus.dropped_packets == 0
+    print(f"Test passed: Image crossed three hops in {bus.data_packets} hop packets.")
+
+def test_station_relays_text_with_hop_key(chain):
+
+    satellites, station = chain
+    ground_station.ground_station = station
+    forwarded = []
+    forward_packet = station.router.forward_packet
+
+    def record_forward(packet):
+
+        forwarded.append(packet.payload)
+        return forward_packet(packet)
+
+    station.router.forward_packet = record_forward
+    # A message from Node 1 to Node 2 reaching the station from Node 3 is encrypted with the 3-1001 hop key.
+    payload = station.encryption_manager.encrypt(b"hello", station.shared_symmetric_keys[3])
+    packet = Packet(1, 1, 1, 2, 0, payload)
+    response = ground_station.app.test_client().post("/receive", data=packet.to_bytes(), headers={HOP_HEADER: "3"})
+    assert response.status_code == 200
+    assert forwarded == [b"hello"]
+    print("Test passed: The station decrypts a relayed message with the hop key and forwards it as plaintext.")
+
+def test_relay_reports_ttl_drop(chain):
+
+    satellites, station = chain
+    relay = satellites[1]
+    payload = satellites[0].encryption_manager.encrypt(b"hello", satellites[0].shared_symmetric_keys[2])
+    # The relay's answer is what its stream acknowledgement reports: a packet out of hops is a loss, not a delivery.
+    assert relay.router.receive_packet(Packet(1, 1, 1, 1001, 0, payload, ttl=1).to_bytes(), 1) is False
+    assert relay.router.receive_packet(Packet(1, 1, 1, 1001, 1, payload, ttl=5).to_bytes(), 1) is True
+    # Packets for the relay itself get a bool on every path too: a message is handled, an unreadable chunk is not.
+    assert relay.router.receive_packet(Packet(1, 1, 1, 2, 2, payload).to_bytes(), 1) is True
+    garbage = satellites[0].encryption_manager.encrypt(b"not a chunk", satellites[0].shared_symmetric_keys[2])
+    assert relay.router.receive_packet(Packet(1, 2, 1, 2, 3, garbage).to_bytes(), 1) is False
+    print("Test passed: A relay rejects a packet whose TTL runs out or cannot be processed and accepts one it handles.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import pytest
+import numpy as np
+from PIL import Image
+
+from utils.logging_utils import set_file_logging
+from utils.stack_utils import FrameStacker
+
+set_file_logging(False)
+
+def noisy_exposures(count, shape=(64, 48, 3), seed=5):
+
+    rng = np.random.default_rng(seed)
+    sky = rng.integers(20, 200, shape)
+    return [np.clip(sky + rng.normal(0, 25, shape), 0, 255).astype(np.uint8) for _ in range(count)], sky
+
+def test_streaming_stack_matches_in_memory_stack():
+
+    frames, sky = noisy_exposures(7)
+    with tempfile.TemporaryDirectory() as directory:
+        # The median's cap only fits a few rows, forcing it through many strips.
+        for method, reference, max_bytes in (("mean", np.mean, 128 * 1024), ("median", np.median, 16 * 1024)):
+            stacker = FrameStacker(depth=7, method=method, max_bytes=max_bytes, spool_dir=directory)
+            for frame in frames:
+                stacker.add(frame)
+            stacked = stacker.result()
+            assert stacker.peak_bytes <= max_bytes
+            assert np.array_equal(stacked, np.rint(reference(np.stack(frames), axis=0)).astype(np.uint8))
+            assert np.abs(stacked.astype(int) - sky).mean() < np.abs(frames[0].astype(int) - sky).mean() / 2
+        assert os.listdir(directory) == []
+
+    try:
+        FrameStacker(depth=4, max_bytes=1024).add(frames[0])
+        assert False, "Mean stack over the memory cap should be refused"
+
+    except ValueError:
+        pass
+    print("Test passed: Streaming mean and median stacks match the in-memory result and cut the noise.")
+
+def test_capture_stack_writes_one_frame(chain):
+
+    satellites, station = chain
+    sender = satellites[0]
+    image_path = sender.capture_stack(depth=3, method="median")
+    with Image.open(image_path) as img:
+        assert img.size == (1024, 1024)
+    assert sender.last_stack_stats["depth"] == 3 and sender.last_stack_stats["frames_not_sent"] == 2
+    assert sender.transmit_image(1001, image_path)
+    assert station.router.images_received == 1
+    print(f"Test passed: Three exposures stacked in {sender.last_stack_stats['seconds']:.3f}s and sent as one image.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,117 @@
+import hashlib
+import os
+from unittest import mock
+from urllib.parse import urlsplit
+import pytest
+
+from utils.logging_utils import set_file_logging
+from utils.stripe_utils import StripeReader, read_stripe_header, stripe_ranges
+
+set_file_logging(False)
+
+from app.ground_station import GroundStation
+import app.satellite_node as satellite_node
+import app.ground_station as ground_station
+
+@pytest.fixture
+def two_stations(bus, chain):
+
+    # Node 1 sees Station 1002 directly and reaches Station 1001 over three hops.
+    satellites, station = chain
+    second = GroundStation(1002, (0.0, -8.0, 0), start_services=False)
+    bus.register(second)
+    bus.connect_all()
+    for _ in range(3):
+        for node in satellites + [station, second]:
+            node.network.broadcast_position()
+        bus.run_until_idle()
+    return satellites, [station, second]
+
+def file_hash(path):
+
+    with open(path, "rb") as image_file:
+        return hashlib.sha256(image_file.read()).hexdigest()
+
+def test_stripe_ranges_cover_the_file():
+
+    ranges = stripe_ranges(10, 3)
+    assert ranges == [(0, 4), (4, 3), (7, 3)]
+    assert sum(length for _, length in stripe_ranges(1001, 7)) == 1001
+    print("Test passed: Stripe ranges are contiguous and cover every byte.")
+
+def test_stripe_reader_streams_its_range(workspace):
+
+    data = os.urandom(5000)
+    with open("image.bin", "wb") as image_file:
+        image_file.write(data)
+    with StripeReader("image.bin", 9, 1, 3, 1000, 2000, len(data)) as reader:
+        # Read in small blocks, as the compressor does, and rewind once as codec sampling does.
+        assert reader.read(10) and reader.seek(0) == 0
+        payload = b"".join(iter(lambda: reader.read(333), b""))
+    with open("stripe.bin", "wb") as stripe_file:
+        stripe_file.write(payload)
+    assert read_stripe_header("stripe.bin") == (9, 1, 3, 1000, len(data))
+    assert payload.endswith(data[1000:3000]) and len(payload) == reader.size
+    print("Test passed: A stripe is read block by block as its header and byte range.")
+
+def test_image_striped_across_stations_and_merged(two_stations, write_image):
+
+    satellites, stations = two_stations
+    sender = satellites[0]
+    assert sender.reachable_ground_stations() == [1001, 1002]
+    image_path = write_image(sender, 256)
+
+    assert sender.transmit_striped(image_path, min_size=0)
+    stats = sender.last_transfer_stats
+    assert [stripe["dest_id"] for stripe in stats["stripes"]] == [1001, 1002]
+    assert [station.router.stripes_received for station in stations] == [1, 1]
+    assert all(station.router.images_received == 0 for station in stations)
+
+    merged = stations[0].merge_striped_image(sender.node_id, stats["image_id"], [1001, 1002])
+    assert file_hash(merged) == file_hash(image_path)
+    entries, _ = stations[0].catalog.list(source_id=sender.node_id)
+    assert merged in [entry["path"] for entry in entries]
+    print(f"Test passed: Image split into {len(stats['stripes'])} stripes of {[stripe['bytes'] for stripe in stats['stripes']]} bytes and merged intact.")
+
+def test_stripe_for_lost_station_goes_elsewhere(two_stations, write_image):
+
+    satellites, stations = two_stations
+    sender = satellites[0]
+    image_path = write_image(sender, 128)
+    stations[1].state = "FAILED"
+
+    # Status requests to the failed station are never answered, so shorten the wait for each round.
+    timeout = satellite_node.TRANSFER_STATUS_TIMEOUT
+    satellite_node.TRANSFER_STATUS_TIMEOUT = 0.2
+    try:
+        assert sender.transmit_striped(image_path, min_size=0)
+
+    finally:
+        satellite_node.TRANSFER_STATUS_TIMEOUT = timeout
+    assert [stripe["dest_id"] for stripe in sender.last_transfer_stats["stripes"]] == [1001, 1001]
+    assert stations[0].router.stripes_received == 2 and sender.outbox.pending() == []
+    merged = stations[0].merge_striped_image(sender.node_id, sender.last_transfer_stats["image_id"])
+    assert file_hash(merged) == file_hash(image_path)
+    print("Test passed: The stripe for an unreachable station was resent through the other one.")
+
+def test_stripes_on_another_host_are_fetched_over_http(two_stations, write_image, client_response):
+
+    satellites, stations = two_stations
+    sender = satellites[0]
+    image_path = write_image(sender, 256)
+    assert sender.transmit_striped(image_path, min_size=0)
+    image_id = sender.last_transfer_stats["image_id"]
+
+    # Station 1002's catalog is not on this host, so its stripe has to come from its HTTP endpoints.
+    ground_station.ground_station = stations[1]
+    client = ground_station.app.test_client()
+    fetch = lambda url, params=None, **kwargs: client_response(client.get(urlsplit(url).path, query_string=params))
+    with mock.patch.object(ground_station, "station_images_dir", lambda station_id: f"elsewhere_{station_id}"), \
+            mock.patch.object(ground_station.session, "get", fetch):
+        merged = stations[0].merge_striped_image(sender.node_id, image_id, [1001, 1002])
+    assert file_hash(merged) == file_hash(image_path)
+    assert not any(name.endswith(".fetched") for name in os.listdir(stations[0].received_images_dir))
+    print("Test passed: A stripe held by a station on another host was fetched over HTTP and merged.")
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-s"]))
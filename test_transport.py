@@ -0,0 +1,99 @@
+import socket
+import struct
+
+from utils.logging_utils import set_file_logging, setup_logger
+from network.packet import Packet
+from network.transport import StreamTransport, StreamServer, stream_port
+
+set_file_logging(False)
+
+HOST = "127.0.0.1"
+
+class TransportNode:
+
+    def __init__(self, node_id):
+
+        self.node_id = node_id
+        self.general_logger = setup_logger(node_id, "transport_test")
+
+class RecordingFallback:
+
+    def __init__(self):
+
+        self.calls = []
+
+    def send(self, neighbor_id, data, message_type):
+
+        self.calls.append(neighbor_id)
+        return True
+
+    def send_batch(self, neighbor_id, packets):
+
+        self.calls.append(neighbor_id)
+        return True
+
+def start_server(node_id, handler):
+
+    server = StreamServer(TransportNode(node_id), handler, stream_port(node_id), host=HOST)
+    server.start()
+    return server
+
+def make_packets(count, dest_id, first=0):
+
+    return [Packet(1, 1, 1, dest_id, first + index, f"packet {first + index}".encode()) for index in range(count)]
+
+def test_stream_write_is_acknowledged_after_handling():
+
+    handled = []
+
+    def handler(data, hop_id):
+
+        packet = Packet.from_bytes(data)
+        handled.append((hop_id, packet.sequence_number))
+        # The receiver cannot read packet 7; the packets behind it on the stream must still be handled.
+        if packet.sequence_number == 7:
+            raise ValueError("cannot decrypt")
+        return packet.sequence_number != 8
+
+    server = start_server(3911, handler)
+    fallback = RecordingFallback()
+    transport = StreamTransport(TransportNode(3910), host=HOST, fallback=fallback)
+    try:
+        assert transport.send_batch(3911, make_packets(5, 3911))
+        assert handled == [(3910, index) for index in range(5)]
+        connection = transport.connections[3911]
+
+        assert not transport.send_batch(3911, make_packets(5, 3911, first=5))
+        assert [sequence_number for _, sequence_number in handled[5:]] == [5, 6, 7, 8, 9]
+        # A failure reported by the neighbor is a loss, not a reason to resend the batch over HTTP.
+        assert fallback.calls == [] and transport.connections[3911] is connection
+        assert transport.send(3911, make_packets(1, 3911, first=10)[0].to_bytes(), 1)
+        assert len(handled) == 11
+    finally:
+        transport.close()
+        server.stop()
+    print("Test passed: Stream writes succeed only once the receiver has handled every packet, and a rejected packet keeps the stream open.")
+
+def test_oversized_frame_closes_stream():
+
+    handled = []
+    # Handlers report every packet as handled or not; anything falsy counts as a loss.
+    server = start_server(3913, lambda data, hop_id: handled.append(data) or True)
+    try:
+        with socket.create_connection((HOST, stream_port(3913)), timeout=5) as sock:
+            sock.sendall(struct.pack("!I", 0xFFFFFFFF) + b"junk")
+            # The receiver drops the connection instead of waiting for 4 GiB.
+            assert sock.recv(1) == b""
+        assert handled == []
+
+        transport = StreamTransport(TransportNode(3912), host=HOST, fallback=RecordingFallback())
+        assert transport.send_batch(3913, make_packets(2, 3913))
+        assert len(handled) == 2
+        transport.close()
+    finally:
+        server.stop()
+    print("Test passed: A frame longer than STREAM_MAX_FRAME closes only its own stream.")
+
+if __name__ == "__main__":
+    test_stream_write_is_acknowledged_after_handling()
+    test_oversized_frame_closes_stream()
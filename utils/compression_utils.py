@@ -0,0 +1,233 @@
+# utils/compression_utils.py
+
+import bz2
+import lzma
+import time
+import zlib
+
+from app.config import CODEC_CANDIDATES, CODEC_SAMPLE_SIZE, CODEC_MIN_SAVINGS, CODEC_RATIO_TOLERANCE
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+OUTPUT_BLOCK_SIZE = 64 * 1024
+
+class _Passthrough:
+
+    eof = True
+
+    def compress(self, data):
+
+        return bytes(data)
+
+    def flush(self):
+
+        return b""
+
+class _LZ4Compressor:
+
+    def __init__(self):
+
+        self.compressor = lz4.frame.LZ4FrameCompressor()
+        self.started = False
+
+    def compress(self, data):
+
+        header = b""
+        if not self.started:
+            header = self.compressor.begin()
+            self.started = True
+        return header + self.compressor.compress(data)
+
+    def flush(self):
+
+        header = b"" if self.started else self.compressor.begin()
+        self.started = True
+        return header + self.compressor.flush()
+
+class _BlockReader:
+
+    def __init__(self, blocks):
+
+        # File-like view of an iterable of blocks for zstd's read_to_iter, which stops at the end of the frame without
+        # reading further; exhausted is only set when the input ran out first.
+        self.blocks = iter(blocks)
+        self.pending = b""
+        self.exhausted = False
+
+    def read(self, size=-1):
+
+        while not self.pending:
+            block = next(self.blocks, None)
+            if block is None:
+                self.exhausted = True
+                return b""
+            self.pending = bytes(block)
+        if size < 0:
+            size = len(self.pending)
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+class Codec:
+
+    def __init__(self, codec_id, name, compressor_factory, decompressor_factory, style):
+
+        self.codec_id = codec_id
+        self.name = name
+        self.compressor_factory = compressor_factory
+        self.decompressor_factory = decompressor_factory
+        # "tail" decompressors hand back unconsumed input (zlib); "buffered" ones keep it and report needs_input (bz2, lzma, lz4);
+        # "reader" ones pull their input from a file-like object (zstd, whose decompressobj cannot cap its output).
+        self.style = style
+
+    def compressor(self):
+
+        return self.compressor_factory()
+
+    def compress(self, data):
+
+        compressor = self.compressor()
+        return compressor.compress(data) + compressor.flush()
+
+    def iter_decompressed(self, blocks, max_length=OUTPUT_BLOCK_SIZE):
+
+        # Output pieces are capped at max_length so a highly compressible block cannot expand to the whole image in memory.
+        if self.style == "none":
+            yield from blocks
+            return
+
+        if self.style == "reader":
+            source = _BlockReader(blocks)
+            yield from self.decompressor_factory(source, max_length)
+            if source.exhausted:
+                raise ValueError(f"Compressed {self.name} stream is incomplete")
+            return
+
+        decompressor = self.decompressor_factory()
+        for block in blocks:
+            if decompressor.eof:
+                # Bytes past the end of the stream are ignored.
+                break
+            if self.style == "tail":
+                while block:
+                    yield decompressor.decompress(block, max_length)
+                    block = decompressor.unconsumed_tail
+            else:
+                yield decompressor.decompress(block, max_length)
+                while not decompressor.eof and not decompressor.needs_input:
+                    yield decompressor.decompress(b"", max_length)
+        if self.style == "tail":
+            yield decompressor.flush()
+        if not decompressor.eof:
+            raise ValueError(f"Compressed {self.name} stream is incomplete")
+
+    def decompress(self, data):
+
+        return b"".join(self.iter_decompressed([data]))
+
+CODECS = {}
+CODECS_BY_NAME = {}
+
+def register_codec(codec):
+
+    CODECS[codec.codec_id] = codec
+    CODECS_BY_NAME[codec.name] = codec
+
+def get_codec(codec):
+
+    # Accepts a codec ID from a chunk header, a registered name, or a Codec.
+    if isinstance(codec, Codec):
+        return codec
+    registry = CODECS_BY_NAME if isinstance(codec, str) else CODECS
+    if codec not in registry:
+        raise ValueError(f"Unknown codec {codec!r}")
+    return registry[codec]
+
+register_codec(Codec(0, "none", _Passthrough, None, "none"))
+for codec_id, level in ((1, 1), (2, 6), (3, 9)):
+    register_codec(Codec(codec_id, f"zlib-{level}", lambda level=level: zlib.compressobj(level), zlib.decompressobj, "tail"))
+register_codec(Codec(4, "bz2", lambda: bz2.BZ2Compressor(9), bz2.BZ2Decompressor, "buffered"))
+register_codec(Codec(5, "lzma", lambda: lzma.LZMACompressor(preset=6), lzma.LZMADecompressor, "buffered"))
+if zstandard is not None:
+    register_codec(Codec(6, "zstd-3", lambda: zstandard.ZstdCompressor(level=3).compressobj(),
+        lambda source, max_length: zstandard.ZstdDecompressor().read_to_iter(source, read_size=max_length, write_size=max_length), "reader"))
+if lz4 is not None:
+    register_codec(Codec(7, "lz4", _LZ4Compressor, lz4.frame.LZ4FrameDecompressor, "buffered"))
+
+DEFAULT_CODEC = CODECS_BY_NAME["zlib-6"]
+
+def available_codecs():
+
+    return [CODECS_BY_NAME[name] for name in CODEC_CANDIDATES if name in CODECS_BY_NAME]
+
+def measure_codecs(sample, codecs=None):
+
+    # Returns (codec, compressed_size, cpu_seconds) for each candidate on the sample.
+    results = []
+    for codec in codecs or available_codecs():
+        start = time.process_time()
+        size = len(codec.compress(sample))
+        results.append((codec, size, time.process_time() - start))
+    return results
+
+def select_codec(sample, codecs=None):
+
+    if not sample:
+        return CODECS_BY_NAME["none"]
+    results = measure_codecs(sample, codecs)
+    best_size = min(size for _, size, _ in results)
+    # Already-compressed input (PNG is deflate inside) is not worth any CPU.
+    if best_size > len(sample) * (1 - CODEC_MIN_SAVINGS):
+        return CODECS_BY_NAME["none"]
+    # Otherwise take the cheapest codec that lands within tolerance of the best ratio.
+    good_enough = [(cpu, codec) for codec, size, cpu in results if size <= best_size * (1 + CODEC_RATIO_TOLERANCE)]
+    return min(good_enough, key=lambda item: item[0])[1]
+
+def sample_file(file_obj, sample_size=CODEC_SAMPLE_SIZE):
+
+    # Reads a sample from the start of the file and rewinds it for the real transfer.
+    position = file_obj.tell()
+    sample = file_obj.read(sample_size)
+    file_obj.seek(position)
+    return sample
+
+def iter_compressed_chunks(file_obj, chunk_size, read_size, codec=DEFAULT_CODEC):
+
+    # Yields (chunk_number, is_last, chunk) as soon as enough compressed bytes exist; memory stays O(read_size + chunk_size).
+    compressor = get_codec(codec).compressor()
+    pending = bytearray()
+    held = None
+    chunk_number = 0
+
+    while True:
+        block = file_obj.read(read_size)
+        if block:
+            pending += compressor.compress(block)
+        else:
+            pending += compressor.flush()
+
+        while len(pending) >= chunk_size or (not block and pending):
+            chunk = bytes(pending[:chunk_size])
+            del pending[:chunk_size]
+            # Hold one chunk back so the final chunk can be flagged once EOF is seen.
+            if held is not None:
+                chunk_number += 1
+                yield chunk_number, False, held
+            held = chunk
+
+        if not block:
+            break
+
+    if held is not None:
+        chunk_number += 1
+        yield chunk_number, True, held
+    elif chunk_number == 0:
+        # An empty input under the passthrough codec still needs one (empty) final chunk.
+        yield 1, True, b""
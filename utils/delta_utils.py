@@ -0,0 +1,168 @@
+# utils/delta_utils.py
+
+import os
+import struct
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+from app.config import KEY_FRAME_INTERVAL, REFERENCE_FRAMES
+
+# magic, frame type, frame id, reference frame id, height, width, mode index
+FRAME_STRUCT = struct.Struct("!4sBIIIIB")
+FRAME_MAGIC = b"ALFR"
+KEY_FRAME = 0
+DELTA_FRAME = 1
+FRAME_TYPE_NAMES = {KEY_FRAME: "key", DELTA_FRAME: "delta"}
+FRAME_MODES = ["L", "RGB", "RGBA", "I;16"]
+MODE_LAYOUTS = {"L": (np.dtype("u1"), 1), "RGB": (np.dtype("u1"), 3), "RGBA": (np.dtype("u1"), 4), "I;16": (np.dtype("<u2"), 1)}
+MISSING_REFERENCE_HISTORY = 256
+
+def load_frame(image_path):
+
+    with Image.open(image_path) as img:
+        if img.mode not in MODE_LAYOUTS:
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        return np.asarray(img), img.mode
+
+def is_frame(data):
+
+    return bytes(data[:len(FRAME_MAGIC)]) == FRAME_MAGIC
+
+def pack_frame(frame_type, frame_id, reference_id, mode, pixels):
+
+    dtype, _ = MODE_LAYOUTS[mode]
+    header = FRAME_STRUCT.pack(FRAME_MAGIC, frame_type, frame_id, reference_id, pixels.shape[0], pixels.shape[1], FRAME_MODES.index(mode))
+    return header + np.ascontiguousarray(pixels, dtype=dtype).tobytes()
+
+def unpack_frame(data):
+
+    if len(data) < FRAME_STRUCT.size or not is_frame(data):
+        raise ValueError("Payload is not an encoded frame")
+    _, frame_type, frame_id, reference_id, height, width, mode_index = FRAME_STRUCT.unpack_from(data)
+    mode = FRAME_MODES[mode_index]
+    dtype, channels = MODE_LAYOUTS[mode]
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    expected = height * width * channels * dtype.itemsize
+    if len(data) - FRAME_STRUCT.size != expected:
+        raise ValueError(f"Frame body is {len(data) - FRAME_STRUCT.size} bytes, expected {expected}")
+    pixels = np.frombuffer(data, dtype=dtype, offset=FRAME_STRUCT.size).reshape(shape)
+    return frame_type, frame_id, reference_id, mode, pixels
+
+def compute_residual(pixels, reference):
+
+    # Unsigned subtraction wraps, so the residual is lossless and static regions become runs of zeros.
+    return np.subtract(pixels, reference, dtype=reference.dtype)
+
+def apply_residual(reference, residual):
+
+    return np.add(reference, residual, dtype=reference.dtype)
+
+def save_frame(pixels, mode, image_path):
+
+    temp_path = f"{image_path}.partial"
+    Image.fromarray(pixels, mode).save(temp_path, format="PNG")
+    os.replace(temp_path, image_path)
+
+class DeltaEncoder:
+
+    def __init__(self, key_frame_interval=KEY_FRAME_INTERVAL, max_pending=REFERENCE_FRAMES):
+
+        self.key_frame_interval = key_frame_interval
+        self.max_pending = max_pending
+        # dest_id -> (frame_id, mode, pixels) of the last frame the destination acknowledged.
+        self.references = {}
+        # dest_id -> OrderedDict of frame_id -> (mode, pixels) sent but not yet acknowledged.
+        self.pending = {}
+        self.deltas_since_key = {}
+        self.lock = threading.Lock()
+
+    def encode(self, dest_id, frame_id, pixels, mode):
+
+        # Returns (frame_type, payload); deltas are always taken against an acknowledged frame.
+        with self.lock:
+            reference = self.references.get(dest_id)
+            deltas = self.deltas_since_key.get(dest_id, 0)
+            usable = reference is not None and reference[1] == mode and reference[2].shape == pixels.shape
+            if usable and deltas < self.key_frame_interval:
+                frame_type = DELTA_FRAME
+                payload = pack_frame(DELTA_FRAME, frame_id, reference[0], mode, compute_residual(pixels, reference[2]))
+                self.deltas_since_key[dest_id] = deltas + 1
+            else:
+                frame_type = KEY_FRAME
+                payload = pack_frame(KEY_FRAME, frame_id, 0, mode, pixels)
+                self.deltas_since_key[dest_id] = 0
+
+            pending = self.pending.setdefault(dest_id, OrderedDict())
+            pending[frame_id] = (mode, pixels)
+            while len(pending) > self.max_pending:
+                pending.popitem(last=False)
+        return frame_type, payload
+
+    def acknowledge(self, dest_id, frame_id):
+
+        with self.lock:
+            pending = self.pending.get(dest_id)
+            if pending and frame_id in pending:
+                mode, pixels = pending.pop(frame_id)
+                self.references[dest_id] = (frame_id, mode, pixels)
+
+    def reset(self, dest_id):
+
+        # The next frame to dest_id goes out as a key frame.
+        with self.lock:
+            self.references.pop(dest_id, None)
+            self.pending.pop(dest_id, None)
+            self.deltas_since_key.pop(dest_id, None)
+
+class FrameReferences:
+
+    def __init__(self, max_frames=REFERENCE_FRAMES):
+
+        self.max_frames = max_frames
+        # source_id -> OrderedDict of frame_id -> (mode, pixels) for the most recently decoded frames.
+        self.frames = {}
+        self.missing = OrderedDict()
+        self.lock = threading.Lock()
+
+    def decode(self, source_id, data):
+
+        # Returns (frame_id, mode, pixels); pixels is None when a delta frame's reference is not cached.
+        frame_type, frame_id, reference_id, mode, pixels = unpack_frame(data)
+        with self.lock:
+            frames = self.frames.setdefault(source_id, OrderedDict())
+            if frame_type == DELTA_FRAME:
+                reference = frames.get(reference_id)
+                if reference is None or reference[0] != mode or reference[1].shape != pixels.shape:
+                    self.missing[(source_id, frame_id)] = reference_id
+                    while len(self.missing) > MISSING_REFERENCE_HISTORY:
+                        self.missing.popitem(last=False)
+                    return frame_id, mode, None
+                pixels = apply_residual(reference[1], pixels)
+
+            frames[frame_id] = (mode, pixels)
+            frames.move_to_end(frame_id)
+            while len(frames) > self.max_frames:
+                frames.popitem(last=False)
+        return frame_id, mode, pixels
+
+    def restore(self, source_id, image_path):
+
+        # Rewrites a received frame at image_path as a PNG; returns False if it had to be dropped for lack of a reference.
+        with open(image_path, "rb") as frame_file:
+            if not is_frame(frame_file.read(len(FRAME_MAGIC))):
+                return True
+            frame_file.seek(0)
+            data = frame_file.read()
+        _, mode, pixels = self.decode(source_id, data)
+        if pixels is None:
+            os.remove(image_path)
+            return False
+        save_frame(pixels, mode, image_path)
+        return True
+
+    def needs_key_frame(self, source_id, frame_id):
+
+        with self.lock:
+            return (source_id, frame_id) in self.missing
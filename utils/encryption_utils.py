@@ -9,6 +9,8 @@ from cryptography.hazmat.backends import default_backend
 import os
 import base64
 
+NONCE_SIZE = 16
+
 class EncryptionManager:
     def __init__(self):
         
@@ -44,7 +46,7 @@ class EncryptionManager:
 
     def encrypt(self, plaintext, symmetric_key):
         
-        nonce = os.urandom(16)        
+        nonce = os.urandom(NONCE_SIZE)        
         if isinstance(plaintext, str):
             plaintext = plaintext.encode('utf-8')
         
@@ -60,8 +62,8 @@ class EncryptionManager:
     def decrypt(self, encrypted_data, symmetric_key):
         
         try:            
-            nonce = encrypted_data[:16]
-            ciphertext = encrypted_data[16:]
+            nonce = encrypted_data[:NONCE_SIZE]
+            ciphertext = encrypted_data[NONCE_SIZE:]
             
             cipher = Cipher(
                 algorithms.ChaCha20(symmetric_key, nonce),
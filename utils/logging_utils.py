@@ -3,12 +3,24 @@
 import logging
 import os
 
+file_logging = True
+
+def set_file_logging(enabled):
+    global file_logging
+    file_logging = enabled
+
 def setup_logger(node_id, log_type="general"):
-    os.makedirs("logs", exist_ok=True)
-    log_filename = f"logs/node_{node_id}_{log_type}.log"    
     logger = logging.getLogger(f"Node_{node_id}_{log_type}")
     logger.setLevel(logging.INFO)
+    if not file_logging:
+        logger.setLevel(logging.WARNING)
+        logger.propagate = False
+        if not logger.handlers:
+            logger.addHandler(logging.NullHandler())
+        return logger
 
+    os.makedirs("logs", exist_ok=True)
+    log_filename = f"logs/node_{node_id}_{log_type}.log"    
     if not logger.handlers:
         file_handler = logging.FileHandler(log_filename)
         file_handler.setLevel(logging.INFO)
@@ -0,0 +1,100 @@
+# utils/stack_utils.py
+
+import os
+import tempfile
+import numpy as np
+
+from app.config import STACK_DEPTH, STACK_METHOD, STACK_MAX_BYTES, STACK_DIR
+
+STACK_METHODS = ("mean", "median")
+
+class FrameStacker:
+
+    def __init__(self, depth=STACK_DEPTH, method=STACK_METHOD, max_bytes=STACK_MAX_BYTES, spool_dir=STACK_DIR):
+
+        if method not in STACK_METHODS:
+            raise ValueError(f"Unknown stack method {method!r}; expected one of {', '.join(STACK_METHODS)}")
+        if depth < 1:
+            raise ValueError(f"Stack depth must be at least 1, got {depth}")
+        self.depth = depth
+        self.method = method
+        self.max_bytes = max_bytes
+        self.spool_dir = spool_dir
+        self.count = 0
+        self.shape = None
+        self.dtype = None
+        self.total = None
+        self.frames = None
+        self.spool_path = None
+        self.peak_bytes = 0
+
+    def add(self, frame):
+
+        frame = np.asarray(frame)
+        if self.shape is None:
+            self._allocate(frame)
+        elif frame.shape != self.shape or frame.dtype != self.dtype:
+            raise ValueError(f"Frame {self.count + 1} is {frame.dtype} {frame.shape}, stack is {self.dtype} {self.shape}")
+        if self.count >= self.depth:
+            raise ValueError(f"Stack already holds {self.depth} frames")
+
+        if self.method == "mean":
+            self.total += frame
+        else:
+            self.frames[self.count] = frame
+        self.count += 1
+
+    def result(self):
+
+        if self.count == 0:
+            raise ValueError("No frames to stack")
+        try:
+            if self.method == "mean":
+                return np.rint(self.total / self.count).astype(self.dtype)
+            return self._median()
+
+        finally:
+            self.discard()
+
+    def discard(self):
+
+        self.total = None
+        self.frames = None
+        if self.spool_path and os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
+        self.spool_path = None
+
+    def _allocate(self, frame):
+
+        self.shape = frame.shape
+        self.dtype = frame.dtype
+        if self.method == "mean":
+            # A running integer sum is exact, and uint64 cannot overflow for any realistic depth of 8- or 16-bit frames.
+            accumulator_bytes = frame.size * np.dtype(np.uint64).itemsize
+            if accumulator_bytes > self.max_bytes:
+                raise ValueError(f"Mean stack of {frame.shape} frames needs {accumulator_bytes} bytes, cap is {self.max_bytes}")
+            self.total = np.zeros(frame.shape, dtype=np.uint64)
+            self.peak_bytes = accumulator_bytes
+            return
+
+        # The median needs every sample of a pixel at once, so frames go to a disk-backed array and are combined in row strips.
+        if not os.path.exists(self.spool_dir):
+            os.makedirs(self.spool_dir, exist_ok=True)
+        fd, self.spool_path = tempfile.mkstemp(dir=self.spool_dir, suffix=".stack")
+        os.close(fd)
+        self.frames = np.memmap(self.spool_path, dtype=frame.dtype, mode="w+", shape=(self.depth,) + frame.shape)
+
+    def _median(self):
+
+        self.frames.flush()
+        height = self.shape[0]
+        row_size = self.frames[0, 0].size
+        # Per row: the samples being read plus np.median's partitioned copy, and a float64 result row.
+        row_bytes = row_size * (2 * self.count * self.dtype.itemsize + 8)
+        rows = max(1, min(height, self.max_bytes // row_bytes))
+        self.peak_bytes = rows * row_bytes
+        stacked = np.empty(self.shape, dtype=self.dtype)
+        for start in range(0, height, rows):
+            strip = np.median(self.frames[:self.count, start:start + rows], axis=0)
+            stacked[start:start + rows] = np.rint(strip).astype(self.dtype)
+        return stacked
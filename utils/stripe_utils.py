@@ -0,0 +1,119 @@
+# utils/stripe_utils.py
+
+import io
+import os
+import shutil
+import struct
+
+# magic, image id, stripe index, stripe count, byte offset, image size
+STRIPE_STRUCT = struct.Struct("!4sIHHQQ")
+STRIPE_MAGIC = b"ALSP"
+
+def stripe_ranges(size, count):
+
+    # Splits size bytes into count contiguous (offset, length) ranges whose lengths differ by at most one byte.
+    base, extra = divmod(size, count)
+    ranges = []
+    offset = 0
+    for index in range(count):
+        length = base + (1 if index < extra else 0)
+        ranges.append((offset, length))
+        offset += length
+    return ranges
+
+class StripeReader(io.RawIOBase):
+
+    # Reads one stripe as its header followed by its byte range of the image file, a block at a time, so a stripe is
+    # compressed and chunked without ever being held in memory whole.
+    def __init__(self, path, image_id, index, count, offset, length, image_size):
+
+        super().__init__()
+        self.header = STRIPE_STRUCT.pack(STRIPE_MAGIC, image_id, index, count, offset, image_size)
+        self.image_file = open(path, "rb")
+        self.offset = offset
+        self.size = len(self.header) + length
+        self.position = 0
+
+    def readable(self):
+
+        return True
+
+    def seekable(self):
+
+        return True
+
+    def tell(self):
+
+        return self.position
+
+    def seek(self, position, whence=os.SEEK_SET):
+
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self.position, os.SEEK_END: self.size}[whence]
+        self.position = max(0, base + position)
+        return self.position
+
+    def readinto(self, buffer):
+
+        view = memoryview(buffer).cast("B")
+        wanted = max(0, min(len(view), self.size - self.position))
+        filled = 0
+        if self.position < len(self.header):
+            part = self.header[self.position:self.position + wanted]
+            view[:len(part)] = part
+            filled = len(part)
+        if filled < wanted:
+            self.image_file.seek(self.offset + self.position + filled - len(self.header))
+            filled += self.image_file.readinto(view[filled:wanted]) or 0
+        self.position += filled
+        return filled
+
+    def close(self):
+
+        if not self.closed:
+            self.image_file.close()
+        super().close()
+
+def read_stripe_header(path):
+
+    # Returns (image_id, index, count, offset, image_size), or None if the file is not a stripe.
+    with open(path, "rb") as stripe_file:
+        header = stripe_file.read(STRIPE_STRUCT.size)
+    if len(header) < STRIPE_STRUCT.size or header[:len(STRIPE_MAGIC)] != STRIPE_MAGIC:
+        return None
+    return STRIPE_STRUCT.unpack(header)[1:]
+
+def stripe_path(image_dir, source_id, image_id, index, count):
+
+    return os.path.join(image_dir, f"stripe_from_satellite_{source_id}_{image_id}_{index + 1}of{count}.bin")
+
+def merge_stripes(stripes, image_path):
+
+    # stripes are catalog entries for one image; writes their bodies in order to image_path and returns it.
+    if not stripes:
+        raise ValueError("No stripes to merge")
+    count = stripes[0]["stripe_count"]
+    image_size = stripes[0]["image_size"]
+    by_index = {stripe["stripe_index"]: stripe for stripe in stripes}
+    missing = sorted(set(range(count)) - set(by_index))
+    if missing:
+        raise ValueError(f"Missing stripes {', '.join(str(index + 1) for index in missing)} of {count}")
+
+    temp_path = f"{image_path}.partial"
+    try:
+        with open(temp_path, "wb") as out_file:
+            for index in range(count):
+                stripe = by_index[index]
+                if stripe["stripe_count"] != count or stripe["image_size"] != image_size or stripe["offset"] != out_file.tell():
+                    raise ValueError(f"Stripe {index + 1} of {count} does not line up with the others")
+                with open(stripe["path"], "rb") as stripe_file:
+                    stripe_file.seek(STRIPE_STRUCT.size)
+                    shutil.copyfileobj(stripe_file, out_file)
+            if out_file.tell() != image_size:
+                raise ValueError(f"Merged stripes hold {out_file.tell()} bytes, expected {image_size}")
+        os.replace(temp_path, image_path)
+
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return image_path
@@ -0,0 +1,246 @@
+# utils/tile_utils.py
+
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+from utils.delta_utils import FRAME_MODES, MODE_LAYOUTS, save_frame
+from app.config import PROGRESSIVE_TILE_SIZE, PROGRESSIVE_OVERVIEW_SCALE, PROGRESSIVE_MAX_IMAGES, REASSEMBLY_TTL, REASSEMBLY_EXPIRE_INTERVAL
+
+# magic, kind, image id, tile count, image height, image width, x, y, height, width, mode index, overview scale
+TILE_STRUCT = struct.Struct("!4sBIIIIIIIIBB")
+TILE_MAGIC = b"ALTL"
+OVERVIEW = 0
+TILE = 1
+
+def is_tile(data):
+
+    return bytes(data[:len(TILE_MAGIC)]) == TILE_MAGIC
+
+def pack_tile(kind, image_id, tile_count, image_shape, x, y, mode, pixels, scale=1):
+
+    dtype, _ = MODE_LAYOUTS[mode]
+    header = TILE_STRUCT.pack(TILE_MAGIC, kind, image_id, tile_count, image_shape[0], image_shape[1],
+                              x, y, pixels.shape[0], pixels.shape[1], FRAME_MODES.index(mode), scale)
+    return header + np.ascontiguousarray(pixels, dtype=dtype).tobytes()
+
+def unpack_tile(data):
+
+    # Returns (kind, image_id, tile_count, (image_height, image_width), x, y, mode, scale, pixels).
+    if len(data) < TILE_STRUCT.size or not is_tile(data):
+        raise ValueError("Payload is not an image tile")
+    _, kind, image_id, tile_count, image_height, image_width, x, y, height, width, mode_index, scale = TILE_STRUCT.unpack_from(data)
+    mode = FRAME_MODES[mode_index]
+    dtype, channels = MODE_LAYOUTS[mode]
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    expected = height * width * channels * dtype.itemsize
+    if len(data) - TILE_STRUCT.size != expected:
+        raise ValueError(f"Tile body is {len(data) - TILE_STRUCT.size} bytes, expected {expected}")
+    pixels = np.frombuffer(data, dtype=dtype, offset=TILE_STRUCT.size).reshape(shape)
+    return kind, image_id, tile_count, (image_height, image_width), x, y, mode, scale, pixels
+
+def downsample(pixels, scale):
+
+    # Block mean over scale x scale cells; edges are padded by repeating the last row and column.
+    height, width = pixels.shape[:2]
+    pad_height, pad_width = -height % scale, -width % scale
+    padding = [(0, pad_height), (0, pad_width)] + [(0, 0)] * (pixels.ndim - 2)
+    padded = np.pad(pixels, padding, mode="edge").astype(np.float64)
+    blocks = padded.reshape((padded.shape[0] // scale, scale, padded.shape[1] // scale, scale) + pixels.shape[2:])
+    return np.rint(blocks.mean(axis=(1, 3))).astype(pixels.dtype)
+
+def upsample(overview, scale, image_shape):
+
+    return np.repeat(np.repeat(overview, scale, axis=0), scale, axis=1)[:image_shape[0], :image_shape[1]]
+
+def iter_progressive_payloads(image_id, pixels, mode, tile_size=PROGRESSIVE_TILE_SIZE, scale=PROGRESSIVE_OVERVIEW_SCALE):
+
+    # The overview goes first so the receiver can show the whole frame before any full-resolution tile lands.
+    height, width = pixels.shape[:2]
+    origins = [(x, y) for y in range(0, height, tile_size) for x in range(0, width, tile_size)]
+    yield pack_tile(OVERVIEW, image_id, len(origins), (height, width), 0, 0, mode, downsample(pixels, scale), scale)
+    for x, y in origins:
+        yield pack_tile(TILE, image_id, len(origins), (height, width), x, y, mode, pixels[y:y + tile_size, x:x + tile_size])
+
+def preview_path(image_path):
+
+    root, ext = os.path.splitext(image_path)
+    return f"{root}_preview{ext}"
+
+def spool_path(image_path):
+
+    root, _ = os.path.splitext(image_path)
+    return f"{root}_progressive.npz"
+
+class ProgressiveImage:
+
+    def __init__(self, image_path, tile_count, image_shape, mode):
+
+        dtype, channels = MODE_LAYOUTS[mode]
+        self.image_path = image_path
+        self.tile_count = tile_count
+        self.mode = mode
+        self.canvas = np.zeros(image_shape if channels == 1 else image_shape + (channels,), dtype=dtype)
+        # Pixels already covered by full-resolution tiles; the overview never overwrites them.
+        self.filled = np.zeros(image_shape, dtype=bool)
+        self.tiles = set()
+
+    def add_overview(self, overview, scale):
+
+        upsampled = upsample(overview, scale, self.filled.shape)
+        self.canvas[~self.filled] = upsampled[~self.filled]
+
+    def add_tile(self, x, y, pixels):
+
+        height, width = pixels.shape[:2]
+        self.canvas[y:y + height, x:x + width] = pixels
+        self.filled[y:y + height, x:x + width] = True
+        self.tiles.add((x, y))
+
+    def is_complete(self):
+
+        return len(self.tiles) == self.tile_count
+
+    def spool(self):
+
+        path = spool_path(self.image_path)
+        np.savez(path, canvas=self.canvas, filled=self.filled, tiles=np.array(sorted(self.tiles), dtype=np.int64).reshape(-1, 2))
+        return path
+
+    @staticmethod
+    def from_spool(path, image_path, tile_count, mode):
+
+        with np.load(path) as spooled:
+            image = ProgressiveImage(image_path, tile_count, spooled["filled"].shape, mode)
+            image.canvas[...] = spooled["canvas"]
+            image.filled[...] = spooled["filled"]
+            image.tiles = {tuple(origin) for origin in spooled["tiles"].tolist()}
+        os.remove(path)
+        return image
+
+class ProgressiveImages:
+
+    def __init__(self, max_images=PROGRESSIVE_MAX_IMAGES, ttl=REASSEMBLY_TTL, expire_interval=REASSEMBLY_EXPIRE_INTERVAL):
+
+        self.max_images = max_images
+        self.ttl = ttl
+        self.expire_interval = expire_interval
+        # (source_id, image_id) -> ProgressiveImage, least recently updated first.
+        self.images = OrderedDict()
+        # Canvases pushed out of memory by newer images wait on disk: (source_id, image_id) -> (image_path, tile_count, mode, tiles).
+        self.spooled = {}
+        self.spooled_total = 0
+        self.finished = OrderedDict()
+        # Unfinished images in memory or on disk, least recently updated first; abandoned ones expire like reassembly sessions.
+        self.last_update = OrderedDict()
+        self.expired = 0
+        self.lock = threading.Lock()
+        self.running = True
+        self.expire_thread = None
+
+    def receive(self, source_id, image_path):
+
+        # Returns image_path untouched for ordinary payloads, None while tiles are outstanding, and the final path once complete.
+        with open(image_path, "rb") as tile_file:
+            if not is_tile(tile_file.read(len(TILE_MAGIC))):
+                return image_path
+            tile_file.seek(0)
+            data = tile_file.read()
+        os.remove(image_path)
+        kind, image_id, tile_count, image_shape, x, y, mode, scale, pixels = unpack_tile(data)
+        key = (source_id, image_id)
+
+        now = time.monotonic()
+        with self.lock:
+            if self.expire_thread is None and self.expire_interval:
+                self.expire_thread = threading.Thread(target=self._expire_loop, daemon=True)
+                self.expire_thread.start()
+            self._expire(now)
+            if key in self.finished:
+                return None
+            self.last_update[key] = now
+            self.last_update.move_to_end(key)
+            image = self.images.get(key)
+            if image is None and key in self.spooled:
+                spooled_path, spooled_tile_count, spooled_mode, _ = self.spooled.pop(key)
+                image = self.images[key] = ProgressiveImage.from_spool(spool_path(spooled_path), spooled_path, spooled_tile_count, spooled_mode)
+            elif image is None:
+                # The image takes the path of whichever of its payloads arrived first.
+                image = self.images[key] = ProgressiveImage(image_path, tile_count, image_shape, mode)
+            while len(self.images) > self.max_images:
+                # Only the canvas leaves memory; the image picks up where it stopped when its next tile arrives.
+                evicted_key, evicted = self.images.popitem(last=False)
+                evicted.spool()
+                self.spooled[evicted_key] = (evicted.image_path, evicted.tile_count, evicted.mode, len(evicted.tiles))
+                self.spooled_total += 1
+            self.images.move_to_end(key)
+
+            if kind == OVERVIEW:
+                image.add_overview(pixels, scale)
+            else:
+                image.add_tile(x, y, pixels)
+            if not image.is_complete():
+                # Tiles refine the canvas in memory; only the overview rewrites the preview on disk.
+                if kind == OVERVIEW:
+                    save_frame(image.canvas, mode, preview_path(image.image_path))
+                return None
+
+            del self.images[key]
+            del self.last_update[key]
+            self.finished[key] = True
+            while len(self.finished) > self.max_images:
+                self.finished.popitem(last=False)
+        save_frame(image.canvas, mode, image.image_path)
+        if os.path.exists(preview_path(image.image_path)):
+            os.remove(preview_path(image.image_path))
+        return image.image_path
+
+    def expire(self, now=None):
+
+        with self.lock:
+            self._expire(time.monotonic() if now is None else now)
+
+    def stop(self):
+
+        self.running = False
+
+    def _expire(self, now):
+
+        # Drops images no tile has reached for ttl seconds, with their spooled canvas and preview.
+        while self.last_update:
+            key, updated = next(iter(self.last_update.items()))
+            if now - updated < self.ttl:
+                break
+            del self.last_update[key]
+            image = self.images.pop(key, None)
+            if image is not None:
+                image_path = image.image_path
+            else:
+                image_path = self.spooled.pop(key)[0]
+                if os.path.exists(spool_path(image_path)):
+                    os.remove(spool_path(image_path))
+            if os.path.exists(preview_path(image_path)):
+                os.remove(preview_path(image_path))
+            self.expired += 1
+
+    def _expire_loop(self):
+
+        while self.running:
+            time.sleep(self.expire_interval)
+            self.expire()
+
+    def previews(self):
+
+        # Images still waiting for tiles whose overview has landed, for listing next to the finished images.
+        with self.lock:
+            pending = [(key, image.image_path, len(image.tiles), image.tile_count, False) for key, image in self.images.items()]
+            pending += [(key, image_path, tiles, tile_count, True) for key, (image_path, tile_count, _, tiles) in self.spooled.items()]
+        return [
+            {"source_id": source_id, "image_id": image_id, "preview_path": preview_path(image_path),
+             "tiles_received": tiles, "tile_count": tile_count, "spooled": spooled}
+            for (source_id, image_id), image_path, tiles, tile_count, spooled in pending
+            if os.path.exists(preview_path(image_path))
+        ]